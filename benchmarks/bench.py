@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the hot paths, with JSON results and regression checks.
+
+    python benchmarks/bench.py run --out benchmarks/results/current.json
+    python benchmarks/bench.py run --scales 1e4,1e5,1e6,1e7 --cases mobius_twist,auc_from_scores
+    python benchmarks/bench.py compare benchmarks/results/baseline.json benchmarks/results/current.json
+    python benchmarks/bench.py startup --budget-ms 60
+
+Each (case, scale) runs in a fresh interpreter, so its peak RSS is its own.
+Reported time is the best of --repeat runs after one untimed warm-up call; setup
+(inputs, random scores) is not timed. `compare` (or `run --baseline`) exits with
+status 1 if any case got slower than --threshold times its baseline (and by at
+least --min-seconds). `startup` measures `python -X importtime` for
+`prime-polarity --help` and exits with status 1 above --budget-ms or if NumPy or
+mpmath get imported.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+
+try:
+    import prime_polarity  # noqa: F401
+except ImportError:  # running from a source checkout without `pip install -e .`
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SCALES = "1e4,1e5,1e6"
+
+def _sieve(N):
+    from prime_polarity.sieves import prime_sieve_up_to
+    return lambda: prime_sieve_up_to(N)
+
+def _mobius_sieve(N):
+    from prime_polarity.sieves import mobius_sieve_up_to
+    return lambda: mobius_sieve_up_to(N)
+
+def _divisors(N):
+    from prime_polarity.sieves import divisors_up_to
+    return lambda: divisors_up_to(N)
+
+def _factor_sieve(N):
+    from prime_polarity.sieves import factor_sieve
+    return lambda: factor_sieve(N, 2 * N - 1)
+
+def _mobius_twist(N):
+    from prime_polarity.transforms import mobius_twist
+    G = np.random.default_rng(0).random(N)
+    return lambda: mobius_twist(G, N)
+
+def _divisor_index(N):
+    from prime_polarity.sieves import mobius_range
+    from prime_polarity.transforms import DivisorIndex
+    mu = mobius_range(0, N)
+    return lambda: DivisorIndex.build(1, 1, N, mu)
+
+def _convolution(N):
+    from prime_polarity.transforms import dirichlet_convolution
+    G = np.random.default_rng(0).random(N)
+    return lambda: dirichlet_convolution(G, 1, 1, N)  # index cached by the warm-up call
+
+def _dirichlet(N):
+    from prime_polarity.transforms import dirichlet_projection
+    G = np.random.default_rng(0).random(N)
+    return lambda: [dirichlet_projection(G, N, q) for q in (4, 5, 8, 12)]
+
+def _z_raw(N):
+    from prime_polarity.generators import set_precision, Z_raw
+    set_precision(50)
+    return lambda: [Z_raw(n) for n in range(N, N + min(N, 2000))]
+
+def _compute_g(N):
+    from prime_polarity.cli import compute_G
+    return lambda: compute_G(N, 2 * N - 1)
+
+def _auc(N):
+    from prime_polarity.metrics import auc_from_scores
+    rng = np.random.default_rng(0)
+    scores, labels = rng.random(N), rng.random(N) < 0.1
+    return lambda: auc_from_scores(scores, labels)
+
+def _quantized_auc(N):
+    from prime_polarity.quantize import quantized_auc
+    rng = np.random.default_rng(0)
+    X, labels = [rng.random(N) for _ in range(4)], rng.random(N) < 0.1
+    return lambda: [quantized_auc(x, labels, "float32") for x in X]
+
+def _score_range(N):
+    from prime_polarity.cli import score_range
+    return lambda: score_range(N, 2 * N - 1, 3, None, False, [4, 5, 8, 12], 50)
+
+# name -> (setup(N) returning the timed callable, largest feasible N)
+CASES = {
+    "prime_sieve_up_to": (_sieve, 10**7),
+    "mobius_sieve_up_to": (_mobius_sieve, 10**7),
+    "divisors_up_to": (_divisors, 10**6),
+    "factor_sieve": (_factor_sieve, 10**7),
+    "mobius_twist": (_mobius_twist, 10**7),
+    "divisor_index": (_divisor_index, 10**6),
+    "dirichlet_convolution": (_convolution, 10**6),
+    "dirichlet_projection": (_dirichlet, 10**7),
+    "Z_raw": (_z_raw, 10**7),  # min(N, 2000) scalar calls starting at N
+    "compute_G": (_compute_g, 10**7),
+    "auc_from_scores": (_auc, 10**7),
+    "quantized_auc": (_quantized_auc, 10**7),
+    "score_range": (_score_range, 10**7),
+}
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024.0
+
+def run_case(name: str, N: int, repeat: int) -> dict:
+    fn = CASES[name][0](N)
+    fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"case": name, "scale": N, "seconds": min(times), "mean_seconds": float(np.mean(times)),
+            "repeat": repeat, "peak_rss_mb": peak_rss_mb()}
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_all(cases, scales, repeat: int) -> dict:
+    results = []
+    for name in cases:
+        for N in scales:
+            if N > CASES[name][1]:
+                continue
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "_child", name, str(N), str(repeat)],
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"{name:22s} {N:>10d}  FAILED\n{proc.stderr}", file=sys.stderr)
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            rss = "" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:9.1f} MB"
+            print(f"{name:22s} {N:>10d}  {r['seconds']:11.6f} s  {rss}", flush=True)
+            results.append(r)
+    meta = {"commit": _git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "cpu_count": os.cpu_count()}
+    return {"meta": meta, "results": results}
+
+def compare(baseline: dict, current: dict, threshold: float, min_seconds: float = 1e-3) -> list:
+    """
+    Print (case, scale, baseline s, current s, ratio) for every shared entry, slowest
+    ratio first, and return the regressions: ratio above `threshold` and an absolute
+    slowdown of at least `min_seconds` (timer noise dominates below that).
+    """
+    base = {(r["case"], r["scale"]): r for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        b = base.get((r["case"], r["scale"]))
+        if b is not None:
+            rows.append((r["case"], r["scale"], b["seconds"], r["seconds"], r["seconds"] / max(b["seconds"], 1e-9)))
+    rows.sort(key=lambda x: x[4], reverse=True)
+    regressions = [row for row in rows if row[4] > threshold and row[3] - row[2] >= min_seconds]
+    print(f"{'case':22s} {'scale':>10s} {'baseline':>11s} {'current':>11s} {'ratio':>7s}")
+    for row in rows:
+        case, N, b, c, ratio = row
+        flag = "  REGRESSION" if row in regressions else ""
+        print(f"{case:22s} {N:>10d} {b:11.6f} {c:11.6f} {ratio:7.2f}{flag}")
+    return regressions
+
+HELP_SNIPPET = "from prime_polarity.cli import main\ntry:\n    main(['--help'])\nexcept SystemExit:\n    pass"
+HEAVY_MODULES = ("numpy", "mpmath", "pandas")
+
+def import_time_ms(code: str = HELP_SNIPPET) -> tuple:
+    """(total import time in ms, imported module names) for `code` in a fresh interpreter."""
+    env = dict(os.environ)
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [src, env.get("PYTHONPATH")]))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], stderr=subprocess.PIPE, text=True,
+                          env=env, stdout=subprocess.DEVNULL, check=True)
+    total, modules = 0, []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules.append(name.strip())
+        if not name.startswith("  "):  # top level: its cumulative time covers its children
+            total += int(cumulative)
+    return total / 1e3, modules
+
+def startup(budget_ms: float, repeat: int) -> bool:
+    runs = [import_time_ms() for _ in range(max(1, repeat))]
+    best, modules = min(runs, key=lambda r: r[0])
+    heavy = sorted({m.split(".")[0] for m in modules if m.split(".")[0] in HEAVY_MODULES})
+    print(f"prime-polarity --help: {best:.1f} ms of imports (best of {len(runs)}), budget {budget_ms:.1f} ms")
+    if heavy:
+        print(f"heavy modules imported: {', '.join(heavy)}")
+    return best <= budget_ms and not heavy
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "_child":
+        name, N, repeat = sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+        print(json.dumps(run_case(name, N, repeat)))
+        return
+
+    ap = argparse.ArgumentParser(description="Prime Polarity benchmarks.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="Time every case and write JSON results.")
+    r.add_argument("--cases", type=str, default="", help=f"Comma list (default all): {', '.join(CASES)}")
+    r.add_argument("--scales", type=str, default=DEFAULT_SCALES,
+                   help="Comma list of N; cases skip scales above their feasible maximum.")
+    r.add_argument("--repeat", type=int, default=3)
+    r.add_argument("--out", type=str, default="", help="Write JSON results here.")
+    r.add_argument("--baseline", type=str, default="", help="Compare against this JSON after running.")
+    r.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio that counts as a regression.")
+    r.add_argument("--min-seconds", type=float, default=1e-3, help="Ignore slowdowns smaller than this.")
+    c = sub.add_parser("compare", help="Compare two JSON result files.")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    c.add_argument("--threshold", type=float, default=1.25)
+    c.add_argument("--min-seconds", type=float, default=1e-3)
+    st = sub.add_parser("startup", help="Check the import-time budget of `prime-polarity --help`.")
+    st.add_argument("--budget-ms", type=float, default=60.0)
+    st.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    if args.cmd == "startup":
+        sys.exit(0 if startup(args.budget_ms, args.repeat) else 1)
+    if args.cmd == "compare":
+        regressions = compare(_load(args.baseline), _load(args.current), args.threshold, args.min_seconds)
+    else:
+        cases = [x.strip() for x in args.cases.split(",") if x.strip()] or list(CASES)
+        unknown = [x for x in cases if x not in CASES]
+        if unknown:
+            ap.error(f"unknown cases {unknown}; choose from {list(CASES)}")
+        scales = [int(float(x)) for x in args.scales.split(",") if x.strip()]
+        result = run_all(cases, scales, max(1, args.repeat))
+        if args.out:
+            os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=1)
+        regressions = compare(_load(args.baseline), result, args.threshold, args.min_seconds) if args.baseline else []
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.2f}x", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
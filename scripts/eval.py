@@ -1,59 +1,149 @@
 #!/usr/bin/env python3
-import argparse, json, csv, sys
+import argparse, json, csv, os, sys
 import numpy as np
-import pandas as pd
+
+try:
+    import prime_polarity  # noqa: F401
+except ImportError:  # running from a source checkout without `pip install -e .`
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from prime_polarity.metrics import StreamingAUC, BinnedAUC, auc_batch
+from prime_polarity.wheel import parse_mask
 
 def auc_tie_aware(scores: np.ndarray, labels: np.ndarray) -> float:
-    scores = np.asarray(scores, dtype=float)
-    labels = np.asarray(labels, dtype=bool)
-    assert scores.shape[0] == labels.shape[0]
-    n = len(scores)
-    order = np.argsort(scores, kind="mergesort")
-    s = scores[order]
-    ranks = np.empty(n, dtype=float)
-    i = 0
-    while i < n:
-        j = i + 1
-        while j < n and s[j] == s[i]:
-            j += 1
-        avg_rank = 0.5 * (i + 1 + j)
-        ranks[i:j] = avg_rank
-        i = j
-    inv = np.empty(n, dtype=int)
-    inv[order] = np.arange(n)
-    ranks = ranks[inv]
-    pos = labels
-    n_pos = int(pos.sum())
-    n_neg = int((~labels).sum())
-    if n_pos == 0 or n_neg == 0:
-        return 0.5
-    sum_ranks_pos = ranks[pos].sum()
-    auc = (sum_ranks_pos - n_pos*(n_pos+1)/2.0) / (n_pos*n_neg)
-    return float(auc)
+    aucs, _ = auc_batch(np.asarray(scores, dtype=float)[None, :], labels)
+    return float(aucs[0])
 
 def polarity_index(auc: float) -> float:
     return 2.0*auc - 1.0
 
+def available_columns(path: str):
+    if os.path.isdir(path):
+        return [f[:-4] for f in sorted(os.listdir(path)) if f.endswith(".npy")]
+    with open(path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
+def _csv_column(values) -> np.ndarray:
+    a = np.asarray(values)
+    if a.size and a[0] in ("True", "False"):
+        return a == "True"
+    a = np.where(a == "", "nan", a)  # empty cells (features undefined at small n) read as NaN, as in pandas
+    return a.astype(float)  # Python's float(): exact round trip of repr() output
+
+def _iter_csv(path: str, columns, chunk_rows: int):
+    """The csv-module reader: no pandas needed, one chunk of strings in memory at a time."""
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        idx = [header.index(c) for c in columns]
+        while True:
+            rows = [row for _, row in zip(range(chunk_rows), reader)]
+            if not rows:
+                return
+            yield {c: _csv_column([row[i] for row in rows]) for c, i in zip(columns, idx)}
+            if len(rows) < chunk_rows:
+                return
+
+def iter_chunks(path: str, columns, chunk_rows: int, mask=None, engine: str = "csv"):
+    """
+    Yield {column: array} chunks of at most `chunk_rows` rows. `path` is either a
+    CSV or a directory of .npy columns written by make_dataset.py (memory-mapped).
+    With a wheel.Wheel `mask`, only rows whose n is coprime to its modulus are kept.
+    CSVs are read with the csv module, or with pandas (if installed) for engine="pandas".
+    """
+    if mask is not None:
+        read = list(columns) + (["n"] if "n" not in columns else [])
+        for chunk in iter_chunks(path, read, chunk_rows, engine=engine):
+            keep = mask.contains(chunk["n"])
+            yield {c: chunk[c][keep] for c in columns}
+        return
+    if os.path.isdir(path):
+        cols = {c: np.load(os.path.join(path, c + ".npy"), mmap_mode="r") for c in columns}
+        total = len(next(iter(cols.values())))
+        for i in range(0, total, chunk_rows):
+            yield {c: np.asarray(a[i:i+chunk_rows]) for c, a in cols.items()}
+        return
+    if engine != "pandas":
+        yield from _iter_csv(path, columns, chunk_rows)
+        return
+    import pandas as pd
+    for df in pd.read_csv(path, usecols=columns, chunksize=chunk_rows, float_precision="round_trip"):
+        yield {c: df[c].values for c in columns}
+
+def evaluate(path: str, feats, chunk_rows: int = 1 << 20, approx_bins: int = 0, tmpdir: str = None,
+             mask=None, engine: str = "csv"):
+    """
+    Stream `path` and return [{"feature", "auc", "pi"[, "auc_err"]}] per feature,
+    over the rows with n coprime to `mask`'s modulus if a wheel.Wheel is given.
+
+    A dataset that fits in one chunk is ranked in memory with auc_batch. Larger
+    exact runs spill sorted runs per feature and merge them (StreamingAUC);
+    approx_bins > 0 uses binned histograms after a min/max pass and reports the
+    AUC error bound.
+    """
+    columns = ["is_prime"] + feats
+    if not approx_bins:
+        chunks = iter_chunks(path, columns, chunk_rows, mask, engine)
+        first, second = next(chunks, None), next(chunks, None)
+        if second is None:
+            if first is None or not feats:
+                return [{"feature": f, "auc": 0.5, "pi": 0.0} for f in feats]
+            aucs, pis = auc_batch(np.vstack([first[f].astype(float) for f in feats]), first["is_prime"])
+            return [{"feature": f, "auc": round(float(a),6), "pi": round(float(p),6)}
+                    for f, a, p in zip(feats, aucs, pis)]
+        chunks.close()
+    if approx_bins:
+        lo = {f: np.inf for f in feats}
+        hi = {f: -np.inf for f in feats}
+        for chunk in iter_chunks(path, columns, chunk_rows, mask, engine):
+            for f in feats:
+                x = chunk[f].astype(float)
+                x = x[np.isfinite(x)]
+                if len(x):
+                    lo[f], hi[f] = min(lo[f], x.min()), max(hi[f], x.max())
+        accs = {f: BinnedAUC(lo[f] if np.isfinite(lo[f]) else 0.0, hi[f] if np.isfinite(hi[f]) else 0.0,
+                             approx_bins) for f in feats}
+    else:
+        accs = {f: StreamingAUC(tmpdir=tmpdir) for f in feats}
+    try:
+        for chunk in iter_chunks(path, columns, chunk_rows, mask, engine):
+            y = chunk["is_prime"].astype(bool)
+            for f in feats:
+                accs[f].update(chunk[f].astype(float), y)
+        rows = []
+        for f in feats:
+            auc = accs[f].result()
+            row = {"feature": f, "auc": round(auc,6), "pi": round(polarity_index(auc),6)}
+            if approx_bins:
+                row["auc_err"] = round(accs[f].error_bound(), 6)
+            rows.append(row)
+    finally:
+        for acc in accs.values():
+            if isinstance(acc, StreamingAUC):
+                acc.close()
+    return rows
+
 def main():
     ap = argparse.ArgumentParser(description="Evaluate features (AUC/PI) from a dataset CSV.")
-    ap.add_argument("--data", required=True, help="CSV from scripts/make_dataset.py")
+    ap.add_argument("--data", required=True, help="CSV or .npy column directory from scripts/make_dataset.py")
     ap.add_argument("--features", default="Z_raw,FracPartMin,ForwardDiff,LogMellinSlope,MobiusFast,Dirichlet_q4,Dirichlet_q5,Dirichlet_q8,Dirichlet_q12,K3")
     ap.add_argument("--format", choices=["txt","md","json","csv"], default="md")
     ap.add_argument("--out", default="", help="Optional output path for json/csv/md")
+    ap.add_argument("--chunk-rows", type=int, default=1 << 20, help="Rows read from disk per chunk")
+    ap.add_argument("--approx-bins", type=int, default=0,
+                    help="If >0, approximate AUC with this many histogram bins and report the error bound")
+    ap.add_argument("--tmpdir", default=None, help="Directory for exact-mode sorted runs")
+    ap.add_argument("--engine", choices=["csv", "pandas"], default="csv",
+                    help="CSV reader: the standard csv module (default) or pandas, if installed")
+    ap.add_argument("--mask", default="", help="Evaluate only odd n ('odd') or n coprime to q ('coprime:q')")
     args = ap.parse_args()
+    try:
+        mask = parse_mask(args.mask)
+    except ValueError as exc:
+        ap.error(str(exc))
 
-    df = pd.read_csv(args.data)
-    y = df["is_prime"].values.astype(bool)
-    feats = [f.strip() for f in args.features.split(",") if f.strip()]
-
-    rows = []
-    for f in feats:
-        if f not in df.columns:
-            continue
-        x = df[f].values.astype(float)
-        auc = auc_tie_aware(x, y)
-        pi = polarity_index(auc)
-        rows.append({"feature": f, "auc": round(auc,6), "pi": round(pi,6)})
+    present = set(available_columns(args.data))
+    feats = [f.strip() for f in args.features.split(",") if f.strip() and f.strip() in present]
+    rows = evaluate(args.data, feats, args.chunk_rows, args.approx_bins, args.tmpdir, mask, args.engine)
     rows.sort(key=lambda r: r["pi"], reverse=True)
 
     if args.format == "txt":
@@ -88,7 +178,7 @@ def main():
     if args.format == "csv":
         target = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
         with target as f:
-            w = csv.DictWriter(f, fieldnames=["feature","auc","pi"])
+            w = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["feature","auc","pi"])
             w.writeheader()
             for r in rows:
                 w.writerow(r)
@@ -1,109 +1,16 @@
 #!/usr/bin/env python3
-import argparse, math, os
+import argparse, csv, json, os, shutil, sys
 import numpy as np
-import pandas as pd
-from mpmath import mp, zeta, pi
-
-def prime_sieve_up_to(n: int):
-    is_prime = [True]*(n+1)
-    is_prime[0] = is_prime[1] = False
-    p = 2
-    while p*p <= n:
-        if is_prime[p]:
-            step = p
-            start = p*p
-            is_prime[start:n+1:step] = [False]*(((n - start)//step) + 1)
-        p += 1
-    return is_prime
-
-def mobius_sieve_up_to(n: int):
-    mu = [1]*(n+1)
-    is_prime = [True]*(n+1)
-    primes = []
-    for i in range(2, n+1):
-        if is_prime[i]:
-            primes.append(i)
-            mu[i] = -1
-        j = 0
-        while j < len(primes) and i * primes[j] <= n:
-            p = primes[j]
-            is_prime[i*p] = False
-            if i % p == 0:
-                mu[i*p] = 0
-                break
-            else:
-                mu[i*p] = -mu[i]
-            j += 1
-    mu[0] = 0
-    return mu
-
-def Z_raw(n: int):
-    if n <= 2:
-        return float("nan")
-    return float(mp.e**(pi * zeta(n - 1) / n) + 1)
-
-def fractional_part_min(x: np.ndarray) -> np.ndarray:
-    frac = x - np.floor(x)
-    return np.minimum(frac, 1.0 - frac)
-
-def forward_diff(x: np.ndarray) -> np.ndarray:
-    d = np.empty_like(x)
-    d[:-1] = x[1:] - x[:-1]
-    d[-1] = d[-2] if len(x) >= 2 else 0.0
-    return d
-
-def logmellin_slope(x: np.ndarray, n0: int) -> np.ndarray:
-    n = np.arange(n0, n0 + len(x), dtype=float)
-    d = forward_diff(x)
-    return n * d
-
-def mobius_twist_fast(G_values: np.ndarray, n0: int) -> np.ndarray:
-    N = len(G_values)
-    max_n = n0 + N - 1
-    mu = mobius_sieve_up_to(max_n)
-    out = np.zeros(N, dtype=float)
-    for d in range(1, max_n+1):
-        mu_d = mu[d]
-        if mu_d == 0:
-            continue
-        start_n = ((n0 + d - 1) // d) * d
-        for n in range(start_n, max_n+1, d):
-            q = n // d
-            q_idx = q - n0
-            n_idx = n - n0
-            if 0 <= q_idx < N and 0 <= n_idx < N:
-                out[n_idx] += mu_d * G_values[q_idx]
-    return out
-
-def dirichlet_projection(G_values: np.ndarray, n0: int, modulus: int) -> np.ndarray:
-    N = len(G_values)
-    n = np.arange(n0, n0 + N)
-    def chi_mod4(m):
-        if m % 2 == 0: return 0
-        return 1 if (m % 4) == 1 else -1
-    def chi_mod5(m):
-        r = m % 5
-        if r==0: return 0
-        return 1 if r in (1,4) else -1
-    def chi_mod8(m):
-        if math.gcd(m,8)!=1: return 0
-        r = m % 8
-        return 1 if r in (1,7) else -1
-    def chi_mod12(m):
-        if math.gcd(m,12)!=1: return 0
-        r = m % 12
-        return 1 if r in (1,11) else -1
-    if modulus == 4:
-        chi = np.array([chi_mod4(int(x)) for x in n], dtype=float)
-    elif modulus == 5:
-        chi = np.array([chi_mod5(int(x)) for x in n], dtype=float)
-    elif modulus == 8:
-        chi = np.array([chi_mod8(int(x)) for x in n], dtype=float)
-    elif modulus == 12:
-        chi = np.array([chi_mod12(int(x)) for x in n], dtype=float)
-    else:
-        raise ValueError("Unsupported modulus. Use one of {4,5,8,12}.")
-    return chi * G_values
+
+try:
+    import prime_polarity  # noqa: F401
+except ImportError:  # running from a source checkout without `pip install -e .`
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from prime_polarity.generators import Z_batch
+from prime_polarity.cache import ZCache
+from prime_polarity.sieves import iter_prime_mask, mobius_range
+from prime_polarity.features import build_feature_graph, feature_context
+from prime_polarity.quantize import check_quantized
 
 def k3_golden_ln_bands(n0: int, N: int) -> np.ndarray:
     PHI = (1 + 5**0.5) / 2.0
@@ -116,53 +23,171 @@ def k3_golden_ln_bands(n0: int, N: int) -> np.ndarray:
     score = 1.0 - 3.0 * dists
     return np.clip(score, 0.0, 1.0)
 
+COLUMNS = ["n", "is_prime", "Z_raw", "FracPartMin", "ForwardDiff", "LogMellinSlope", "MobiusFast",
+           "Dirichlet_q4", "Dirichlet_q5", "Dirichlet_q8", "Dirichlet_q12", "K3"]
+DTYPES = {"n": "int64", "is_prime": "bool"}
+# Z_raw stays float64 whatever --dtype says: later chunks' Möbius twists read it.
+FIXED = ("n", "is_prime", "Z_raw")
+MANIFEST = "manifest.json"
+
+# Dataset column -> feature graph node.
+GRAPH = build_feature_graph((4, 5, 8, 12))
+GRAPH.add("K3", lambda ctx: k3_golden_ln_bands(ctx["n0"], ctx["N"]))
+NODES = {"Z_raw": "Z_raw", "FracPartMin": "Frac_part_min", "ForwardDiff": "Forward_diff",
+         "LogMellinSlope": "LogMellin_slope", "MobiusFast": "Mobius_twist",
+         "Dirichlet_q4": "Dirichlet_proj_q=4", "Dirichlet_q5": "Dirichlet_proj_q=5",
+         "Dirichlet_q8": "Dirichlet_proj_q=8", "Dirichlet_q12": "Dirichlet_proj_q=12", "K3": "K3"}
+
+def compute_Z(a: int, b: int, dps: int, cache=None) -> np.ndarray:
+    if cache is not None:
+        return cache.get(a, b, dps)
+    return Z_batch(a, b, dps)[0]
+
+def build_chunk(a: int, b: int, start: int, end: int, dps: int, Z_col, cache=None, mu=None) -> dict:
+    """
+    Columns for n in [a, b] of the dataset [start, end].
+
+    Z is evaluated on [a, b+1] (clipped to the dataset) so ForwardDiff and
+    LogMellinSlope match a whole-range computation at chunk edges. Z_col is the
+    Z_raw column of the whole dataset (e.g. a memmap); this chunk's values are
+    written into it before the Möbius twist, which reads G(n/d) for every n/d in
+    [start, b] from earlier chunks. `mu` is a Möbius table covering end // start.
+    Features come from the shared feature graph, each intermediate computed once.
+    """
+    hi = min(end, b + 1)
+    Z_ext = compute_Z(a, hi, dps, cache)
+    Z = Z_ext[:b - a + 1]
+    Z_col[a - start:b - start + 1] = Z
+    G_next = float(Z_ext[-1]) if hi > b else None
+
+    labels = np.empty(b - a + 1, dtype=bool)
+    for s, e, mask in iter_prime_mask(a, b):
+        labels[s-a:e-a+1] = mask
+
+    ctx = feature_context(Z, a, G_next, Z_col, start, mu)
+    feats = GRAPH.compute(ctx, only=set(NODES.values()))
+    data = {"n": np.arange(a, b + 1), "is_prime": labels}
+    data.update((col, feats[node]) for col, node in NODES.items())
+    return data
+
+def _write_manifest(state_dir: str, manifest: dict):
+    path = os.path.join(state_dir, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def choose_dtypes(data: dict, dtype: str) -> dict:
+    """
+    Column dtypes for --dtype, decided on the first chunk: each feature column is
+    stored in `dtype` if that leaves its AUC on the chunk unchanged (within
+    quantize.DEFAULT_AUC_TOL), else in float64.
+    """
+    return {c: DTYPES.get(c, "float64") if c in FIXED or not check_quantized(data[c], data["is_prime"], dtype)
+            else dtype for c in COLUMNS}
+
+def _open_state(state_dir: str, params: dict):
+    """Load a matching manifest to resume from, or start a fresh one."""
+    path = os.path.join(state_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if {k: manifest.get(k) for k in params} != params:
+            sys.exit(f"{path} was written with different parameters; remove it or pick another --out")
+        return manifest, True
+    os.makedirs(state_dir, exist_ok=True)
+    manifest = dict(params, columns=None, next=params["start"], rows=0, complete=False)
+    return manifest, False
+
+def _csv_cells(a: np.ndarray) -> np.ndarray:
+    """A column as CSV cells: NaN as an empty cell, floats in their shortest round-trip form."""
+    if a.dtype.kind == "f":
+        return np.where(np.isnan(a), "", a.astype(str))
+    return a.astype(str)
+
+def write_dataset(start: int, end: int, out: str, fmt: str, chunk: int, dps: int, cache=None,
+                  dtype: str = "float64"):
+    """
+    Stream the dataset chunk by chunk. "npy" writes a directory with one .npy column
+    per feature plus manifest.json; "csv" appends to one CSV and keeps its manifest
+    and Z_raw scratch column in <out>.state/ until the run completes. The manifest
+    is updated after every chunk, so an interrupted run resumes where it stopped.
+    With dtype="float32", feature columns are stored in float32 where the first
+    chunk shows it keeps their AUC (see choose_dtypes); the manifest records the
+    dtype of every column.
+    """
+    params = {"start": start, "end": end, "chunk": chunk, "dps": dps, "format": fmt, "dtype": dtype}
+    state_dir = out if fmt == "npy" else out + ".state"
+    manifest, resume = _open_state(state_dir, params)
+    N = end - start + 1
+    mode = "r+" if resume else "w+"
+
+    Z_col = np.lib.format.open_memmap(os.path.join(out if fmt == "npy" else state_dir, "Z_raw.npy"), mode=mode,
+                                      dtype="float64", shape=(N,))
+    if fmt == "csv":
+        with open(out, "r+b" if resume else "wb") as f:
+            f.truncate(manifest.get("csv_bytes", 0))
+
+    cols = None
+    mu = mobius_range(0, end // max(start, 1))
+    for a in range(manifest["next"], end + 1, chunk):
+        b = min(end, a + chunk - 1)
+        data = build_chunk(a, b, start, end, dps, Z_col, cache, mu)
+        if manifest["columns"] is None:
+            manifest["columns"] = choose_dtypes(data, dtype)
+        data = {c: np.asarray(data[c], dtype=manifest["columns"][c]) for c in COLUMNS}
+        if fmt == "npy" and cols is None:
+            cols = {c: Z_col if c == "Z_raw" else
+                    np.lib.format.open_memmap(os.path.join(out, c + ".npy"), mode=mode,
+                                              dtype=manifest["columns"][c], shape=(N,))
+                    for c in COLUMNS}
+        if fmt == "npy":
+            for c in COLUMNS:
+                cols[c][a - start:b - start + 1] = data[c]
+                cols[c].flush()
+        else:
+            Z_col.flush()
+            with open(out, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f, lineterminator="\n")
+                if a == start:
+                    writer.writerow(COLUMNS)
+                writer.writerows(zip(*(_csv_cells(data[c]) for c in COLUMNS)))
+                manifest["csv_bytes"] = f.tell()
+        manifest["next"] = b + 1
+        manifest["rows"] = b - start + 1
+        _write_manifest(state_dir, manifest)
+
+    manifest["complete"] = True
+    if fmt == "npy":
+        _write_manifest(state_dir, manifest)
+    else:
+        del Z_col
+        shutil.rmtree(state_dir)
+    return manifest["rows"]
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--start", type=int, required=True)
     ap.add_argument("--end", type=int, required=True)
-    ap.add_argument("--out", type=str, required=True)
+    ap.add_argument("--out", type=str, required=True,
+                    help="Output path: *.csv for CSV, otherwise a directory of .npy columns")
+    ap.add_argument("--format", choices=["auto", "npy", "csv"], default="auto")
+    ap.add_argument("--chunk", type=int, default=1 << 20, help="Rows computed and written per chunk")
     ap.add_argument("--dps", type=int, default=50, help="mpmath precision")
+    ap.add_argument("--cache", type=str, default="", help="Directory for the persistent Z(n) cache")
+    ap.add_argument("--dtype", choices=["float64", "float32"], default="float64",
+                    help="Feature column dtype; a column whose AUC float32 would change on the first "
+                         "chunk stays float64 (later chunks are not rechecked)")
     args = ap.parse_args()
 
-    mp.dps = max(30, int(args.dps))
-
-    start, end = args.start, args.end
-    n = np.arange(start, end+1)
-    is_prime = prime_sieve_up_to(end)
-    labels = np.array([is_prime[i] for i in n], dtype=bool)
-
-    # Z_raw
-    Z = np.array([Z_raw(int(i)) for i in n], dtype=float)
-    # Features
-    f_frac = fractional_part_min(Z.copy())
-    f_diff = forward_diff(Z.copy())
-    f_logm = logmellin_slope(Z.copy(), start)
-    f_mobi = mobius_twist_fast(Z.copy(), start)
-    f_q4 = dirichlet_projection(Z.copy(), start, 4)
-    f_q5 = dirichlet_projection(Z.copy(), start, 5)
-    f_q8 = dirichlet_projection(Z.copy(), start, 8)
-    f_q12 = dirichlet_projection(Z.copy(), start, 12)
-    f_k3 = k3_golden_ln_bands(start, len(Z))
-
-    df = pd.DataFrame({
-        "n": n,
-        "is_prime": labels,
-        "Z_raw": Z,
-        "FracPartMin": f_frac,
-        "ForwardDiff": f_diff,
-        "LogMellinSlope": f_logm,
-        "MobiusFast": f_mobi,
-        "Dirichlet_q4": f_q4,
-        "Dirichlet_q5": f_q5,
-        "Dirichlet_q8": f_q8,
-        "Dirichlet_q12": f_q12,
-        "K3": f_k3,
-    })
-
-    outp = args.out
-    os.makedirs(os.path.dirname(outp), exist_ok=True)
-    df.to_csv(outp, index=False)
-    print(f"Wrote dataset: {outp}  rows={len(df)}")
+    fmt = args.format
+    if fmt == "auto":
+        fmt = "csv" if args.out.endswith(".csv") else "npy"
+    parent = os.path.dirname(os.path.abspath(args.out))
+    os.makedirs(parent, exist_ok=True)
+    cache = ZCache(args.cache) if args.cache else None
+
+    rows = write_dataset(args.start, args.end, args.out, fmt, max(1, args.chunk), args.dps, cache, args.dtype)
+    print(f"Wrote dataset: {args.out}  rows={rows}")
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,10 @@
 
 __all__ = ["generators", "transforms", "sieves", "metrics"]
 __version__ = "0.1.0"
-# src/prime_polarity/__main__.py
-from .cli import main
-
-if __name__ == "__main__":
-    main()
 
+def __getattr__(name):
+    # `prime_polarity.main` without importing the CLI (and its dependencies) up front.
+    if name == "main":
+        from .cli import main
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
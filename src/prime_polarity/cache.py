@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+from .generators import Z_batch
+
+DEFAULT_SHARD = 1 << 16
+META_SUFFIX = ".meta.json"
+
+class ZCache:
+    """
+    Persistent cache of generator values on disk.
+
+    Values are stored as float64 .npy shards covering aligned blocks of
+    `shard_size` integers, keyed by (generator id, dps, block start, block end).
+    The shard file name is a hash of its key, so lookups never need an index.
+    Each shard has a small `<hash>.meta.json` sidecar with its key, and index()
+    lists shards from those for inspection and cleanup. Shards and sidecars are
+    written atomically and never rewritten, so concurrent workers can share one
+    cache directory.
+    """
+
+    def __init__(self, root: str, shard_size: int = DEFAULT_SHARD):
+        self.root = root
+        self.shard_size = int(shard_size)
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(generator: str, dps: int, start: int, end: int) -> str:
+        return f"{generator}|{int(dps)}|{start}|{end}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, hashlib.sha1(key.encode()).hexdigest()[:20] + ".npy")
+
+    def _load(self, key: str):
+        try:
+            return np.load(self._path(key), mmap_mode="r")
+        except FileNotFoundError:
+            return None
+
+    def _store(self, key: str, values: np.ndarray, generator: str, dps: int, start: int, end: int):
+        path = self._path(key)
+        self._write(path, lambda f: np.save(f, np.ascontiguousarray(values, dtype=np.float64)))
+        meta = {"key": key, "file": os.path.basename(path), "generator": generator, "dps": int(dps),
+                "start": start, "end": end}
+        self._write(path[:-len(".npy")] + META_SUFFIX,
+                    lambda f: f.write(json.dumps(meta, sort_keys=True).encode()))
+
+    @staticmethod
+    def _write(path: str, write):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+
+    def index(self) -> dict:
+        """{key: {"file", "generator", "dps", "start", "end"}} for every shard, read from the sidecars."""
+        index = {}
+        for name in os.listdir(self.root):
+            if not name.endswith(META_SUFFIX):
+                continue
+            try:
+                with open(os.path.join(self.root, name), encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            index[meta.pop("key")] = meta
+        return index
+
+    def get(self, start: int, end: int, dps: int, generator: str = "Z_raw", compute=None) -> np.ndarray:
+        """
+        Values for n in [start, end]. Missing shards are computed with
+        `compute(block_start, block_end)` (default: Z_batch at `dps`) and stored.
+        A range inside one shard is returned as a read-only memory-mapped view.
+        """
+        if compute is None:
+            def compute(a, b):
+                return Z_batch(a, b, dps)[0]
+        size = self.shard_size
+        parts = []
+        for b0 in range(start - start % size, end + 1, size):
+            b1 = b0 + size - 1
+            key = self.key(generator, dps, b0, b1)
+            shard = self._load(key)
+            if shard is None:
+                shard = compute(b0, b1)
+                self._store(key, shard, generator, dps, b0, b1)
+            parts.append(shard[max(start, b0) - b0:min(end, b1) - b0 + 1])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
@@ -0,0 +1,179 @@
+import math
+from functools import lru_cache
+import numpy as np
+
+def _factorize(n: int):
+    """Prime factorization of n as a list of (p, e) pairs, p increasing."""
+    out = []
+    p = 2
+    while p * p <= n:
+        if n % p == 0:
+            e = 0
+            while n % p == 0:
+                n //= p
+                e += 1
+            out.append((p, e))
+        p += 1 if p == 2 else 2
+    if n > 1:
+        out.append((n, 1))
+    return out
+
+def _primitive_root(p: int, e: int) -> int:
+    """A generator of (Z/p^eZ)^* for an odd prime p."""
+    phi = p - 1
+    factors = [f for f, _ in _factorize(phi)]
+    g = 2
+    while any(pow(g, phi // f, p) == 1 for f in factors):
+        g += 1
+    if e >= 2 and pow(g, p - 1, p * p) == 1:
+        g += p
+    return g
+
+def _log_table(m: int, gens):
+    """
+    Discrete logs of every residue mod m w.r.t. commuting generators `gens` with
+    orders given as (g, order) pairs. Returns one int64 array per generator, -1 for
+    non-units.
+    """
+    logs = [np.full(m, -1, dtype=np.int64) for _ in gens]
+    (g0, o0), rest = gens[0], gens[1:]
+    if rest:  # 2^e with e>=3: r = (-1)^a * 5^b
+        (g1, o1), = rest
+        x = 1
+        for b in range(o1):
+            logs[0][x], logs[1][x] = 0, b
+            y = (-x) % m
+            logs[0][y], logs[1][y] = 1, b
+            x = x * g1 % m
+        return logs
+    x = 1
+    for a in range(o0):
+        logs[0][x] = a
+        x = x * g0 % m
+    return logs
+
+@lru_cache(maxsize=None)
+def _components(q: int):
+    """
+    Cyclic decomposition of (Z/qZ)^* as a tuple of (modulus, log_lookup, order),
+    one entry per cyclic factor, in the order used to number characters.
+    """
+    comps = []
+    for p, e in _factorize(q):
+        m = p**e
+        if p == 2:
+            if e == 1:
+                continue
+            if e == 2:
+                comps.append((m, _log_table(m, [(m - 1, 2)])[0], 2))
+                continue
+            lm1, l5 = _log_table(m, [(m - 1, 2), (5, m // 4)])
+            comps.append((m, lm1, 2))
+            comps.append((m, l5, m // 4))
+            continue
+        order = m - m // p
+        comps.append((m, _log_table(m, [(_primitive_root(p, e), order)])[0], order))
+    return tuple(comps)
+
+def num_characters(q: int) -> int:
+    """Number of Dirichlet characters mod q, i.e. phi(q)."""
+    out = q
+    for p, _ in _factorize(q):
+        out -= out // p
+    return out
+
+@lru_cache(maxsize=256)
+def character_table(q: int, index: int = 0) -> np.ndarray:
+    """
+    Values chi(r) for r = 0..q-1 of the Dirichlet character mod q with the given
+    index (0 = principal). Characters are numbered by the mixed-radix exponents
+    of their values on the generators of (Z/qZ)^*, so index runs over
+    0..num_characters(q)-1 and covers every character, primitive or induced.
+
+    Returns a read-only array; float64 for real characters, complex128 otherwise.
+    Values of order 1, 2 and 4 are exact.
+    """
+    if q < 1:
+        raise ValueError("modulus must be a positive integer")
+    if not 0 <= index < num_characters(q):
+        raise ValueError(f"character index must be in [0, {num_characters(q)}) for q={q}")
+
+    comps = _components(q)
+    L = 1
+    for _, _, order in comps:
+        L = L * order // math.gcd(L, order)
+    r = np.arange(q)
+    k = np.zeros(q, dtype=np.int64)
+    unit = np.gcd(r, q) == 1
+    digits = index
+    for m, lookup, order in comps:
+        b = digits % order
+        digits //= order
+        lg = lookup[r % m]
+        k += lg * (b * (L // order))
+    k %= L
+
+    table = np.exp(2j * np.pi * k / L)
+    table[k == 0] = 1.0
+    table[2 * k == L] = -1.0
+    table[4 * k == L] = 1j
+    table[4 * k == 3 * L] = -1j
+    table[~unit] = 0.0
+    if not table.imag.any():
+        table = table.real.copy()
+    table.flags.writeable = False
+    return table
+
+def is_real(q: int, index: int) -> bool:
+    return not np.iscomplexobj(character_table(q, index))
+
+def is_even(q: int, index: int) -> bool:
+    """True if chi(-1) = +1."""
+    return q <= 2 or character_table(q, index)[q - 1] == 1
+
+def conductor(q: int, index: int) -> int:
+    """Smallest f | q such that chi is induced from a character mod f."""
+    table = character_table(q, index)
+    r = np.arange(q)
+    unit = table != 0
+    for f in range(1, q + 1):
+        if q % f:
+            continue
+        ker = unit & (r % f == 1 % f)
+        if np.all(table[ker] == 1):
+            return f
+    return q
+
+def is_primitive(q: int, index: int) -> bool:
+    return conductor(q, index) == q
+
+@lru_cache(maxsize=None)
+def default_character(q: int) -> int:
+    """
+    Index of the real non-principal character mod q with the largest conductor,
+    preferring even characters. For q = 4, 5, 8, 12 this is the Kronecker symbol
+    of discriminant -4, 5, 8, 12 respectively.
+    """
+    if q < 3:
+        raise ValueError("no non-principal character exists for modulus < 3")
+    # Real characters take exponent 0 or order/2 on each cyclic factor.
+    indices, radix = [0], 1
+    for _, _, order in _components(q):
+        if order % 2 == 0:
+            indices += [i + order // 2 * radix for i in indices]
+        radix *= order
+    best, best_key = None, None
+    for index in sorted(indices):
+        if index == 0:
+            continue
+        key = (conductor(q, index), is_even(q, index))
+        if best_key is None or key > best_key:
+            best, best_key = index, key
+    return best
+
+def character_values(n0: int, N: int, q: int, index: int = None) -> np.ndarray:
+    """chi(n) for n in [n0, n0+N-1] as one gather from the residue table."""
+    if index is None:
+        index = default_character(q)
+    table = character_table(q, index)
+    return table[np.arange(n0, n0 + N, dtype=np.int64) % q]
@@ -1,87 +1,200 @@
 import argparse
-import numpy as np
-
-from .generators import set_precision, Z_raw, Z_o_placeholder
-from .transforms import fractional_part_min, forward_diff, logmellin_slope, mobius_twist, dirichlet_projection
-from .metrics import labels_for_range, auc_from_scores, polarity_index, split_windows, stability
-
-def compute_G(start: int, end: int, use_zo: bool=False):
-    N = end - start + 1
-    Z = np.zeros(N, dtype=float)
-    Zo = np.zeros(N, dtype=float) if use_zo else None
-    for i, n in enumerate(range(start, end+1)):
-        z = Z_raw(n)
-        if z is None:
-            z = 0.0
-        Z[i] = z
-        if use_zo:
-            zo = Z_o_placeholder(n)
-            Zo[i] = 0.0 if zo is None else zo
-    return Z, Zo
-
-def feature_stack(Z, start, mods):
-    feats = {}
-    feats["Z_raw"] = Z
-    feats["Frac_part_min"] = fractional_part_min(Z)
-    feats["Forward_diff"] = forward_diff(Z)
-    feats["LogMellin_slope"] = logmellin_slope(Z, start)
-    feats["Mobius_twist"] = mobius_twist(Z, start)
-    for q in mods:
-        feats[f"Dirichlet_proj_q={q}"] = dirichlet_projection(Z, start, q)
-    return feats
-
-def score_range(start, end, windows, window_size, use_zo, mods, dps):
-    set_precision(dps)
-    ranges = split_windows(start, end, windows, window_size)
-    results = []
+import sys
+from contextlib import nullcontext
 
-    for (s,e) in ranges:
-        labels = labels_for_range(s,e)
-        Z, Zo = compute_G(s,e,use_zo=use_zo)
-        feats = feature_stack(Z, s, mods)
-        if use_zo:
-            feats["Z_o_placeholder"] = Zo
-        window_scores = {}
-        for name, arr in feats.items():
-            auc = auc_from_scores(arr, labels)
-            pi = polarity_index(auc)
-            window_scores[name] = (auc, pi)
-        results.append(((s,e), window_scores))
-
-    names = sorted({name for _,ws in results for name in ws.keys()})
-    table = []
-    for name in names:
-        pis = []
-        aucs = []
-        for (_, ws) in results:
-            if name in ws:
-                auc, pi = ws[name]
-                pis.append(pi); aucs.append(auc)
-        if len(pis)==0:
+# The scoring pipeline lives in .scoring; these names are re-exported lazily so
+# `prime-polarity --help` and argument errors never import NumPy or mpmath.
+_SCORING = ("compute_G", "generator_list", "feature_names", "feature_stack", "score_window", "score_range")
+
+def __getattr__(name):
+    if name in _SCORING or name.startswith("_score"):
+        from . import scoring
+        return getattr(scoring, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def parse_mods(spec: str):
+    """
+    Parse "4,5,7:2,liouville" into [4, 5, (7, 2), "liouville"]; "q:k" selects
+    character index k mod q, and names (e.g. "mangoldt", "ramanujan:12") stay
+    strings for the arithmetic transforms (features.parse_arithmetic).
+    """
+    mods = []
+    for x in spec.split(","):
+        x = x.strip()
+        if not x:
             continue
-        avg_auc = float(np.mean(aucs))
-        avg_pi = float(np.mean(pis))
-        is_stable = stability(pis, min_pi=0.2, max_rel_var=0.2)
-        table.append((name, avg_auc, avg_pi, is_stable, pis))
+        if x[0].isalpha():
+            mods.append(x.lower())
+        elif ":" in x:
+            q, k = x.split(":", 1)
+            mods.append((int(q), int(k)))
+        else:
+            mods.append(int(x))
+    return mods
 
-    table.sort(key=lambda x: x[2], reverse=True)
-    return ranges, table
+def results_main(argv=None):
+    """`prime-polarity results STORE ...`: aggregate stored per-window scores."""
+    parser = argparse.ArgumentParser(prog="prime-polarity results",
+                                     description="Query the per-window AUC/PI history in a result store.")
+    parser.add_argument("store", help="SQLite store written with --store.")
+    parser.add_argument("--feature", type=str, default=None)
+    parser.add_argument("--run", type=int, default=None)
+    parser.add_argument("--dps", type=str, default=None, help="Working precision of the runs, or 'auto'.")
+    parser.add_argument("--mask", type=str, default=None, help="'' for unmasked runs, 'odd', 'coprime:q'.")
+    parser.add_argument("--min-start", type=int, default=None, help="Only windows starting at or above this n.")
+    parser.add_argument("--max-end", type=int, default=None, help="Only windows ending at or below this n.")
+    parser.add_argument("--by", type=str, default="feature",
+                        help="Comma list of grouping columns: feature, run, dps, mask, window_start, window_end.")
+    parser.add_argument("--windows", action="store_true", help="List the matching windows instead of aggregating.")
+    parser.add_argument("--stability", action="store_true",
+                        help="Also apply the stability test to each feature's stored PI history.")
+    parser.add_argument("--top", type=int, default=50)
+    args = parser.parse_args(argv)
 
-def main():
-    parser = argparse.ArgumentParser(description="Prime Polarity scorer for Z(p)/Z(o) generators.")
+    from .store import ResultStore
+    filters = dict(feature=args.feature, run=args.run, dps=args.dps, mask=args.mask, min_start=args.min_start,
+                   max_end=args.max_end)
+    with ResultStore(args.store) as store:
+        if args.windows:
+            print(f"{'run':>5s} {'feature':30s} {'start':>12s} {'end':>12s} {'AUC':>8s} {'PI':>8s}")
+            for run, feature, s, e, auc, pi in store.rows(**filters):
+                print(f"{run:5d} {feature:30s} {s:12d} {e:12d} {auc:8.3f} {pi:8.3f}")
+            return
+        by = [c.strip() for c in args.by.split(",") if c.strip()]
+        try:
+            groups = store.aggregate(by, **filters)[:args.top]
+        except ValueError as exc:
+            parser.error(str(exc))
+        header = " ".join(f"{c:>14s}" for c in by)
+        print(f"{header} {'windows':>8s} {'AUC':>8s} {'PI':>8s} {'min PI':>8s} {'max PI':>8s} {'std PI':>8s}"
+              + ("  Stable" if args.stability else ""))
+        for g in groups:
+            line = " ".join(f"{str(g[c]):>14s}" for c in by)
+            line += (f" {g['windows']:8d} {g['auc']:8.3f} {g['pi']:8.3f} {g['min_pi']:8.3f} {g['max_pi']:8.3f}"
+                     f" {g['std_pi']:8.3f}")
+            if args.stability and "feature" in by:
+                group_filters = {**filters, **{c: g[c] for c in by if c in ("feature", "run", "dps", "mask")}}
+                line += "       ✓" if store.stability(**group_filters) else ""
+            print(line)
+
+def main(argv=None):
+    """
+    `prime-polarity [score] ...` scores one range, `prime-polarity sweep SPEC ...`
+    runs a sweep and `prime-polarity results STORE ...` queries stored scores.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["sweep"]:
+        from .sweep import main as sweep_main
+        return sweep_main(argv[1:])
+    if argv[:1] == ["results"]:
+        return results_main(argv[1:])
+    if argv[:1] == ["score"]:
+        argv = argv[1:]
+    parser = argparse.ArgumentParser(prog="prime-polarity", description="Prime Polarity scorer for Z(p)/Z(o) generators.",
+                                     epilog="See also 'prime-polarity sweep --help' (multi-range sweeps) and "
+                                            "'prime-polarity results --help' (stored score queries).")
     parser.add_argument("--start", type=int, default=100000)
     parser.add_argument("--end", type=int, default=120000)
     parser.add_argument("--windows", type=int, default=3)
     parser.add_argument("--window-size", type=int, default=0, help="If 0, auto-derive from range/windows.")
     parser.add_argument("--use-zo", action="store_true", help="Include Z(o) placeholder feature.")
-    parser.add_argument("--mods", type=str, default="4,5,8,12", help="Comma list of small moduli for Dirichlet projections.")
-    parser.add_argument("--dps", type=int, default=50, help="mpmath precision digits.")
-    args = parser.parse_args()
+    parser.add_argument("--generators", type=str, default="Z",
+                        help="Comma list of registered generators; the first is transformed, the rest are "
+                             "scored raw (e.g. Z,Zo or G:a:p:c for exp(a*zeta(p*n+c))).")
+    parser.add_argument("--mods", type=str, default="4,5,8,12", help="Comma list of moduli for Dirichlet projections; q:k picks character index k mod q (real part if complex). "
+                             "Names add arithmetic projections and twists: mobius, liouville, mangoldt, divisors, "
+                             "totient, omega, ramanujan:q.")
+    parser.add_argument("--dps", type=str, default="50",
+                        help="mpmath precision digits, or 'auto': evaluate at the floor precision and "
+                             "re-evaluate only float64 near-ties at increasing precision.")
+    parser.add_argument("--max-dps", type=int, default=None,
+                        help="Escalation cap for --dps auto (default: precision.DEFAULT_MAX_DPS).")
+    parser.add_argument("--precise", action="store_true",
+                        help="Carry Z as 2 + residual in double-double through every feature (large n).")
+    parser.add_argument("--mask", type=str, default="",
+                        help="Score only odd n ('odd') or n coprime to q ('coprime:q'); "
+                             "the others are evaluated only where a forward difference needs G(n+1) "
+                             "(with 'odd', that is every even n).")
+    parser.add_argument("--dtype", choices=["float64", "float32", "int32"], default="float64",
+                        help="Feature dtype for ranking only (transforms stay float64): float32 or rank-preserving "
+                             "int32 rank each feature on its own as it is computed instead of stacking a "
+                             "float64 matrix; features whose AUC would change fall back to float64.")
+    parser.add_argument("--cache", type=str, default="", help="Directory for the persistent Z(n) cache (off if empty).")
+    parser.add_argument("--store", type=str, default="",
+                        help="Append every window's AUC/PI to this SQLite result store (see 'prime-polarity results').")
+    parser.add_argument("--stride", type=int, default=0,
+                        help="If >0, slide a --window-size window by this many integers and print PI per step.")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes (1 = serial, 0 = all cores).")
+    parser.add_argument("--timings", action="store_true",
+                        help="Print wall/CPU time and call counts per stage (sieve, Z, features, AUC).")
+    parser.add_argument("--profile", type=str, default="",
+                        help="Also track allocations and write a Chrome trace-event JSON to this path.")
+    args = parser.parse_args(argv)
+
+    # Heavy imports (NumPy, mpmath, the pipeline) only once there is work to do.
+    from concurrent.futures import ProcessPoolExecutor
+    from .cache import ZCache
+    from .generators import get_generator
+    from .precision import DEFAULT_MAX_DPS, MIN_DPS
+    from .profiling import Recorder, stage
+    from .scoring import feature_names, score_range
+    from .store import ResultStore
+    from .wheel import parse_mask
 
     window_size = None if args.window_size == 0 else args.window_size
-    mods = [int(x) for x in args.mods.split(",") if x.strip()]
+    try:
+        mods = parse_mods(args.mods)
+        feature_names(mods)
+    except ValueError as exc:
+        parser.error(f"--mods: {exc}")
+    cache = ZCache(args.cache) if args.cache else None
+    generators = [g.strip() for g in args.generators.split(",") if g.strip()]
+    try:
+        for name in generators:
+            get_generator(name)
+    except ValueError as exc:
+        parser.error(str(exc))
+    try:
+        mask = parse_mask(args.mask)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if mask is not None and (args.precise or args.stride):
+        parser.error("--mask cannot be combined with --precise or --stride")
+    escalate = args.dps == "auto"
+    try:
+        dps = MIN_DPS if escalate else int(args.dps)
+    except ValueError:
+        parser.error("--dps must be an integer or 'auto'")
 
-    ranges, table = score_range(args.start, args.end, args.windows, window_size, args.use_zo, mods, args.dps)
+    if args.stride:
+        from .rolling import SlidingScorer
+        if window_size is None:
+            parser.error("--stride needs --window-size")
+        scorer = SlidingScorer(args.start, window_size, args.stride, mods, dps, cache=cache)
+        header = None
+        for (s, e), scores in scorer.run(args.end):
+            if header is None:
+                header = list(scores)
+                print(f"{'start':>12s} {'end':>12s}  " + "  ".join(f"{n:>7s}" for n in header))
+            print(f"{s:12d} {e:12d}  " + "  ".join(f"{scores[n][1]:>{max(7, len(n))}.3f}" for n in header))
+        return
+
+    recorder = Recorder(memory=bool(args.profile)) if args.timings or args.profile else nullcontext()
+    stats = {}
+    options = dict(cache=cache, generators=generators, escalate=escalate, max_dps=args.max_dps or DEFAULT_MAX_DPS, stats=stats,
+                   precise=args.precise, mask=mask, dtype=args.dtype)
+    store = ResultStore(args.store) if args.store else None
+    options["store"] = store
+    with recorder, stage("score_range"):
+        if args.jobs == 1:
+            ranges, table = score_range(args.start, args.end, args.windows, window_size, args.use_zo, mods,
+                                        dps, **options)
+        else:
+            with ProcessPoolExecutor(max_workers=args.jobs or None) as executor:
+                ranges, table = score_range(args.start, args.end, args.windows, window_size, args.use_zo,
+                                            mods, dps, executor=executor, workers=args.jobs or None, **options)
+    if store is not None:
+        store.close()
 
     print("Windows:")
     for (s,e) in ranges:
@@ -93,5 +206,23 @@ def main():
         stab = "✓" if is_stable else " "
         print(f"{name:30s} {avg_auc:8.3f} {avg_pi:8.3f}  {stab:>8s}  {['%.3f'%p for p in pis]}")
 
+    if stats["dtype_fallback"]:
+        print(f"\nFell back to float64 ({args.dtype} would move the AUC), windows per feature:")
+        for name, count in sorted(stats["dtype_fallback"].items()):
+            print(f"  {name}: {count}")
+
+    if escalate:
+        print("\nPrecision escalation (near-ties re-evaluated):")
+        for column, st in stats["escalation"].items():
+            print(f"  {column}: {st['escalated']} values, {st['evaluations']} evaluations, "
+                  f"max dps {st['max_dps'] or dps}, {st['unresolved']} still tied")
+
+    if isinstance(recorder, Recorder):
+        print("\nTimings (this process only):" if args.jobs != 1 else "\nTimings:")
+        print(recorder.format_summary())
+        if args.profile:
+            recorder.save_trace(args.profile)
+            print(f"\nWrote trace: {args.profile}")
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,257 @@
+import numpy as np
+
+from . import ddouble
+from .characters import character_table, character_values, default_character
+from .profiling import stage
+from .sieves import factor_sieve
+from .transforms import (ARITHMETIC, arithmetic_values, dirichlet_convolution, dirichlet_convolution_dd,
+                         fractional_part_min, mobius_twist_range, mobius_twist_range_dd, ramanujan_sum)
+
+class FeatureGraph:
+    """
+    Features as nodes of a dependency graph evaluated once per chunk.
+
+    A node is `fn(ctx, *deps, out=None) -> ndarray`, where `ctx` is the dict passed
+    to run() and `deps` are the values of the nodes it depends on. run() computes
+    only the nodes the requested outputs need, each once, and drops every value as
+    soon as its last consumer has run. Nodes added with inplace=True are handed,
+    as `out`, the buffer of an intermediate (non-output) dependency that dies at
+    that node, so e.g. chi(n)*G(n) overwrites the chi(n) buffer.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+
+    def add(self, name: str, fn, deps=(), output: bool = True, inplace: bool = False):
+        for d in deps:
+            if d not in self.nodes:
+                raise ValueError(f"feature {name!r} depends on unknown node {d!r}")
+        self.nodes[name] = (fn, tuple(deps), output, inplace)
+        return self
+
+    def outputs(self) -> list:
+        return [name for name, (_, _, output, _) in self.nodes.items() if output]
+
+    def schedule(self, only=None) -> list:
+        """Nodes needed for the outputs in `only` (default: all), in a valid evaluation order."""
+        wanted = self.outputs() if only is None else [name for name in self.outputs() if name in only]
+        needed = set()
+        stack = list(wanted)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.nodes[name][1])
+        # Insertion order is topological because add() requires deps to exist.
+        return [name for name in self.nodes if name in needed]
+
+    def run(self, ctx: dict, only=None):
+        """Yield (name, value) for each requested output, in graph order."""
+        order = self.schedule(only)
+        wanted = set(self.outputs() if only is None else only)
+        uses = {name: 0 for name in order}
+        for name in order:
+            for d in self.nodes[name][1]:
+                uses[d] += 1
+        values, owned = {}, set()
+        for name in order:
+            fn, deps, output, inplace = self.nodes[name]
+            args = [values[d] for d in deps]
+            out = None
+            if inplace:
+                for d in deps:
+                    if d in owned and uses[d] == 1 and d not in wanted:
+                        out = values[d]
+                        break
+            with stage("feature:" + name):
+                value = fn(ctx, *args, out=out) if inplace else fn(ctx, *args)
+            for d in deps:
+                uses[d] -= 1
+                if uses[d] == 0:
+                    del values[d]
+                    owned.discard(d)
+            values[name] = value
+            if isinstance(value, np.ndarray) and value.base is None and value is not ctx["G"]:
+                owned.add(name)
+            if name in wanted:
+                yield name, value
+            if uses[name] == 0:
+                del values[name]
+                owned.discard(name)
+
+    def compute(self, ctx: dict, only=None) -> dict:
+        return dict(self.run(ctx, only))
+
+def feature_context(G: np.ndarray, n0: int, G_next: float = None, G_full: np.ndarray = None, g0: int = None,
+                    mu: np.ndarray = None, wheel=None, G_succ: np.ndarray = None) -> dict:
+    """
+    Inputs for one chunk [n0, n0+len(G)-1]: G(n) for the chunk, G(n0+len(G)) if
+    known (else the last forward difference repeats the previous one), and the
+    covering G_full starting at g0 (default: the chunk itself) that the Möbius twist
+    reads, with an optional precomputed Möbius table `mu`. For a graph built with
+    precise=True, G, G_next and G_full are ddouble.DD values.
+
+    With a wheel.Wheel, G and G_full hold only the members of the wheel (from n0
+    and g0 on) and G_succ holds G(n+1) for each n of the chunk, so every feature
+    is the unmasked feature restricted to the members.
+    """
+    if G_full is None:
+        G_full, g0 = G, n0
+    ctx = {"G": G, "n0": n0, "N": len(G), "G_next": G_next, "G_full": G_full, "g0": g0, "mu": mu,
+           "wheel": wheel, "G_succ": G_succ, "n": None, "hi": n0 + len(G) - 1}
+    if wheel is not None:
+        k0 = wheel.index(n0)
+        ctx["n"] = wheel.number(np.arange(k0, k0 + len(G), dtype=np.int64))
+        ctx["hi"] = int(ctx["n"][-1]) if len(G) else n0 - 1
+    return ctx
+
+def _n(ctx):
+    if ctx["n"] is not None:
+        return ctx["n"].astype(float)
+    return np.arange(ctx["n0"], ctx["n0"] + ctx["N"], dtype=float)
+
+def _forward_diff(ctx, G):
+    if ctx["G_succ"] is not None:
+        return np.subtract(ctx["G_succ"], G)
+    d = np.empty(len(G), dtype=float)
+    np.subtract(G[1:], G[:-1], out=d[:-1])
+    if ctx["G_next"] is not None:
+        d[-1] = ctx["G_next"] - G[-1]
+    else:
+        d[-1] = d[-2] if len(G) >= 2 else 0.0
+    return d
+
+def _multiply(ctx, a, b, out=None):
+    return np.multiply(a, b, out=out)
+
+def _mobius_twist(ctx, G):
+    return mobius_twist_range(ctx["G_full"], ctx["g0"], ctx["n0"], ctx["hi"], mu=ctx["mu"], wheel=ctx["wheel"])
+
+def _forward_diff_dd(ctx, G):
+    nxt = ctx["G_next"]
+    d = ddouble.sub(G[1:], G[:-1])
+    if nxt is not None:
+        last = ddouble.sub(ddouble.DD(np.atleast_1d(nxt.hi), np.atleast_1d(nxt.lo)), G[-1:])
+    elif len(G) >= 2:
+        last = d[-1:]
+    else:
+        last = ddouble.DD(np.zeros(1), np.zeros(1))
+    return ddouble.DD(np.concatenate([d.hi, last.hi]), np.concatenate([d.lo, last.lo]))
+
+def _mobius_twist_dd(ctx, G):
+    n0 = ctx["n0"]
+    return mobius_twist_range_dd(ctx["G_full"], ctx["g0"], n0, n0 + ctx["N"] - 1, mu=ctx["mu"])
+
+def _real_character(ctx, q, k):
+    if ctx["n"] is not None:
+        chi = character_table(q, default_character(q) if k is None else k)[ctx["n"] % q]
+    else:
+        chi = character_values(ctx["n0"], ctx["N"], q, k)
+    return chi.real.copy() if np.iscomplexobj(chi) else chi
+
+def _factors(ctx):
+    return factor_sieve(ctx["n0"], ctx["hi"])
+
+def _arithmetic(ctx, factors, kind):
+    f = arithmetic_values(kind, factors)
+    return f if ctx["n"] is None else f[ctx["n"] - ctx["n0"]]
+
+def _ramanujan(ctx, q):
+    n = ctx["n"] if ctx["n"] is not None else np.arange(ctx["n0"], ctx["n0"] + ctx["N"], dtype=np.int64)
+    return ramanujan_sum(q, n)
+
+def _twist(ctx, G, kind):
+    return dirichlet_convolution(ctx["G_full"], ctx["g0"], ctx["n0"], ctx["hi"], kind, wheel=ctx["wheel"])
+
+def _twist_dd(ctx, G, kind):
+    n0 = ctx["n0"]
+    return dirichlet_convolution_dd(ctx["G_full"], ctx["g0"], n0, n0 + ctx["N"] - 1, kind)
+
+def parse_arithmetic(spec: str):
+    """(kind, q) for an arithmetic --mods entry: an ARITHMETIC name (q None) or "ramanujan:q"."""
+    kind, _, q = spec.lower().partition(":")
+    if kind == "ramanujan":
+        try:
+            if int(q) >= 1:
+                return kind, int(q)
+        except ValueError:
+            pass
+    elif kind in ARITHMETIC and not q:
+        return kind, None
+    raise ValueError(f"unknown arithmetic transform {spec!r}; use one of {sorted(ARITHMETIC)} or ramanujan:q")
+
+def _add_arithmetic(g: FeatureGraph, specs, precise: bool):
+    """
+    Per ARITHMETIC name, "<Label>_proj" f(n) G(n) and "<Label>_twist" sum_{d|n}
+    f(d) G(n/d) (Mobius_twist is already a feature); per "ramanujan:q",
+    "Ramanujan_q=<q>" c_q(n) G(n). Every f(n) reads one factor_sieve of the chunk.
+    """
+    for spec in specs:
+        kind, q = parse_arithmetic(spec)
+        if kind == "ramanujan":
+            values, name = f"c_q={q}", f"Ramanujan_q={q}"
+            g.add(values, lambda ctx, q=q: _ramanujan(ctx, q), output=False)
+        else:
+            label = ARITHMETIC[kind][0]
+            values, name = f"{kind}(n)", f"{label}_proj"
+            if "factors" not in g.nodes:
+                g.add("factors", _factors, output=False)
+            g.add(values, lambda ctx, f, kind=kind: _arithmetic(ctx, f, kind), ["factors"], output=False)
+            if kind != "mobius":
+                twist = _twist_dd if precise else _twist
+                g.add(f"{label}_twist", lambda ctx, G, kind=kind, twist=twist: twist(ctx, G, kind), ["G"])
+        if precise:
+            g.add(name, lambda ctx, f, G: ddouble.mul_float(G, f), [values, "G"])
+        else:
+            g.add(name, _multiply, [values, "G"], inplace=True)
+
+def projection_name(q: int, k: int = None) -> str:
+    return f"Dirichlet_proj_q={q}" if k is None else f"Dirichlet_proj_q={q},k={k}"
+
+def build_feature_graph(mods=(4, 5, 8, 12), raw_name: str = "Z_raw", precise: bool = False) -> FeatureGraph:
+    """
+    The scoring features of a generator G: raw value, fractional-part proximity,
+    forward difference, log-Mellin slope (reusing the difference), Möbius twist and
+    the real part of one Dirichlet projection per modulus (q or (q, k)). String
+    entries of `mods` add arithmetic projections and twists (see _add_arithmetic).
+    With precise=True, G is a ddouble.DD and every feature is computed and
+    returned in double-double.
+    """
+    if precise:
+        return _build_dd_graph(mods, raw_name)
+    g = FeatureGraph()
+    g.add("G", lambda ctx: ctx["G"], output=False)
+    g.add(raw_name, lambda ctx, G: G, ["G"])
+    g.add("Frac_part_min", lambda ctx, G: fractional_part_min(G), ["G"])
+    g.add("Forward_diff", _forward_diff, ["G"])
+    g.add("n", _n, output=False)
+    g.add("LogMellin_slope", _multiply, ["n", "Forward_diff"], inplace=True)
+    g.add("Mobius_twist", _mobius_twist, ["G"])
+    for m in mods:
+        if isinstance(m, str):
+            continue
+        q, k = m if isinstance(m, tuple) else (m, None)
+        chi = f"chi_q={q}" if k is None else f"chi_q={q},k={k}"
+        g.add(chi, lambda ctx, q=q, k=k: _real_character(ctx, q, k), output=False)
+        g.add(projection_name(q, k), _multiply, [chi, "G"], inplace=True)
+    _add_arithmetic(g, [m for m in mods if isinstance(m, str)], precise=False)
+    return g
+
+def _build_dd_graph(mods, raw_name):
+    g = FeatureGraph()
+    g.add("G", lambda ctx: ctx["G"], output=False)
+    g.add(raw_name, lambda ctx, G: G, ["G"])
+    g.add("Frac_part_min", lambda ctx, G: ddouble.frac_part_min(G), ["G"])
+    g.add("Forward_diff", _forward_diff_dd, ["G"])
+    g.add("n", _n, output=False)
+    g.add("LogMellin_slope", lambda ctx, n, d: ddouble.mul_float(d, n), ["n", "Forward_diff"])
+    g.add("Mobius_twist", _mobius_twist_dd, ["G"])
+    for m in mods:
+        if isinstance(m, str):
+            continue
+        q, k = m if isinstance(m, tuple) else (m, None)
+        chi = f"chi_q={q}" if k is None else f"chi_q={q},k={k}"
+        g.add(chi, lambda ctx, q=q, k=k: _real_character(ctx, q, k), output=False)
+        g.add(projection_name(q, k), lambda ctx, c, G: ddouble.mul_float(G, c), [chi, "G"])
+    _add_arithmetic(g, [m for m in mods if isinstance(m, str)], precise=True)
+    return g
@@ -1,16 +1,150 @@
-from mpmath import mp, zeta, pi
+import math
+import numpy as np
+
+from .ddouble import DD, from_offset
+from .precision import mp_context
+from .profiling import stage
+
+# Path codes reported by Z_batch for each n.
+PATH_UNDEFINED = 0  # n <= 2 (zeta(1) pole); value is NaN
+PATH_MPMATH = 1     # full-precision mpmath evaluation
+PATH_SERIES = 2     # truncated Dirichlet series in float64
+
+# Number of Dirichlet-series terms the NumPy path may use: zeta(s) ~ sum_{k<=K} k^-s.
+SERIES_TERMS = 32
 
 def set_precision(dps: int = 50):
-    """Set mpmath decimal precision (digits)."""
+    """Set mpmath's global decimal precision (digits), as used by Z_raw without `dps`."""
+    from mpmath import mp
     mp.dps = max(30, int(dps))
 
-def Z_raw(n: int) -> float | None:
-    """Z(n) = exp(pi * zeta(n-1) / n) + 1. Defined for n>=3 (zeta(1) pole)."""
+def Z_mp(n: int, ctx):
+    """Z(n) as an mpf in the mpmath context `ctx`."""
+    return ctx.e**(ctx.pi * ctx.zeta(n - 1) / n) + 1
+
+def Z_raw(n: int, dps: int = None) -> float | None:
+    """
+    Z(n) = exp(pi * zeta(n-1) / n) + 1. Defined for n>=3 (zeta(1) pole). Uses the
+    global mpmath precision unless `dps` is given, in which case a private context
+    is used and global state is left alone.
+    """
     if n <= 2:
         return None
-    val = mp.e**(pi * zeta(n - 1) / n) + 1
+    if dps is not None:
+        return float(Z_mp(n, mp_context(dps)))
+    from mpmath import mp
+    val = mp.e**(mp.pi * mp.zeta(n - 1) / n) + 1
     return float(val)
 
+def series_threshold(dps: int, terms: int = SERIES_TERMS) -> int:
+    """
+    Smallest n for which the truncated series sum_{k<=terms} k^-(n-1) matches
+    zeta(n-1) to `dps` digits.
+
+    The tail is bounded by (K+1)^-s * (1 + (K+1)/(s-1)) with s = n-1, K = terms,
+    so the float64 path is provably exact to the requested precision for n at or
+    above the returned threshold; the only remaining error is float64 rounding.
+    """
+    dps = max(30, int(dps))
+    log_k1 = math.log10(terms + 1)
+    s = max(2, int(dps / log_k1))
+    while -s * log_k1 + math.log10(1 + (terms + 1) / (s - 1)) > -dps:
+        s += 1
+    return s + 1
+
+def _zeta_tail_series(s: np.ndarray, terms: int = SERIES_TERMS) -> np.ndarray:
+    """zeta(s) - 1 via sum_{k=2}^{terms} k^-s, stopping once every term underflows."""
+    eta = np.zeros(len(s), dtype=float)
+    for k in range(2, terms + 1):
+        t = np.exp(-s * math.log(k))
+        if not t.any():
+            break
+        eta += t
+    return eta
+
+def Z_values(n: np.ndarray, dps: int = 50) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized Z(n) for an arbitrary integer array n.
+
+    Returns (Z, path): Z is a float64 array (NaN for n<=2) and path an int8 array
+    of PATH_* codes. n below `series_threshold(dps)` goes through mpmath at `dps`
+    digits; everything above uses the truncated series, whose truncation error is
+    below 10^-dps, so both paths agree up to float64 rounding.
+    """
+    n = np.asarray(n, dtype=np.int64)
+    Z = np.full(len(n), np.nan, dtype=float)
+    path = np.full(len(n), PATH_UNDEFINED, dtype=np.int8)
+
+    n_fast = max(3, series_threshold(dps))
+    slow = (n >= 3) & (n < n_fast)
+    fast = n >= n_fast
+
+    if slow.any():
+        ctx = mp_context(dps)
+        with stage("Z:mpmath"):
+            for i in np.flatnonzero(slow):
+                Z[i] = float(Z_mp(int(n[i]), ctx))
+        path[slow] = PATH_MPMATH
+
+    if fast.any():
+        with stage("Z:series"):
+            nf = n[fast].astype(float)
+            eta = _zeta_tail_series(nf - 1.0)
+            # exp(pi*(1+eta)/n) = exp(pi/n) * (1 + expm1(pi*eta/n)) keeps eta's bits.
+            Z[fast] = np.exp(np.pi / nf) * (1.0 + np.expm1(np.pi * eta / nf)) + 1.0
+        path[fast] = PATH_SERIES
+
+    return Z, path
+
+def Z_dd(n: np.ndarray, dps: int = 50) -> DD:
+    """
+    Z(n) as a double-double 2 + R(n), with the residual R(n) = Z(n) - 2 carried to
+    full float64 relative precision. As n grows, Z(n) -> 2 and its float64 value
+    keeps only a few bits of R; here R = expm1(pi*zeta(n-1)/n) is computed directly
+    (series path) or taken from mpmath as a (hi, lo) pair (small n). NaN for n<=2.
+    """
+    n = np.asarray(n, dtype=np.int64)
+    R = np.full(len(n), np.nan, dtype=float)
+    n_fast = max(3, series_threshold(dps))
+    fast = n >= n_fast
+    if fast.any():
+        nf = n[fast].astype(float)
+        R[fast] = np.expm1(np.pi / nf * (1.0 + _zeta_tail_series(nf - 1.0)))
+    out = from_offset(2.0, R)
+    slow = np.flatnonzero((n >= 3) & ~fast)
+    if len(slow):
+        ctx = mp_context(dps)
+        for i in slow:
+            z = Z_mp(int(n[i]), ctx)
+            out.hi[i] = float(z)
+            out.lo[i] = float(z - out.hi[i])
+    return out
+
+def Z_batch(start: int, end: int, dps: int = 50) -> tuple[np.ndarray, np.ndarray]:
+    """Z_values over n in [start, end]."""
+    return Z_values(np.arange(start, end + 1, dtype=np.int64), dps)
+
+def zeta_values(s: np.ndarray, dps: int = 50) -> np.ndarray:
+    """
+    Vectorized zeta(s) for real s: the truncated series wherever it is exact to
+    `dps` digits (s large), mpmath at `dps` digits elsewhere; NaN at the pole s=1.
+    """
+    s = np.asarray(s, dtype=float)
+    out = np.full(len(s), np.nan, dtype=float)
+    fast = s >= series_threshold(dps) - 1
+    out[fast] = 1.0 + _zeta_tail_series(s[fast])
+    slow = np.flatnonzero(~fast & (s != 1.0) & np.isfinite(s))
+    if len(slow):
+        ctx = mp_context(dps)
+        for i in slow:
+            out[i] = float(ctx.zeta(float(s[i])))
+    return out
+
+def chi4(n: np.ndarray) -> np.ndarray:
+    """Real primitive character mod 4 as a float array: 0 if even, +1 if n≡1, -1 if n≡3."""
+    r = np.asarray(n) & 3
+    return np.where(r == 1, 1.0, np.where(r == 3, -1.0, 0.0))
+
 def Z_o_placeholder(n: int) -> float | None:
     """
     Placeholder for Z(o): a Dirichlet-character flavored variant.
@@ -28,3 +162,104 @@ def Z_o_placeholder(n: int) -> float | None:
     else:  # r==3
         chi = -1.0
     return float(chi * z)
+
+class Generator:
+    """
+    A registered generator: `evaluate(n, dps, *parents)` maps an int64 array n to a
+    float array, receiving the arrays of the generators named in `depends` (same n,
+    same order) so derived generators never recompute their parents. `column` is
+    the stable label used for output columns and cache keys. The optional
+    `evaluate_mp(n, ctx)` gives one value as an mpf in an mpmath context; it lets
+    precision.escalate_ties re-evaluate near-ties at higher precision. The
+    optional `evaluate_dd(n, dps, *parent_dds)` returns a ddouble.DD for precise
+    mode; it receives its parents as DD arrays.
+    """
+
+    def __init__(self, name: str, evaluate, depends=(), column: str = None, evaluate_mp=None, evaluate_dd=None):
+        self.name = name
+        self.evaluate = evaluate
+        self.depends = tuple(depends)
+        self.column = column or name
+        self.evaluate_mp = evaluate_mp
+        self.evaluate_dd = evaluate_dd
+
+    def __repr__(self):
+        return f"Generator({self.name!r}, depends={self.depends!r})"
+
+GENERATORS = {}
+
+def register_generator(name: str, depends=(), column: str = None, evaluate_mp=None, evaluate_dd=None):
+    """Decorator registering `fn(n, dps, *parents) -> ndarray` as generator `name`."""
+    def deco(fn):
+        GENERATORS[name] = Generator(name, fn, depends, column, evaluate_mp, evaluate_dd)
+        return fn
+    return deco
+
+def G_ab_name(a: float, p: float, c: float) -> str:
+    return f"G:{a:g}:{p:g}:{c:g}"
+
+def get_generator(name: str) -> Generator:
+    """
+    Look up a registered generator. Names "G:a:p:c" build (and register) the family
+    G_{a,b}(n) = exp(a * zeta(b(n))) with b(n) = p*n + c on first use.
+    """
+    if name not in GENERATORS and name.startswith("G:"):
+        try:
+            a, p, c = (float(x) for x in name.split(":")[1:])
+        except ValueError:
+            raise ValueError(f"generator {name!r} must look like G:a:p:c") from None
+        canonical = G_ab_name(a, p, c)
+        if canonical not in GENERATORS:
+            register_generator(canonical, evaluate_mp=lambda m, ctx: ctx.exp(a * ctx.zeta(p * m + c)))(
+                lambda n, dps: np.exp(a * zeta_values(p * n.astype(float) + c, dps)))
+        GENERATORS[name] = GENERATORS[canonical]
+    try:
+        return GENERATORS[name]
+    except KeyError:
+        raise ValueError(f"unknown generator {name!r}; registered: {sorted(GENERATORS)}") from None
+
+def resolve_generators(names) -> list:
+    """`names` plus every dependency, parents before children, each once."""
+    order, seen = [], set()
+    def visit(name, stack=()):
+        if name in seen:
+            return
+        if name in stack:
+            raise ValueError(f"generator dependency cycle through {name!r}")
+        for dep in get_generator(name).depends:
+            visit(dep, stack + (name,))
+        seen.add(name)
+        order.append(name)
+    for name in names:
+        visit(name)
+    return order
+
+def evaluate_generators(names, n: np.ndarray, dps: int = 50, known: dict = None, precise: bool = False) -> dict:
+    """
+    {name: values over n} for every generator in `names` (and their dependencies),
+    each evaluated once in batch. Arrays in `known` are used instead of evaluating.
+    With precise=True, generators with a double-double evaluator (whose parents
+    are double-double too) return a ddouble.DD instead of a float array.
+    """
+    n = np.asarray(n, dtype=np.int64)
+    values = dict(known or {})
+    for name in resolve_generators(names):
+        if name not in values:
+            gen = get_generator(name)
+            parents = [values[d] for d in gen.depends]
+            if precise and gen.evaluate_dd is not None and all(isinstance(p, DD) for p in parents):
+                values[name] = gen.evaluate_dd(n, dps, *parents)
+            else:
+                parents = [p.value() if isinstance(p, DD) else p for p in parents]
+                values[name] = gen.evaluate(n, dps, *parents)
+    return values
+
+@register_generator("Z", column="Z_raw", evaluate_mp=Z_mp, evaluate_dd=Z_dd)
+def _Z(n, dps):
+    return Z_values(n, dps)[0]
+
+@register_generator("Zo", depends=("Z",), column="Z_o_placeholder",
+                    evaluate_mp=lambda m, ctx: float(chi4(m)) * Z_mp(m, ctx),
+                    evaluate_dd=lambda n, dps, Z: DD(chi4(n) * Z.hi, chi4(n) * Z.lo))
+def _Zo(n, dps, Z):
+    return chi4(n) * Z
@@ -1,30 +1,114 @@
+import os
+import tempfile
 import numpy as np
-from .sieves import prime_sieve_up_to
+from .sieves import iter_prime_bits, unpack_odd_bits
 
 def labels_for_range(start: int, end: int) -> np.ndarray:
     """Boolean labels array for n in [start, end], True if prime."""
-    is_prime = prime_sieve_up_to(end)
-    labels = np.array([is_prime[n] for n in range(start, end+1)], dtype=bool)
+    labels = np.empty(end - start + 1, dtype=bool)
+    for s, e, bits in iter_prime_bits(start, end):
+        unpack_odd_bits(bits, s, e, labels[s-start:e-start+1])
     return labels
 
 def auc_from_scores(scores: np.ndarray, labels: np.ndarray) -> float:
     """
-    Compute ROC AUC without sklearn using the rank method.
+    Compute ROC AUC without sklearn using the rank method (tied scores get their
+    average rank).
     """
     assert len(scores) == len(labels)
-    n = len(scores)
-    order = np.argsort(scores, kind="mergesort")
-    ranks = np.empty(n, dtype=float)
-    ranks[order] = np.arange(1, n+1, dtype=float)
-    pos = labels
-    neg = ~labels
-    n_pos = pos.sum()
-    n_neg = neg.sum()
+    aucs, _ = auc_batch(np.asarray(scores)[None, :], labels)
+    return float(aucs[0])
+
+def _as_score_matrix(score_matrix) -> np.ndarray:
+    """2-D view of the scores (float32 and int32 kept, anything else float64) with NaN mapped to +inf."""
+    S = np.asarray(score_matrix)
+    if S.dtype != np.float32 and S.dtype != np.int32:
+        S = np.asarray(S, dtype=float)
+    if S.ndim == 1:
+        S = S[None, :]
+    nan = np.isnan(S)
+    if nan.any():
+        S = np.where(nan, np.inf, S)
+    return S
+
+def _argsort_rows(S: np.ndarray):
+    """
+    (order, sorted keys) per row. 32-bit scores are mapped to order-preserving
+    uint32 keys and packed with their column index into one uint64, so a plain
+    sort of one array replaces argsort plus gather; the keys tie exactly where the
+    scores do. Other dtypes use argsort and return the sorted scores.
+    """
+    F, n = S.shape
+    if S.dtype == np.float32 and n <= 1 << 32:
+        u = (S + np.float32(0.0)).view(np.uint32)  # -0.0 -> +0.0
+        u = np.where(u >> 31, ~u, u | np.uint32(1 << 31))
+    elif S.dtype == np.int32 and n <= 1 << 32:
+        u = S.view(np.uint32) ^ np.uint32(1 << 31)
+    else:
+        order = np.argsort(S, axis=1)
+        return order, np.take_along_axis(S, order, axis=1)
+    key = u.astype(np.uint64) << np.uint64(32)
+    key |= np.arange(n, dtype=np.uint64)
+    key.sort(axis=1)
+    return (key & np.uint64(0xFFFFFFFF)).astype(np.intp), (key >> np.uint64(32)).astype(np.uint32)
+
+def _tie_bounds(S: np.ndarray):
+    """
+    Row-wise order and sorted keys of S (_argsort_rows), and for each sorted
+    position the first and last position of its tie group (int32 below 2^30
+    columns, halving their traffic).
+    """
+    F, n = S.shape
+    order, s = _argsort_rows(S)
+    idx = np.arange(n, dtype=np.int32 if n < 1 << 30 else np.int64)
+    new_group = np.ones((F, n), dtype=bool)
+    new_group[:, 1:] = s[:, 1:] != s[:, :-1]
+    first = np.maximum.accumulate(np.where(new_group, idx, idx.dtype.type(0)), axis=1)
+    end_group = np.ones((F, n), dtype=bool)
+    end_group[:, :-1] = new_group[:, 1:]
+    last = np.minimum.accumulate(np.where(end_group, idx, idx.dtype.type(n - 1))[:, ::-1], axis=1)[:, ::-1]
+    return order, s, first, last
+
+def _sorted_midranks(S: np.ndarray):
+    """Row-wise argsort of S, the 1-based average (tie-aware) rank at each sorted position and the sorted keys."""
+    order, s, first, last = _tie_bounds(S)
+    return order, 0.5 * (first + last) + 1.0, s
+
+def midranks(score_matrix: np.ndarray) -> np.ndarray:
+    """Tie-averaged 1-based ranks of each row of a (features x n) matrix, in original order."""
+    S = _as_score_matrix(score_matrix)
+    order, ranks, _ = _sorted_midranks(S)
+    out = np.empty_like(ranks)
+    np.put_along_axis(out, order, ranks, axis=1)
+    return out
+
+def auc_batch(score_matrix: np.ndarray, labels: np.ndarray):
+    """
+    Tie-aware ROC AUC for every row of a (features x n) score matrix at once.
+
+    Rows are sorted in one call; each position gets the average rank of its tie
+    group (found from group starts/ends with cumulative max/min), and AUC follows
+    from the rank sum of the positives. NaN scores are ranked as +inf, as in
+    StreamingAUC. Returns (aucs, pis) as float arrays.
+    """
+    aucs, _, _ = _auc_sorted(_as_score_matrix(score_matrix), labels)
+    return aucs, 2.0*aucs - 1.0
+
+def _auc_sorted(S: np.ndarray, labels: np.ndarray):
+    """(aucs, order, sorted keys) for a score matrix from _as_score_matrix; order is None without both classes."""
+    labels = np.asarray(labels, dtype=bool)
+    assert S.shape[1] == len(labels)
+    F, n = S.shape
+    n_pos = int(labels.sum())
+    n_neg = n - n_pos
     if n_pos == 0 or n_neg == 0:
-        return 0.5
-    sum_ranks_pos = ranks[pos].sum()
-    auc = (sum_ranks_pos - n_pos*(n_pos+1)/2.0) / (n_pos*n_neg)
-    return float(auc)
+        return np.full(F, 0.5), None, None
+
+    order, s, first, last = _tie_bounds(S)
+    # Twice the 0-based midrank is first + last, an integer: sum it exactly.
+    twice = np.sum(first + last, axis=1, where=labels[order], dtype=np.int64)
+    aucs = (0.5 * twice + n_pos - n_pos*(n_pos+1)/2.0) / (n_pos*n_neg)
+    return aucs, order, s
 
 def polarity_index(auc: float) -> float:
     return 2.0*auc - 1.0
@@ -49,10 +133,142 @@ def stability(pis, min_pi: float = 0.2, max_rel_var: float = 0.2) -> bool:
     A crude stability test: all PI >= min_pi and relative std dev <= max_rel_var.
     """
     arr = np.array(pis, dtype=float)
-    if (arr < min_pi).any():
+    if not len(arr):
         return False
-    m = arr.mean()
-    if m == 0:
+    return stable_from_summary(arr.min(), arr.mean(), arr.std(), min_pi, max_rel_var)
+
+def stable_from_summary(min_value: float, mean: float, std: float, min_pi: float = 0.2,
+                        max_rel_var: float = 0.2) -> bool:
+    """The stability rule from summary statistics (min, mean, population std) of the PIs."""
+    if min_value < min_pi or mean == 0:
         return False
-    rel_std = arr.std() / abs(m)
-    return rel_std <= max_rel_var
+    return std / abs(mean) <= max_rel_var
+
+def _group_sorted(v: np.ndarray, pos: np.ndarray, neg: np.ndarray):
+    """Collapse sorted values into (distinct values, positive counts, negative counts)."""
+    if len(v) == 0:
+        return v, pos, neg
+    starts = np.flatnonzero(np.r_[True, v[1:] != v[:-1]])
+    return v[starts], np.add.reduceat(pos, starts), np.add.reduceat(neg, starts)
+
+class StreamingAUC:
+    """
+    Exact tie-aware ROC AUC over data fed in chunks (out-of-core).
+
+    Each update() sorts its chunk, collapses ties into (value, #pos, #neg) runs and
+    spills them to `tmpdir`; result() k-way merges the runs block by block. Memory
+    is bounded by one chunk plus `block` rows per run, independent of the total
+    row count. NaN scores are ranked as +inf. Pair counts are accumulated as
+    integers, so the result is exact.
+    """
+
+    def __init__(self, tmpdir: str = None, block: int = 1 << 16):
+        self._dir = tempfile.TemporaryDirectory(dir=tmpdir, prefix="auc-")
+        self.block = int(block)
+        self.runs = []
+        self.n_pos = 0
+        self.n_neg = 0
+
+    def update(self, scores: np.ndarray, labels: np.ndarray):
+        scores = np.asarray(scores, dtype=float)
+        labels = np.asarray(labels, dtype=bool)
+        assert scores.shape == labels.shape
+        if len(scores) == 0:
+            return
+        scores = np.where(np.isnan(scores), np.inf, scores)
+        order = np.argsort(scores, kind="mergesort")
+        lab = labels[order].astype(np.int64)
+        v, p, n = _group_sorted(scores[order], lab, 1 - lab)
+        paths = [os.path.join(self._dir.name, f"run{len(self.runs)}.{c}.npy") for c in "vpn"]
+        for path, arr in zip(paths, (v, p, n)):
+            np.save(path, arr)
+        self.runs.append(paths)
+        self.n_pos += int(p.sum())
+        self.n_neg += int(n.sum())
+
+    def result(self) -> float:
+        if self.n_pos == 0 or self.n_neg == 0:
+            return 0.5
+        runs = [tuple(np.load(path, mmap_mode="r") for path in paths) for paths in self.runs]
+        cur = [0] * len(runs)
+        twice_pairs = 0   # 2 * (#pos>neg pairs) + #tied pairs
+        neg_below = 0
+        pending = None    # last group of the previous merge step, may still grow
+        while True:
+            active = [i for i, r in enumerate(runs) if cur[i] < len(r[0])]
+            if not active:
+                break
+            t = min(runs[i][0][min(cur[i] + self.block, len(runs[i][0])) - 1] for i in active)
+            vs, ps, ns = [], [], []
+            for i in active:
+                v = runs[i][0]
+                stop = cur[i] + int(np.searchsorted(v[cur[i]:cur[i] + self.block], t, side="right"))
+                for dst, src in zip((vs, ps, ns), runs[i]):
+                    dst.append(src[cur[i]:stop])
+                cur[i] = stop
+            v = np.concatenate(vs)
+            order = np.argsort(v, kind="mergesort")
+            v, p, n = _group_sorted(v[order], np.concatenate(ps)[order], np.concatenate(ns)[order])
+            if pending is not None:
+                if v[0] == pending[0]:
+                    p[0] += pending[1]
+                    n[0] += pending[2]
+                else:
+                    v = np.r_[pending[0], v]
+                    p = np.r_[pending[1], p]
+                    n = np.r_[pending[2], n]
+            pending = (v[-1], p[-1], n[-1])
+            p, n = p[:-1], n[:-1]
+            below = neg_below + np.cumsum(n) - n
+            twice_pairs += int((2 * p * below + p * n).sum())
+            neg_below += int(n.sum())
+        if pending is not None:
+            twice_pairs += 2 * int(pending[1]) * neg_below + int(pending[1]) * int(pending[2])
+        return twice_pairs / (2.0 * self.n_pos * self.n_neg)
+
+    def close(self):
+        self._dir.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class BinnedAUC:
+    """
+    Approximate ROC AUC from per-class histograms over `bins` equal-width bins on
+    [lo, hi] (values outside are clipped). Pairs sharing a bin count as ties, so the
+    true AUC lies within result() +/- error_bound(). Memory is O(bins).
+    """
+
+    def __init__(self, lo: float, hi: float, bins: int = 1 << 16):
+        self.lo, self.hi, self.bins = float(lo), float(hi), int(bins)
+        self.pos = np.zeros(self.bins, dtype=np.int64)
+        self.neg = np.zeros(self.bins, dtype=np.int64)
+
+    def update(self, scores: np.ndarray, labels: np.ndarray):
+        scores = np.asarray(scores, dtype=float)
+        labels = np.asarray(labels, dtype=bool)
+        scores = np.where(np.isnan(scores), np.inf, scores)
+        width = (self.hi - self.lo) / self.bins if self.hi > self.lo else 1.0
+        idx = np.clip(np.floor((scores - self.lo) / width), 0, self.bins - 1).astype(np.int64)
+        self.pos += np.bincount(idx[labels], minlength=self.bins)
+        self.neg += np.bincount(idx[~labels], minlength=self.bins)
+
+    def _totals(self):
+        return int(self.pos.sum()), int(self.neg.sum())
+
+    def result(self) -> float:
+        n_pos, n_neg = self._totals()
+        if n_pos == 0 or n_neg == 0:
+            return 0.5
+        below = np.cumsum(self.neg) - self.neg
+        twice_pairs = int((2 * self.pos * below + self.pos * self.neg).sum())
+        return twice_pairs / (2.0 * n_pos * n_neg)
+
+    def error_bound(self) -> float:
+        n_pos, n_neg = self._totals()
+        if n_pos == 0 or n_neg == 0:
+            return 0.0
+        return 0.5 * float((self.pos * self.neg).sum()) / (n_pos * n_neg)
@@ -0,0 +1,145 @@
+import os
+import tempfile
+import numpy as np
+from .metrics import midranks
+
+NULL_KINDS = ("shuffle", "residue", "shift")
+
+def _random_subset(n: int, k: int, rng) -> np.ndarray:
+    """
+    Uniform random k-subset of range(n), returned sorted, in about O(k) random draws.
+
+    The distinct values of m iid draws form a uniform random subset of their size,
+    so marking a few more than k draws and dropping a random surplus is uniform.
+    Sorted output keeps the later rank gathers cache-friendly.
+    """
+    if 4 * k + 64 > n:
+        return np.sort(rng.permutation(n)[:k])
+    mark = np.zeros(n, dtype=bool)
+    m = k + k // 4 + 16
+    while True:
+        mark[rng.integers(0, n, size=m)] = True
+        distinct = np.flatnonzero(mark)
+        surplus = len(distinct) - k
+        if surplus >= 0:
+            keep = np.ones(len(distinct), dtype=bool)
+            keep[_random_subset(len(distinct), surplus, rng)] = False
+            return distinct[keep]
+        m = 16 - surplus
+
+def null_positive_sets(labels: np.ndarray, K: int, kind: str = "shuffle", n0: int = 0,
+                       modulus: int = None, block: int = 1, rng=None):
+    """
+    Yield K index arrays, each the positions labelled positive under one null draw.
+
+    kind="shuffle": uniform permutation of the labels.
+    kind="residue": labels permuted within each residue class of n = n0+i mod `modulus`,
+      preserving how many positives each class holds.
+    kind="shift": labels rotated circularly by a random nonzero multiple of `block`
+      (use a multiple of the moduli of interest to keep residues aligned).
+    Only the positive positions are produced, so each draw costs O(#positives).
+    """
+    labels = np.asarray(labels, dtype=bool)
+    rng = np.random.default_rng(rng)
+    n = len(labels)
+    pos = np.flatnonzero(labels)
+    if kind == "shuffle":
+        for _ in range(K):
+            yield _random_subset(n, len(pos), rng)
+    elif kind == "residue":
+        if not modulus:
+            raise ValueError("kind='residue' needs a modulus")
+        classes = (np.arange(n0, n0 + n) % modulus)
+        members = [np.flatnonzero(classes == c) for c in range(modulus)]
+        counts = [int(labels[m].sum()) for m in members]
+        for _ in range(K):
+            yield np.concatenate([m[_random_subset(len(m), c, rng)] for m, c in zip(members, counts)])
+    elif kind == "shift":
+        steps = n // block
+        if steps < 2:
+            raise ValueError("window too short for the requested block shift")
+        for _ in range(K):
+            yield (pos + block * int(rng.integers(1, steps))) % n
+    else:
+        raise ValueError(f"unknown null kind {kind!r}; use one of {NULL_KINDS}")
+
+def _null_pis(ranks_t: np.ndarray, labels, K, kind, n0, modulus, block, seed) -> np.ndarray:
+    """(K x features) null PIs from precomputed midranks (n x features)."""
+    n, F = ranks_t.shape
+    n_pos = int(np.asarray(labels, dtype=bool).sum())
+    n_neg = n - n_pos
+    out = np.empty((K, F))
+    sets = null_positive_sets(labels, K, kind, n0, modulus, block, np.random.default_rng(seed))
+    for k, idx in enumerate(sets):
+        out[k] = ranks_t[idx].sum(axis=0)
+    aucs = (out - n_pos*(n_pos+1)/2.0) / (n_pos*n_neg)
+    return 2.0*aucs - 1.0
+
+_RANKS = {}
+
+def _null_pis_saved(path, labels, K, kind, n0, modulus, block, seed) -> np.ndarray:
+    """Worker task: _null_pis over the midranks saved at `path`, memory-mapped once per process."""
+    ranks_t = _RANKS.get(path)
+    if ranks_t is None:
+        _RANKS.clear()
+        ranks_t = _RANKS[path] = np.load(path, mmap_mode="r")
+    return _null_pis(ranks_t, labels, K, kind, n0, modulus, block, seed)
+
+def null_distribution(score_matrix: np.ndarray, labels: np.ndarray, K: int = 1000, kind: str = "shuffle",
+                      n0: int = 0, modulus: int = None, block: int = 1, seed: int = 0, executor=None,
+                      batches: int = None):
+    """
+    Observed PI (features,) and null PIs (K x features) for a (features x n) score
+    matrix. Each feature is sorted once; every null draw then only sums the
+    feature's tie-averaged ranks over the permuted positive positions. With an
+    executor, the K draws are split into `batches` independently seeded batches,
+    by default one per CPU (deterministic for a given seed and batch count,
+    regardless of the pool); pass the pool's worker count as `batches`. The
+    midranks are saved once as an .npy file that the workers memory-map.
+    """
+    labels = np.asarray(labels, dtype=bool)
+    n = len(labels)
+    n_pos = int(labels.sum())
+    n_neg = n - n_pos
+    ranks_t = np.ascontiguousarray(midranks(score_matrix).T)
+    if n_pos == 0 or n_neg == 0:
+        F = ranks_t.shape[1]
+        return np.zeros(F), np.zeros((K, F))
+    observed = 2.0 * (ranks_t[labels].sum(axis=0) - n_pos*(n_pos+1)/2.0) / (n_pos*n_neg) - 1.0
+
+    if batches is None:
+        batches = 1 if executor is None else os.cpu_count() or 1
+    sizes = [len(b) for b in np.array_split(np.arange(K), max(1, min(batches, K)))]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if executor is None:
+        parts = [_null_pis(ranks_t, labels, k, kind, n0, modulus, block, sd) for k, sd in zip(sizes, seeds)]
+    else:
+        with tempfile.TemporaryDirectory(prefix="prime_polarity_nulls_") as tmp:
+            path = os.path.join(tmp, "ranks.npy")
+            np.save(path, ranks_t)
+            args = [(path, labels, k, kind, n0, modulus, block, sd) for k, sd in zip(sizes, seeds)]
+            parts = list(executor.map(_null_pis_saved, *zip(*args)))
+    return observed, np.concatenate(parts, axis=0)
+
+def null_test(score_matrix: np.ndarray, labels: np.ndarray, names=None, K: int = 1000,
+              kind: str = "shuffle", quantiles=(0.025, 0.5, 0.975), **kwargs) -> dict:
+    """
+    Empirical null test per feature: {name: {"pi", "p_value", "null_quantiles"}}.
+
+    p_value is two-sided on |PI| with the +1 correction, (1 + #{|null| >= |obs|}) / (K + 1).
+    Extra keyword arguments go to null_distribution (n0, modulus, block, seed, executor, batches).
+    """
+    observed, null = null_distribution(score_matrix, labels, K=K, kind=kind, **kwargs)
+    if names is None:
+        names = [str(i) for i in range(len(observed))]
+    exceed = (np.abs(null) >= np.abs(observed)[None, :] - 1e-12).sum(axis=0)
+    p_values = (1.0 + exceed) / (K + 1.0)
+    qs = np.quantile(null, quantiles, axis=0)
+    return {
+        name: {
+            "pi": float(observed[f]),
+            "p_value": float(p_values[f]),
+            "null_quantiles": {float(q): float(qs[i, f]) for i, q in enumerate(quantiles)},
+        }
+        for f, name in enumerate(names)
+    }
@@ -0,0 +1,208 @@
+import json
+import os
+import numpy as np
+
+from .cache import ZCache
+from .ddouble import DD, rank_keys
+from .generators import evaluate_generators, get_generator, resolve_generators
+from .metrics import labels_for_range
+from .precision import DEFAULT_MAX_DPS, escalate_ties
+from .profiling import stage
+from .sieves import mobius_range
+from .transforms import mobius_twist_range
+from .wheel import Wheel
+
+def generator_values(names, start: int, end: int, dps: int = 50, cache: ZCache = None,
+                     precise: bool = False) -> dict:
+    """
+    {name: values for n in [start, end]} for the generators in `names` and their
+    dependencies. With a ZCache, generators without dependencies are read from it
+    (keyed by their column label); derived ones are computed from those arrays.
+    With precise=True, generators that support it return a ddouble.DD (computed,
+    not cached).
+    """
+    known = {}
+    if cache is not None:
+        for name in resolve_generators(names):
+            gen = get_generator(name)
+            if not gen.depends and not (precise and gen.evaluate_dd is not None):
+                def compute(a, b, gen=gen):
+                    return gen.evaluate(np.arange(a, b + 1, dtype=np.int64), dps)
+                known[name] = cache.get(start, end, dps, generator=gen.column, compute=compute)
+    return evaluate_generators(names, np.arange(start, end + 1, dtype=np.int64), dps, known, precise)
+
+class RangePlan:
+    """
+    Shared precomputation for every window of a covering range [start, end].
+
+    The prime sieve, the generators (plus one value past `end` for forward
+    differences) and the Möbius table are computed once; windows get zero-copy
+    slices. The first generator is the base G that features transform; the others
+    are scored as raw columns. Window features see the whole covering range: the
+    Möbius twist includes G(n/d) for every n/d in [start, end], not only those
+    inside the window, and the last forward difference of a window uses G(e+1).
+
+    With escalate=True, float64 ties and near-ties of every generator that has an
+    mpmath evaluator are re-evaluated at increasing precision (up to `max_dps`),
+    and the raw columns are scored on the resulting rank keys; `escalation` holds
+    the per-column counts.
+
+    With precise=True, generators with a double-double evaluator are kept as
+    ddouble.DD arrays in `dd` (e.g. Z(n) = 2 + R(n) with R at full precision), the
+    features transform them natively and raw columns are ranked on them.
+
+    With a wheel.Wheel (masked scoring), only the integers coprime to its modulus
+    are sieved, evaluated, transformed and scored: every array is over the compact
+    index space of the wheel, windows stay ranges of integers, and `succ` holds
+    G(n+1) for the forward differences of the base generator, so masked
+    Forward_diff equals the unmasked one. Successors that are members reuse
+    their values; the others are evaluated too, which for the odd mask means G
+    at every integer of the range. The cache is not used in that mode.
+
+    save()/load() round-trip the plan through .npy files so process-pool workers
+    can memory-map it instead of recomputing or unpickling it.
+    """
+
+    def __init__(self, start: int, end: int, dps: int = 50, generators=("Z",), cache: ZCache = None,
+                 arrays: dict = None, columns=None, escalate: bool = False, max_dps: int = DEFAULT_MAX_DPS,
+                 precise: bool = False, wheel=None):
+        if wheel is not None and precise:
+            raise ValueError("precise mode does not support masks")
+        self.start, self.end, self.dps = start, end, dps
+        self.wheel = wheel
+        self.generators = list(generators)
+        # Output label of each generator, base first.
+        self.columns = list(columns or (get_generator(name).column for name in self.generators))
+        self.keys, self.escalation, self.dd = {}, {}, {}
+        self.succ = None
+        if arrays is not None:
+            self.labels, self.mu = arrays["labels"], arrays["mu"]
+            self.succ = arrays.get("succ")
+            self.values = {name: arrays[f"gen{i}"] for i, name in enumerate(self.generators)}
+            self.keys = {name: arrays[f"gen{i}_keys"] for i, name in enumerate(self.generators)
+                         if f"gen{i}_keys" in arrays}
+            self.dd = {name: DD(arrays[f"gen{i}"], arrays[f"gen{i}_lo"]) for i, name in enumerate(self.generators)
+                       if f"gen{i}_lo" in arrays}
+        else:
+            with stage("sieve"):
+                self.labels = labels_for_range(start, end) if wheel is None else wheel.prime_mask(start, end)
+            with stage("generators"):
+                if wheel is None:
+                    n = np.arange(start, end + 2, dtype=np.int64)
+                    values = generator_values(self.generators, start, end + 1, dps, cache, precise)
+                else:
+                    n = wheel.numbers(start, end)
+                    values = evaluate_generators(self.generators, n, dps)
+                    with stage("successors"):
+                        # n+1 is the next member when it is coprime to the modulus (never for odd n);
+                        # the rest cost one more evaluation each, so the odd mask evaluates G at every integer.
+                        succ = np.empty(len(n), dtype=float)
+                        inner = np.append(n[1:] == n[:-1] + 1, False) if len(n) else np.zeros(0, dtype=bool)
+                        succ[inner] = np.asarray(values[self.generators[0]], dtype=float)[1:][inner[:-1]]
+                        succ[~inner] = evaluate_generators(self.generators[:1], n[~inner] + 1,
+                                                           dps)[self.generators[0]]
+                        self.succ = np.nan_to_num(succ, nan=0.0)
+                self.values = {}
+                for name in self.generators:
+                    v = values[name]
+                    if isinstance(v, DD):
+                        undefined = np.isnan(v.hi)
+                        v.hi[undefined] = v.lo[undefined] = 0.0
+                        self.dd[name] = v
+                        v = v.hi  # normalized, so hi is the rounded value
+                    else:
+                        v = np.array(v, dtype=float)
+                        undefined = np.isnan(v)
+                        v[undefined] = 0.0
+                    self.values[name] = v
+                    gen = get_generator(name)
+                    if escalate and gen.evaluate_mp is not None:
+                        with stage("escalate"):
+                            self.keys[name], self.escalation[gen.column] = escalate_ties(
+                                v, n, gen.evaluate_mp, max_dps=max_dps,
+                                valid=~undefined)
+            with stage("mobius_table"):
+                self.mu = mobius_range(0, end // max(start, 1))
+        self.Z = self.values[self.generators[0]]
+
+    def _slice(self, s: int, e: int) -> slice:
+        assert self.start <= s and e <= self.end
+        if self.wheel is not None:
+            k0 = self.wheel.index(self.start)
+            return slice(self.wheel.index(s) - k0, self.wheel.index(e + 1) - k0)
+        return slice(s - self.start, e - self.start + 1)
+
+    def window_n(self, s: int, e: int) -> np.ndarray:
+        """The integers scored in [s, e]: all of them, or the wheel's members."""
+        if self.wheel is not None:
+            return self.wheel.numbers(s, e)
+        return np.arange(s, e + 1, dtype=np.int64)
+
+    def window_succ(self, s: int, e: int) -> np.ndarray:
+        """G(n+1) for the scored n in [s, e] (masked plans only)."""
+        return self.succ[self._slice(s, e)]
+
+    def window_labels(self, s: int, e: int) -> np.ndarray:
+        return self.labels[self._slice(s, e)]
+
+    def window_Z(self, s: int, e: int) -> np.ndarray:
+        return self.Z[self._slice(s, e)]
+
+    def window_values(self, name: str, s: int, e: int) -> np.ndarray:
+        return self.values[name][self._slice(s, e)]
+
+    def window_dd(self, name: str, s: int, e: int) -> DD:
+        return self.dd[name][self._slice(s, e)]
+
+    def window_raw(self, name: str, s: int, e: int) -> np.ndarray:
+        """
+        Scores for the raw column of `name`: escalated rank keys if computed, else
+        rank keys of the double-double values in precise mode, else the values.
+        """
+        if name in self.keys:
+            return self.keys[name][self._slice(s, e)]
+        if name in self.dd:
+            return rank_keys(self.window_dd(name, s, e))
+        return self.values[name][self._slice(s, e)]
+
+    def forward_diff(self, s: int, e: int) -> np.ndarray:
+        """G(n+1) - G(n) for n in [s, e], reading G(e+1) from the plan."""
+        if self.wheel is not None:
+            return self.window_succ(s, e) - self.window_Z(s, e)
+        i, j = s - self.start, e - self.start + 1
+        return self.Z[i+1:j+1] - self.Z[i:j]
+
+    def logmellin_slope(self, s: int, e: int) -> np.ndarray:
+        return self.window_n(s, e).astype(float) * self.forward_diff(s, e)
+
+    def mobius_twist(self, s: int, e: int) -> np.ndarray:
+        """M[G](n) for n in [s, e] over every n/d in the covering range."""
+        return mobius_twist_range(self.Z, self.start, s, e, mu=self.mu, wheel=self.wheel)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        arrays = {"labels": self.labels, "mu": self.mu}
+        if self.succ is not None:
+            arrays["succ"] = self.succ
+        arrays.update((f"gen{i}", self.values[name]) for i, name in enumerate(self.generators))
+        arrays.update((f"gen{i}_keys", self.keys[name]) for i, name in enumerate(self.generators)
+                      if name in self.keys)
+        arrays.update((f"gen{i}_lo", self.dd[name].lo) for i, name in enumerate(self.generators)
+                      if name in self.dd)
+        for name, arr in arrays.items():
+            np.save(os.path.join(path, name + ".npy"), arr)
+        meta = {"start": self.start, "end": self.end, "dps": self.dps, "generators": self.generators,
+                "columns": self.columns, "mask": None if self.wheel is None else self.wheel.modulus}
+        with open(os.path.join(path, "plan.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = "r") -> "RangePlan":
+        with open(os.path.join(path, "plan.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        names = ["labels", "mu", "succ"] + [f"gen{i}{sfx}" for i in range(len(meta["generators"])) for sfx in ("", "_keys", "_lo")]
+        arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode) for name in names
+                  if os.path.exists(os.path.join(path, name + ".npy"))}
+        wheel = Wheel(meta["mask"]) if meta.get("mask") else None
+        return cls(meta["start"], meta["end"], meta["dps"], meta["generators"], arrays=arrays,
+                   columns=meta["columns"], wheel=wheel)
@@ -0,0 +1,107 @@
+import threading
+from typing import TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    from mpmath import MPContext
+
+MIN_DPS = 30          # precision floor of every mpmath evaluation
+DEFAULT_MAX_DPS = 960  # escalation cap
+NEAR_TIE_ULPS = 4      # float64 values this close may be misordered by rounding
+
+_local = threading.local()
+
+def mp_context(dps: int) -> "MPContext":
+    """
+    A private mpmath context at `dps` digits for the calling thread. Unlike
+    mp.dps / mp.workdps this never touches mpmath's global state, so evaluations
+    at different precisions are safe in threads and worker processes.
+    """
+    cache = getattr(_local, "contexts", None)
+    if cache is None:
+        cache = _local.contexts = {}
+    dps = max(MIN_DPS, int(dps))
+    ctx = cache.get(dps)
+    if ctx is None:
+        from mpmath import MPContext  # only the slow paths need mpmath at all
+        ctx = cache[dps] = MPContext()
+        ctx.dps = dps
+    return ctx
+
+def near_tie_runs(values: np.ndarray, ulps: int = NEAR_TIE_ULPS):
+    """
+    (order, runs): the stable argsort of `values` and the [i, j) slices of it whose
+    consecutive values lie within `ulps` units in the last place of each other.
+    """
+    order = np.argsort(values, kind="stable")
+    v = values[order]
+    with np.errstate(invalid="ignore"):
+        near = np.abs(np.diff(v)) <= ulps * np.spacing(np.maximum(np.abs(v[1:]), np.abs(v[:-1])))
+    edges = np.diff(np.concatenate([[0], near.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) + 1
+    return order, list(zip(starts.tolist(), ends.tolist()))
+
+def escalate_ties(values: np.ndarray, n: np.ndarray, evaluate_mp, dps: int = MIN_DPS,
+                  max_dps: int = DEFAULT_MAX_DPS, valid: np.ndarray = None):
+    """
+    Rank keys for `values` (a float64 evaluation of G over the integers `n`) with
+    float64 ties and near-ties resolved at higher precision.
+
+    Only members of near-tie runs are re-evaluated: with `evaluate_mp(n, ctx)` at
+    `dps` digits, then again at doubled precision for the members that still
+    agree to within the working precision, up to `max_dps`. Positions where
+    `valid` is False (e.g. placeholders for undefined n) are never re-evaluated.
+    Returns (keys, stats):
+    keys are float ordinal ranks (equal only for ties unresolved at `max_dps`),
+    usable wherever only the order of G matters (AUC, PI); stats counts the values
+    escalated, the mpmath evaluations, the highest precision used and the values
+    left tied below `max_dps` (values equal at the working precision, such as
+    exact zeros, count as true ties and are not escalated further).
+    """
+    values = np.asarray(values, dtype=float)
+    n = np.asarray(n)
+    order, runs = near_tie_runs(values)
+    stats = {"escalated": 0, "evaluations": 0, "max_dps": 0, "unresolved": 0}
+
+    def refine(members, d):
+        ctx = mp_context(d)
+        stats["evaluations"] += len(members)
+        stats["max_dps"] = max(stats["max_dps"], ctx.dps)
+        hp = sorted((evaluate_mp(int(n[i]), ctx), i) for i in members)
+        tol = ctx.mpf(10) ** (8 - ctx.dps)
+        groups, cur = [], [hp[0]]
+        for prev, item in zip(hp, hp[1:]):
+            if abs(item[0] - prev[0]) <= tol * max(abs(item[0]), 1):
+                cur.append(item)
+            else:
+                groups.append(cur)
+                cur = [item]
+        groups.append(cur)
+        out = []
+        for g in groups:
+            idx = [i for _, i in g]
+            exact = all(item[0] == g[0][0] for item in g)  # e.g. chi(n) = 0: a true tie
+            if len(idx) > 1 and not exact and 2 * ctx.dps <= max_dps:
+                out.extend(refine(idx, 2 * ctx.dps))
+            else:
+                if len(idx) > 1 and not exact:
+                    stats["unresolved"] += len(idx)
+                out.append(idx)
+        return out
+
+    keys = np.empty(len(values), dtype=float)
+    keys[order] = np.arange(len(values), dtype=float)
+    keys[np.isnan(values)] = np.nan
+    for i, j in runs:
+        run = order[i:j]
+        keep = np.isfinite(values[run]) if valid is None else valid[run]
+        # re-ranked members take only their own ordinal slots; the others keep theirs
+        members, slots = run[keep], np.arange(i, j)[keep]
+        if len(members) < 2:
+            continue
+        stats["escalated"] += len(members)
+        pos = 0
+        for group in refine(members.tolist(), dps):
+            keys[group] = slots[pos]
+            pos += len(group)
+    return keys, stats
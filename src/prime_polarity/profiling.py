@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+_NULL = nullcontext()
+_hooks = []
+_state = threading.local()
+
+def add_hook(fn):
+    """
+    Call `fn(event)` whenever an instrumented stage ends. An event is a dict with
+    name, args (the stage's arguments merged with those of enclosing stages, e.g.
+    the window), ts (start, seconds on the perf_counter clock), wall, cpu (seconds)
+    and alloc (peak bytes allocated inside the stage, or None unless a recording
+    traces memory). While no hook is installed, stage() is a shared no-op.
+    """
+    _hooks.append(fn)
+    return fn
+
+def remove_hook(fn):
+    _hooks.remove(fn)
+
+def stage(name: str, **args):
+    """Context manager timing one stage for the installed hooks."""
+    if not _hooks:
+        return _NULL
+    return _Stage(name, args)
+
+class _Stage:
+    __slots__ = ("name", "args", "t0", "c0", "m0", "child_peak")
+
+    def __init__(self, name, args):
+        self.name, self.args = name, args
+
+    def __enter__(self):
+        stack = getattr(_state, "stack", None)
+        if stack is None:
+            stack = _state.stack = []
+        if stack:
+            self.args = {**stack[-1].args, **self.args}
+        self.m0 = None
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            tracemalloc.reset_peak()
+            self.m0, self.child_peak = current, current
+        stack.append(self)
+        self.c0 = time.process_time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.t0
+        cpu = time.process_time() - self.c0
+        stack = _state.stack
+        stack.pop()
+        alloc = None
+        if self.m0 is not None and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            alloc = peak - self.m0
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        event = {"name": self.name, "args": self.args, "ts": self.t0, "wall": wall, "cpu": cpu, "alloc": alloc}
+        for hook in list(_hooks):
+            hook(event)
+        return False
+
+class Recorder:
+    """
+    Collects stage events while installed (use as a context manager). With
+    memory=True, tracemalloc runs for the duration and every event carries the
+    peak bytes allocated inside its stage (NumPy buffers included); this slows
+    allocation-heavy code, so it is off by default.
+
+    Only stages run in this process are recorded; work done in executor worker
+    processes shows up as the time the parent spends waiting for it.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.events = []
+        self._started_tracing = False
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        add_hook(self)
+        return self
+
+    def __exit__(self, *exc):
+        remove_hook(self)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    def summary(self) -> list:
+        """Per stage name: (name, calls, wall s, cpu s, max alloc bytes or None), by total wall time."""
+        agg = {}
+        for ev in self.events:
+            row = agg.setdefault(ev["name"], [ev["name"], 0, 0.0, 0.0, None])
+            row[1] += 1
+            row[2] += ev["wall"]
+            row[3] += ev["cpu"]
+            if ev["alloc"] is not None:
+                row[4] = max(row[4] or 0, ev["alloc"])
+        return sorted((tuple(r) for r in agg.values()), key=lambda r: r[2], reverse=True)
+
+    def format_summary(self) -> str:
+        lines = [f"{'Stage':30s} {'Calls':>7s} {'Wall s':>10s} {'CPU s':>10s} {'Peak alloc MB':>14s}"]
+        for name, calls, wall, cpu, alloc in self.summary():
+            mem = "" if alloc is None else f"{alloc / (1 << 20):14.2f}"
+            lines.append(f"{name:30s} {calls:7d} {wall:10.4f} {cpu:10.4f} {mem:>14s}")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict:
+        """Events in Chrome trace-event format (load in chrome://tracing or Perfetto)."""
+        t0 = min((ev["ts"] for ev in self.events), default=0.0)
+        pid = os.getpid()
+        trace = []
+        for ev in self.events:
+            args = {k: v if isinstance(v, (int, float, str, bool)) or v is None else str(v)
+                    for k, v in ev["args"].items()}
+            args["cpu_ms"] = ev["cpu"] * 1e3
+            if ev["alloc"] is not None:
+                args["alloc_bytes"] = ev["alloc"]
+            trace.append({"name": ev["name"], "ph": "X", "pid": pid, "tid": 0,
+                          "ts": (ev["ts"] - t0) * 1e6, "dur": ev["wall"] * 1e6, "args": args})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def save_trace(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
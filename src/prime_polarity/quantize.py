@@ -0,0 +1,108 @@
+import numpy as np
+
+from .metrics import _as_score_matrix, _auc_sorted
+
+FEATURE_DTYPES = {"float64": np.float64, "float32": np.float32, "int32": np.int32}
+
+# Largest |AUC(quantised) - AUC(float64)| a feature may show before it falls back to float64.
+DEFAULT_AUC_TOL = 1e-6
+
+_I32 = np.iinfo(np.int32)
+
+def quantize(x, dtype: str = "float32") -> np.ndarray:
+    """
+    `x` in a reduced-precision feature dtype. Both casts are monotone, so the order
+    of x is kept except that close values may merge into ties: float32 rounds, and
+    int32 maps the finite range of x affinely onto the int32 range, with -inf at
+    its minimum and +inf and NaN (ranked as +inf by the AUC) at its maximum.
+    """
+    x = np.asarray(x, dtype=float)
+    if dtype == "float64":
+        return x
+    if dtype == "float32":
+        return x.astype(np.float32)
+    if dtype != "int32":
+        raise ValueError(f"feature dtype {dtype!r} must be one of {list(FEATURE_DTYPES)}")
+    q = np.full(len(x), _I32.max, dtype=np.int32)
+    q[np.isneginf(x)] = _I32.min
+    finite = np.isfinite(x)
+    if finite.any():
+        xf = x[finite]
+        lo, hi = xf.min(), xf.max()
+        scale = (float(_I32.max) - float(_I32.min) - 2.0) / (hi - lo) if hi > lo else 0.0
+        xf -= lo
+        xf *= scale
+        np.floor(xf, out=xf)
+        xf += _I32.min + 1
+        q[finite] = xf
+    return q
+
+def _tie_shifts(X, order: np.ndarray, s: np.ndarray, labels: np.ndarray, tol: float = 0.0) -> np.ndarray:
+    """
+    AUC(X[f]) - AUC(Q[f]) for each row of a quantised matrix Q sorted by `order`
+    (sorted values `s`). Quantisation only merges values into ties, so pairs in
+    different tie groups of Q compare as in X, and the shift is the sum over
+    positives inside a tie group of their rank by X within the group minus the
+    group's midrank, divided by the number of (positive, negative) pairs. Rows
+    whose shift is provably at most `tol` report 0 without the exact pass.
+    """
+    n_pos = int(labels.sum())
+    pairs = float(n_pos) * (len(labels) - n_pos)
+    shifts = np.zeros(len(order))
+    for f in range(len(order)):
+        eq = s[f, 1:] == s[f, :-1]
+        if not eq.any():
+            continue
+        tied = np.zeros(len(eq) + 1, dtype=bool)
+        tied[1:] |= eq
+        tied[:-1] |= eq
+        group = np.cumsum(np.concatenate([[True], ~eq]))[tied]
+        idx = order[f][tied]
+        # Only groups holding both classes can move the AUC, by at most half their pairs.
+        starts = np.flatnonzero(np.concatenate([[True], group[1:] != group[:-1]]))
+        size = np.diff(np.append(starts, len(group)))
+        n_in = np.add.reduceat(labels[idx].astype(np.int64), starts)
+        mixed = (n_in > 0) & (n_in < size)
+        if 0.5 * (n_in * (size - n_in))[mixed].sum() / pairs <= tol:
+            continue
+        keep = np.repeat(mixed, size)
+        group, idx = group[keep], idx[keep]
+        x = np.asarray(X[f], dtype=float)[idx]
+        x[np.isnan(x)] = np.inf
+        o = np.lexsort((x, group))
+        g, x, lab = group[o], x[o], labels[idx][o]
+        pos = np.arange(len(g))
+        start = np.concatenate([[True], g[1:] != g[:-1]])
+        run = start.copy()
+        run[1:] |= x[1:] != x[:-1]
+        end = np.concatenate([run[1:], [True]])
+        g_end = np.concatenate([start[1:], [True]])
+        first = np.maximum.accumulate(np.where(run, pos, 0))
+        last = np.minimum.accumulate(np.where(end, pos, len(g) - 1)[::-1])[::-1]
+        g_first = np.maximum.accumulate(np.where(start, pos, 0))
+        g_last = np.minimum.accumulate(np.where(g_end, pos, len(g) - 1)[::-1])[::-1]
+        shifts[f] = (0.5 * (first + last) - 0.5 * (g_first + g_last))[lab].sum() / pairs
+    return shifts
+
+def quantized_auc(x, labels: np.ndarray, dtype: str = "float32", tol: float = DEFAULT_AUC_TOL):
+    """
+    (auc, fell_back) for one float64 feature ranked in `dtype`: the row is sorted
+    as 32-bit keys, the exact float64 AUC is recovered from the quantised ties,
+    and it replaces the quantised AUC when the two differ by more than `tol`.
+    """
+    if dtype not in FEATURE_DTYPES:
+        raise ValueError(f"feature dtype {dtype!r} must be one of {list(FEATURE_DTYPES)}")
+    labels = np.asarray(labels, dtype=bool)
+    aucs, order, s = _auc_sorted(_as_score_matrix(quantize(x, dtype)), labels)
+    if order is None:
+        return float(aucs[0]), False
+    shift = _tie_shifts([x], order, s, labels, tol)[0]
+    if abs(shift) > tol:
+        return float(aucs[0] + shift), True
+    return float(aucs[0]), False
+
+def check_quantized(x, labels: np.ndarray, dtype: str = "float32", tol: float = DEFAULT_AUC_TOL) -> bool:
+    """True if quantising the single feature `x` to `dtype` keeps its AUC within `tol`."""
+    if dtype == "float64":
+        return True
+    return not quantized_auc(x, labels, dtype, tol)[1]
@@ -0,0 +1,257 @@
+import numpy as np
+
+from .scoring import compute_G
+from .metrics import labels_for_range
+from .features import parse_arithmetic
+from .sieves import factor_sieve
+from .transforms import ARITHMETIC, arithmetic_values, fractional_part_min, dirichlet_projection, ramanujan_sum
+
+class _Fenwick:
+    """Binary indexed tree of int64 counts over keys 0..size-1, with vectorized ops."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tree = np.zeros(size + 1, dtype=np.int64)
+
+    def build(self, counts: np.ndarray):
+        """Linear-time build: tree[i] = C[i] - C[i - lowbit(i)] for prefix sums C."""
+        C = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(counts, out=C[1:])
+        i = np.arange(self.size + 1)
+        self.tree = C - C[i - (i & -i)]
+
+    def add(self, keys: np.ndarray, delta: int):
+        i = np.asarray(keys, dtype=np.int64) + 1
+        while i.size:
+            np.add.at(self.tree, i, delta)
+            i = i + (i & -i)
+            i = i[i <= self.size]
+
+    def prefix(self, keys: np.ndarray) -> np.ndarray:
+        """Counts with key <= keys (keys may be -1)."""
+        i = np.asarray(keys, dtype=np.int64) + 1
+        out = np.zeros(len(i), dtype=np.int64)
+        while True:
+            live = i > 0
+            if not live.any():
+                return out
+            out[live] += self.tree[i[live]]
+            i = np.where(live, i - (i & -i), 0)
+
+class RollingAUC:
+    """
+    Tie-aware AUC over a multiset of (score, label) that changes by batches.
+
+    Scores are quantized onto at most `bins` integer keys and counted in one
+    Fenwick tree per class, so adding or removing S items costs O(S log bins). The
+    number of correctly ordered (pos, neg) pairs is kept up to date, giving AUC in
+    O(1). Pairs sharing a key count as ties, so error_bound() bounds the distance
+    to the unquantized AUC.
+
+    The key map is piecewise linear and monotone: `segments` quantile segments of
+    the current contents, plus `margin` spans of headroom on each side, each split
+    into equal sub-bins. Dense clusters of scores therefore keep fine resolution.
+    needs_refit() signals when a score left the mapped range or quantization ties
+    grew past `tol`; rebuild() then re-fits the map in O(bins + items).
+    """
+
+    def __init__(self, bins: int = 1 << 18, segments: int = 1024, margin: float = 1.0, tol: float = 1e-4):
+        self.bins = int(bins)
+        self.segments = int(segments)
+        self.margin = float(margin)
+        self.tol = float(tol)
+        self.bp = None
+        self.pos = _Fenwick(self.bins)
+        self.neg = _Fenwick(self.bins)
+        self.n_pos = self.n_neg = 0
+        self.twice_pairs = 0  # 2 * #(pos > neg) + #(pos ~ neg)
+        self.tie_pairs = 0
+        self._fit_error = 0.0
+
+    def fits(self, values: np.ndarray) -> bool:
+        v = values[np.isfinite(values)]
+        if self.bp is None:
+            return len(v) == 0
+        return len(v) == 0 or (v.min() >= self.bp[0] and v.max() <= self.bp[-1])
+
+    def needs_refit(self) -> bool:
+        return self.error_bound() > 2.0 * self._fit_error + self.tol
+
+    def _keys(self, values: np.ndarray) -> np.ndarray:
+        v = np.nan_to_num(values, nan=np.inf)
+        nseg = len(self.bp) - 1
+        seg = np.clip(np.searchsorted(self.bp, v, side="right") - 1, 0, nseg - 1)
+        with np.errstate(invalid="ignore"):
+            frac = (v - self.bp[seg]) / (self.bp[seg + 1] - self.bp[seg])
+        within = np.clip(np.floor(np.nan_to_num(frac, nan=1.0) * self.per_seg), 0, self.per_seg - 1)
+        return seg * self.per_seg + within.astype(np.int64)
+
+    def _fit_range(self, values: np.ndarray):
+        v = np.sort(values[np.isfinite(values)])
+        if len(v) == 0:
+            v = np.zeros(1)
+        lo, hi = float(v[0]), float(v[-1])
+        span = hi - lo
+        if span <= 0:
+            span = max(abs(lo), 1.0) * 1e-9
+        m = max(1, min(self.segments, len(v)))
+        core = np.quantile(v, np.linspace(0.0, 1.0, m + 1))
+        side = max(1, m // 2)
+        left = np.linspace(lo - self.margin * span, lo, side + 1)[:-1]
+        right = np.linspace(hi, hi + self.margin * span, side + 1)[1:]
+        self.bp = np.unique(np.concatenate([left, core, right]))
+        self.per_seg = max(1, self.bins // (len(self.bp) - 1))
+
+    def rebuild(self, values: np.ndarray, labels: np.ndarray):
+        """Re-fit the key range to `values` and rebuild the counts from scratch."""
+        values = np.asarray(values, dtype=float)
+        labels = np.asarray(labels, dtype=bool)
+        self._fit_range(values)
+        keys = self._keys(values)
+        pos = np.bincount(keys[labels], minlength=self.bins)
+        neg = np.bincount(keys[~labels], minlength=self.bins)
+        self.pos.build(pos)
+        self.neg.build(neg)
+        self.n_pos, self.n_neg = int(pos.sum()), int(neg.sum())
+        below = np.cumsum(neg) - neg
+        self.twice_pairs = int((2 * pos * below + pos * neg).sum())
+        self.tie_pairs = int((pos * neg).sum())
+        self._fit_error = self.error_bound()
+
+    def _pairs(self, keys: np.ndarray, labels: np.ndarray):
+        """(twice_pairs, tie_pairs) between a batch and the tree contents plus within the batch."""
+        kp, kn = keys[labels], keys[~labels]
+        neg_le, neg_lt = self.neg.prefix(kp), self.neg.prefix(kp - 1)
+        pos_le, pos_lt = self.pos.prefix(kn), self.pos.prefix(kn - 1)
+        ties = int((neg_le - neg_lt).sum() + (pos_le - pos_lt).sum())
+        twice = int((neg_le + neg_lt).sum() + (2 * self.n_pos - pos_le - pos_lt).sum())
+        kn_sorted = np.sort(kn)
+        lt = np.searchsorted(kn_sorted, kp, side="left")
+        le = np.searchsorted(kn_sorted, kp, side="right")
+        return twice + int((lt + le).sum()), ties + int((le - lt).sum())
+
+    def add(self, values: np.ndarray, labels: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        labels = np.asarray(labels, dtype=bool)
+        if not self.fits(values):
+            raise ValueError("scores outside the fitted range; call rebuild()")
+        keys = self._keys(values)
+        twice, ties = self._pairs(keys, labels)
+        self.twice_pairs += twice
+        self.tie_pairs += ties
+        self.pos.add(keys[labels], 1)
+        self.neg.add(keys[~labels], 1)
+        self.n_pos += int(labels.sum())
+        self.n_neg += int((~labels).sum())
+
+    def remove(self, values: np.ndarray, labels: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        labels = np.asarray(labels, dtype=bool)
+        keys = self._keys(values)
+        self.pos.add(keys[labels], -1)
+        self.neg.add(keys[~labels], -1)
+        self.n_pos -= int(labels.sum())
+        self.n_neg -= int((~labels).sum())
+        twice, ties = self._pairs(keys, labels)
+        self.twice_pairs -= twice
+        self.tie_pairs -= ties
+
+    def auc(self) -> float:
+        if self.n_pos == 0 or self.n_neg == 0:
+            return 0.5
+        return self.twice_pairs / (2.0 * self.n_pos * self.n_neg)
+
+    def error_bound(self) -> float:
+        if self.n_pos == 0 or self.n_neg == 0:
+            return 0.0
+        return 0.5 * self.tie_pairs / (self.n_pos * self.n_neg)
+
+def _local_features(n0: int, Z_ext: np.ndarray, mods) -> dict:
+    """
+    Window-independent features for n in [n0, n0+len(Z_ext)-2]; Z_ext holds one extra
+    value, G(n+1), for the last forward difference.
+    """
+    Z = Z_ext[:-1]
+    d = Z_ext[1:] - Z
+    n = np.arange(n0, n0 + len(Z), dtype=float)
+    feats = {
+        "Z_raw": Z,
+        "Frac_part_min": fractional_part_min(Z),
+        "Forward_diff": d,
+        "LogMellin_slope": n * d,
+    }
+    factors = None
+    for m in mods:
+        if isinstance(m, str):
+            kind, q = parse_arithmetic(m)
+            if kind == "ramanujan":
+                feats[f"Ramanujan_q={q}"] = ramanujan_sum(q, n.astype(np.int64)) * Z
+                continue
+            if factors is None:
+                factors = factor_sieve(n0, n0 + len(Z) - 1)
+            feats[ARITHMETIC[kind][0] + "_proj"] = arithmetic_values(kind, factors) * Z
+            continue
+        q, k = m if isinstance(m, tuple) else (m, None)
+        name = f"Dirichlet_proj_q={q}" if k is None else f"Dirichlet_proj_q={q},k={k}"
+        feats[name] = np.real(dirichlet_projection(Z, n0, q, k))
+    return feats
+
+class SlidingScorer:
+    """
+    AUC/PI of every local feature over a window of `width` integers that slides by
+    `stride`.
+
+    Z values, labels and feature values live in ring buffers of size `width`; each
+    step evaluates only the `stride` new integers and updates one RollingAUC per
+    feature, so a step costs O(stride log bins) instead of re-scoring the window.
+    Features are the pointwise/local ones (Z_raw, Frac_part_min, Forward_diff,
+    LogMellin_slope, Dirichlet and arithmetic projections); Forward_diff uses
+    G(n+1) past the window edge. The window-dependent twists are not available here.
+    """
+
+    def __init__(self, start: int, width: int, stride: int, mods=(4, 5, 8, 12), dps: int = 50,
+                 bins: int = 1 << 18, cache=None):
+        if not 0 < stride <= width:
+            raise ValueError("stride must be in [1, width]")
+        self.start, self.width, self.stride = start, width, stride
+        self.mods, self.dps, self.cache = list(mods), dps, cache
+        self.bins = bins
+
+    def _batch(self, a: int, b: int):
+        Z_ext, _ = compute_G(a, b + 1, dps=self.dps, cache=self.cache)
+        return labels_for_range(a, b), _local_features(a, np.asarray(Z_ext), self.mods)
+
+    def run(self, end: int):
+        """Yield ((s, e), {feature: (auc, pi)}) for each window position with e <= end."""
+        W, S = self.width, self.stride
+        s, e = self.start, self.start + W - 1
+        if e > end:
+            return
+        labels, feats = self._batch(s, e)
+        self.buffers = {name: np.array(v, dtype=float) for name, v in feats.items()}
+        self.labels = labels.copy()
+        self.aucs = {name: RollingAUC(self.bins) for name in feats}
+        for name, acc in self.aucs.items():
+            acc.rebuild(self.buffers[name], self.labels)
+        yield (s, e), self._scores()
+
+        while e + S <= end:
+            new_labels, new_feats = self._batch(e + 1, e + S)
+            slots = (np.arange(s, s + S) - self.start) % W
+            old_labels = self.labels[slots]
+            self.labels[slots] = new_labels
+            for name, acc in self.aucs.items():
+                buf, new = self.buffers[name], new_feats[name]
+                if acc.fits(new):
+                    acc.remove(buf[slots], old_labels)
+                    buf[slots] = new
+                    acc.add(new, new_labels)
+                else:
+                    buf[slots] = new
+                if not acc.fits(new) or acc.needs_refit():
+                    acc.rebuild(buf, self.labels)
+            s, e = s + S, e + S
+            yield (s, e), self._scores()
+
+    def _scores(self) -> dict:
+        return {name: (acc.auc(), 2.0 * acc.auc() - 1.0) for name, acc in self.aucs.items()}
@@ -0,0 +1,247 @@
+import os
+import tempfile
+from itertools import chain, repeat
+import numpy as np
+
+from .precision import DEFAULT_MAX_DPS
+from .ddouble import DD, rank_keys
+from .features import build_feature_graph, feature_context
+from .plan import RangePlan, generator_values
+from .profiling import stage
+from .metrics import auc_batch, split_windows, stability
+from .quantize import quantized_auc
+
+def compute_G(start: int, end: int, use_zo: bool=False, dps: int=50, cache=None):
+    """Z (and optionally Z(o)) for [start, end]; with a ZCache, hits are read zero-copy."""
+    values = generator_values(["Z", "Zo"] if use_zo else ["Z"], start, end, dps, cache)
+    Z = values["Z"]
+    if start <= 2:
+        Z = np.array(Z)
+        Z[np.isnan(Z)] = 0.0
+    Zo = values["Zo"] if use_zo else None
+    if Zo is not None and start <= 2:
+        Zo = np.nan_to_num(Zo, nan=0.0)
+    return Z, Zo
+
+def generator_list(use_zo: bool = False, generators=None) -> list:
+    """Generator names to score: `generators` (base first), default ["Z"], plus Z(o) if `use_zo`."""
+    names = list(generators or ["Z"])
+    if use_zo and "Zo" not in names:
+        names.append("Zo")
+    return names
+
+def feature_names(mods, use_zo=False, columns=None):
+    """Feature names for generator column labels `columns` (base first; default Z, plus Z(o) if `use_zo`)."""
+    if columns is None:
+        columns = ["Z_raw", "Z_o_placeholder"] if use_zo else ["Z_raw"]
+    return build_feature_graph(mods, columns[0]).outputs() + list(columns[1:])
+
+def feature_stack(Z, start, mods, only=None, plan=None):
+    """
+    Compute every feature (or only the names in `only`) for the window starting at
+    `start`, each intermediate once. With a RangePlan, Z must be the plan's view of
+    the window of its base generator; the raw feature takes that generator's column
+    label, and differences and the Möbius twist read values past the window edges
+    from the plan. On a masked plan, Z holds the wheel's members from `start` on.
+    """
+    return dict(_iter_features(Z, start, mods, only, plan))
+
+def _iter_features(Z, start, mods, only=None, plan=None):
+    """feature_stack as a stream of (name, values): each feature can be dropped once consumed."""
+    if plan is None:
+        graph, ctx = build_feature_graph(mods), feature_context(Z, start)
+    elif plan.wheel is not None:
+        w = plan.wheel
+        e = w.number(w.index(start) + len(Z) - 1) if len(Z) else start - 1
+        graph = build_feature_graph(mods, plan.columns[0])
+        ctx = feature_context(Z, start, None, plan.Z, plan.start, plan.mu, wheel=w,
+                              G_succ=plan.window_succ(start, e))
+    else:
+        e = start + len(Z) - 1
+        base = plan.generators[0]
+        if base in plan.dd:
+            G_full = plan.dd[base]
+            Z = plan.window_dd(base, start, e)
+        else:
+            G_full = plan.Z
+        G_next = G_full[e + 1 - plan.start]
+        graph = build_feature_graph(mods, plan.columns[0], precise=base in plan.dd)
+        ctx = feature_context(Z, start, G_next, G_full, plan.start, plan.mu)
+    for name, values in graph.run(ctx, only):
+        if plan is not None and name == plan.columns[0]:
+            values = plan.window_raw(plan.generators[0], start, e)
+        yield name, values
+
+def _score_features(s, labels, Z, extras, mods, only=None, plan=None, dtype="float64", fallbacks=None):
+    """
+    Compact {feature: (auc, pi)} for one window; `extras` maps raw column labels to
+    values. With a reduced `dtype` (quantize.FEATURE_DTYPES) only the ranking
+    changes: each float64 feature is quantised and ranked as soon as it is
+    computed and then dropped, so no (features x n) matrix is built; features
+    whose AUC the dtype would move fall back to their float64 AUC and are counted
+    in the dict `fallbacks`.
+    """
+    feats = _iter_features(Z, s, mods, only=only, plan=plan)
+    feats = chain(feats, ((name, v) for name, v in extras.items() if only is None or name in only))
+    feats = ((name, rank_keys(v) if isinstance(v, DD) else v) for name, v in feats)
+    if dtype != "float64":
+        scores = {}
+        for name, values in feats:
+            with stage("auc"):
+                auc, fell_back = quantized_auc(values, labels, dtype)
+            del values
+            scores[name] = (auc, 2.0*auc - 1.0)
+            if fell_back and fallbacks is not None:
+                fallbacks[name] = fallbacks.get(name, 0) + 1
+        return scores
+    feats = dict(feats)
+    if not feats:
+        return {}
+    with stage("auc"):
+        aucs, pis = auc_batch(np.vstack(list(feats.values())), labels)
+    return {name: (float(auc), float(pi)) for name, auc, pi in zip(feats, aucs, pis)}
+
+def _score_plan_window(plan, s, e, mods, only=None, dtype="float64", fallbacks=None):
+    extras = {col: plan.window_raw(name, s, e) for name, col in zip(plan.generators[1:], plan.columns[1:])}
+    with stage("window", window=f"[{s}, {e}]"):
+        return _score_features(s, plan.window_labels(s, e), plan.window_Z(s, e), extras, mods, only=only,
+                               plan=plan, dtype=dtype, fallbacks=fallbacks)
+
+def score_window(s, e, use_zo, mods, dps, cache=None, generators=None, mask=None, dtype="float64"):
+    """Score one window on its own (a plan covering just [s, e])."""
+    plan = RangePlan(s, e, dps, generator_list(use_zo, generators), cache, wheel=mask)
+    return _score_plan_window(plan, s, e, mods, dtype=dtype)
+
+_PLANS = {}
+
+def _saved_plan(path):
+    """The plan saved at `path`, memory-mapped once per process."""
+    plan = _PLANS.get(path)
+    if plan is None:
+        _PLANS.clear()
+        plan = _PLANS[path] = RangePlan.load(path)
+    return plan
+
+def _score_saved_plan(path, s, e, mods, only=None, dtype="float64"):
+    """Worker task: score a window of the saved plan at `path`; returns (scores, dtype fallback counts)."""
+    fallbacks = {}
+    return _score_plan_window(_saved_plan(path), s, e, mods, only, dtype, fallbacks), fallbacks
+
+def _score_parallel(plan, ranges, mods, executor, workers=None, dtype="float64", fallbacks=None):
+    """
+    Fan windows of `plan` out to `executor`, which runs `workers` processes
+    (default os.cpu_count()). The plan is saved once as .npy files that workers
+    memory-map. With fewer windows than workers, each window's features are split
+    into groups so there are about `workers` tasks and every worker stays busy.
+    The workers' dtype fallback counts are added to the dict `fallbacks`.
+    """
+    workers = workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory(prefix="prime_polarity_plan_") as path:
+        plan.save(path)
+        if len(ranges) >= workers:
+            starts, ends = zip(*ranges)
+            scores = executor.map(_score_saved_plan, repeat(path), starts, ends, repeat(mods), repeat(None),
+                                  repeat(dtype))
+            results = []
+            for r, (ws, fb) in zip(ranges, scores):
+                results.append((r, ws))
+                _add_counts(fallbacks, fb)
+            return results
+
+        names = feature_names(mods, columns=plan.columns)
+        groups = -(-workers // len(ranges))
+        size = -(-len(names) // groups)
+        tasks = [(w, names[i:i + size]) for w in range(len(ranges)) for i in range(0, len(names), size)]
+        scores = executor.map(
+            _score_saved_plan,
+            repeat(path),
+            [ranges[w][0] for w, _ in tasks],
+            [ranges[w][1] for w, _ in tasks],
+            repeat(mods),
+            [group for _, group in tasks],
+            repeat(dtype),
+        )
+        results = [(r, {}) for r in ranges]
+        for (w, _), (ws, fb) in zip(tasks, scores):
+            results[w][1].update(ws)
+            _add_counts(fallbacks, fb)
+        return results
+
+def _add_counts(total, counts):
+    if total is not None:
+        for name, count in counts.items():
+            total[name] = total.get(name, 0) + count
+
+def score_range(start, end, windows, window_size, use_zo, mods, dps, executor=None, cache=None, generators=None,
+                escalate=False, max_dps=DEFAULT_MAX_DPS, stats=None, precise=False, mask=None, store=None,
+                dtype="float64", workers=None):
+    """
+    Score every feature over the windows of [start, end]. The sieve, Z(n) and the
+    Möbius table are computed once for the span covering all windows (a RangePlan)
+    and each window scores zero-copy slices of it. Pass a concurrent.futures
+    executor to score windows in parallel, and its worker count as `workers`
+    (default os.cpu_count()); results match the serial run. Pass a
+    ZCache to reuse Z(n) values across runs. `generators` names registered
+    generators to score (base first, default Z); see generators.GENERATORS.
+
+    With escalate=True, raw generator columns are ranked with float64 near-ties
+    re-evaluated at increasing precision up to `max_dps` (see RangePlan); a
+    `stats` dict receives the escalation counts per column under "escalation".
+    mpmath's global precision is never changed. With precise=True, generators
+    that support it are carried as double-double residuals (Z = 2 + R) through
+    every feature, and scores are ranked on the double-double values.
+
+    `mask` (a wheel.Wheel, e.g. parse_mask("odd")) scores only the integers
+    coprime to its modulus; everything from the sieve to the AUC runs on those
+    alone. Windows and features are the same as unmasked, so each masked AUC
+    equals the unmasked feature's AUC over the masked integers.
+
+    With a store.ResultStore, every window's scores are appended to it as one run
+    (with dps "auto" when escalating).
+
+    `dtype` "float32" or "int32" (quantize.FEATURE_DTYPES) changes only how
+    features are ranked: the transforms still run in float64, and each feature is
+    quantised and ranked as soon as it is computed instead of being stacked into
+    a (features x n) matrix. The float64 AUC is recovered from the quantised
+    ties, and a feature whose AUC the quantisation would move by more than
+    quantize.DEFAULT_AUC_TOL reports its float64 AUC instead. `stats` receives
+    the fallback counts per feature under "dtype_fallback", including those of
+    parallel workers.
+    """
+    ranges = split_windows(start, end, windows, window_size)
+    with stage("plan"):
+        plan = RangePlan(ranges[0][0], ranges[-1][1], dps, generator_list(use_zo, generators), cache,
+                         escalate=escalate, max_dps=max_dps, precise=precise, wheel=mask)
+    fallbacks = {}
+    if stats is not None:
+        stats["escalation"] = plan.escalation
+        stats["dtype_fallback"] = fallbacks
+    if executor is None:
+        results = [((s, e), _score_plan_window(plan, s, e, mods, dtype=dtype, fallbacks=fallbacks))
+                   for s, e in ranges]
+    else:
+        with stage("parallel_windows", windows=len(ranges)):
+            results = _score_parallel(plan, ranges, mods, executor, workers, dtype, fallbacks)
+    if store is not None:
+        store.add_run(results, plan.generators, mods, "auto" if escalate else dps, "" if mask is None else mask.spec,
+                      meta={"start": start, "end": end, "escalate": escalate, "precise": precise, "dtype": dtype})
+
+    names = sorted({name for _,ws in results for name in ws.keys()})
+    table = []
+    for name in names:
+        pis = []
+        aucs = []
+        for (_, ws) in results:
+            if name in ws:
+                auc, pi = ws[name]
+                pis.append(pi)
+                aucs.append(auc)
+        if len(pis)==0:
+            continue
+        avg_auc = float(np.mean(aucs))
+        avg_pi = float(np.mean(pis))
+        is_stable = stability(pis, min_pi=0.2, max_rel_var=0.2)
+        table.append((name, avg_auc, avg_pi, is_stable, pis))
+
+    table.sort(key=lambda x: x[2], reverse=True)
+    return ranges, table
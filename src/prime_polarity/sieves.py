@@ -1,3 +1,9 @@
+import math
+from typing import NamedTuple
+import numpy as np
+
+DEFAULT_SEGMENT = 1 << 20
+
 def prime_sieve_up_to(n: int):
     """Return is_prime list (0..n) using sieve of Eratosthenes."""
     is_prime = [True]*(n+1)
@@ -11,28 +17,118 @@ def prime_sieve_up_to(n: int):
         p += 1
     return is_prime
 
-def mobius_sieve_up_to(n: int):
-    """Compute Möbius mu(k) for k<=n using a sieve approach."""
-    mu = [1]*(n+1)
-    is_prime = [True]*(n+1)
-    primes = []
-    for i in range(2, n+1):
-        if is_prime[i]:
-            primes.append(i)
-            mu[i] = -1
-        j = 0
-        while j < len(primes) and i * primes[j] <= n:
-            p = primes[j]
-            is_prime[i*p] = False
-            if i % p == 0:
-                mu[i*p] = 0
-                break
-            else:
-                mu[i*p] = -mu[i]
-            j += 1
-    mu[0] = 0
+def mobius_sieve_up_to(n: int) -> np.ndarray:
+    """Compute Möbius mu(k) for k<=n (int8 array indexed by k)."""
+    return mobius_range(0, n)
+
+def mobius_range(lo: int, hi: int) -> np.ndarray:
+    """
+    Möbius mu(k) for k in [lo, hi] as an int8 array, sieving that segment only.
+
+    Each small prime p<=sqrt(hi) flips the sign of its multiples and zeroes the
+    multiples of p^2; the product of small prime factors found is tracked so that
+    one remaining large prime factor (> sqrt(hi)) contributes the last sign flip.
+    """
+    lo = max(0, lo)
+    if hi < lo:
+        return np.zeros(0, dtype=np.int8)
+    N = hi - lo + 1
+    mu = np.ones(N, dtype=np.int8)
+    prod = np.ones(N, dtype=np.int64)
+    for p in base_primes_up_to(math.isqrt(hi)):
+        p = int(p)
+        first = -(-lo // p) * p
+        mu[first - lo::p] *= -1
+        prod[first - lo::p] *= p
+        pp = p * p
+        first = -(-lo // pp) * pp
+        mu[first - lo::pp] = 0
+    n = np.arange(lo, hi + 1, dtype=np.int64)
+    mu[prod < n] *= -1
+    if lo == 0:
+        mu[0] = 0
     return mu
 
+class Factors(NamedTuple):
+    """
+    Factorisation summary of every n in [lo, lo+len-1] (n = 0 is all zeros):
+    `spf` is the smallest prime factor <= sqrt(hi) as uint32 (0 if n is 1 or a
+    prime above sqrt(hi)), `cofactor` what is left of n once those small primes
+    are divided out (1 or one prime above sqrt(hi)), `omega`/`Omega` count the
+    distinct prime factors and the prime factors with multiplicity, `tau` the
+    divisors and `phi` is Euler's totient.
+    """
+    lo: int
+    spf: np.ndarray
+    cofactor: np.ndarray
+    omega: np.ndarray
+    Omega: np.ndarray
+    tau: np.ndarray
+    phi: np.ndarray
+    squarefree: np.ndarray
+
+    def mobius(self) -> np.ndarray:
+        return np.where(self.squarefree, 1 - 2 * (self.omega & 1).astype(np.int8), 0).astype(np.int8)
+
+    def liouville(self) -> np.ndarray:
+        mu = 1 - 2 * (self.Omega & 1).astype(np.int8)
+        if self.lo == 0 and len(mu):
+            mu[0] = 0
+        return mu
+
+    def mangoldt(self) -> np.ndarray:
+        """log p if n is a power of the prime p, else 0."""
+        out = np.zeros(len(self.spf), dtype=float)
+        power = self.omega == 1
+        out[power] = np.log(np.where(self.spf > 0, self.spf, self.cofactor)[power])
+        return out
+
+def factor_sieve(lo: int, hi: int) -> Factors:
+    """
+    Factors of [lo, hi] from one segmented sieve pass: each prime p <= sqrt(hi)
+    visits its multiples (and those of p^2, p^3, ...) with strided slices, so
+    every multiplicative or additive function above costs one pass in total.
+    """
+    lo = max(0, lo)
+    N = max(0, hi - lo + 1)
+    spf = np.zeros(N, dtype=np.uint32)
+    rem = np.arange(lo, lo + N, dtype=np.int64)
+    omega = np.zeros(N, dtype=np.uint8)
+    Omega = np.zeros(N, dtype=np.uint8)
+    tau = np.ones(N, dtype=np.int64)
+    phi = np.ones(N, dtype=np.int64)
+    squarefree = np.ones(N, dtype=bool)
+    for p in base_primes_up_to(math.isqrt(max(hi, 0))):
+        p = int(p)
+        pk, k = p, 1
+        while True:
+            first = max(pk, -(-lo // pk) * pk) - lo
+            if k == 1:
+                view = spf[first::p]
+                view[view == 0] = p
+                omega[first::p] += 1
+                tau[first::p] *= 2
+                phi[first::p] *= p - 1
+            else:  # p^k | n: exponent k - 1 becomes k
+                tau[first::pk] //= k
+                tau[first::pk] *= k + 1
+                phi[first::pk] *= p
+                squarefree[first::pk] = False
+            Omega[first::pk] += 1
+            rem[first::pk] //= p
+            if pk > hi // p:
+                break
+            pk, k = pk * p, k + 1
+    big = rem > 1
+    omega[big] += 1
+    Omega[big] += 1
+    tau[big] *= 2
+    phi[big] *= rem[big] - 1
+    if lo == 0 and N:
+        tau[0] = phi[0] = 0
+        squarefree[0] = False
+    return Factors(lo, spf, rem, omega, Omega, tau, phi, squarefree)
+
 def divisors_up_to(n: int):
     """Return dict mapping m -> list of positive divisors of m for m<=n."""
     divs = {i: [] for i in range(n+1)}
@@ -40,3 +136,105 @@ def divisors_up_to(n: int):
         for k in range(d, n+1, d):
             divs[k].append(d)
     return divs
+
+_base_primes = np.zeros(0, dtype=np.int64)
+_base_limit = 1
+
+def base_primes_up_to(n: int) -> np.ndarray:
+    """
+    Primes p<=n as a read-only int64 array (NumPy sieve of Eratosthenes). The
+    largest table sieved so far is kept, so later calls with a smaller or equal n
+    (every segment, window and work unit of a long session) reuse it.
+    """
+    global _base_primes, _base_limit
+    if n > _base_limit:
+        is_prime = np.ones(n + 1, dtype=bool)
+        is_prime[:2] = False
+        is_prime[4::2] = False
+        for p in range(3, math.isqrt(n) + 1, 2):
+            if is_prime[p]:
+                is_prime[p*p::2*p] = False
+        primes = np.flatnonzero(is_prime).astype(np.int64)
+        primes.flags.writeable = False
+        _base_primes, _base_limit = primes, n
+    return _base_primes[:np.searchsorted(_base_primes, n, side="right")]
+
+# _CLEAR[b] clears bit b (np.packbits order) of a byte.
+_CLEAR = np.array([0xFF ^ (0x80 >> b) for b in range(8)], dtype=np.uint8)
+
+def odd_prime_bits(lo: int, hi: int, primes: np.ndarray) -> np.ndarray:
+    """
+    Bit-packed primality of the odd integers in [lo, hi].
+
+    Bit j (np.packbits order) is set iff lo' + 2j is prime, where lo' is the first
+    odd integer >= lo. `primes` must contain every prime up to sqrt(hi). The sieve
+    runs on the packed bytes: the odd multiples of p are p bits apart, so every
+    8th one falls on the same bit p bytes further on, and each p clears 8 strided
+    byte slices.
+    """
+    o0 = lo | 1
+    if o0 > hi:
+        return np.zeros(0, dtype=np.uint8)
+    M = (hi - o0) // 2 + 1
+    bits = np.full((M + 7) // 8, 0xFF, dtype=np.uint8)
+    if M % 8:
+        bits[-1] = (0xFF << (8 - M % 8)) & 0xFF
+    if o0 == 1:
+        bits[0] &= _CLEAR[0]
+    primes = np.asarray(primes, dtype=np.int64)
+    primes = primes[(primes > 2) & (primes * primes <= hi)]
+    m = np.maximum(primes * primes, -(-o0 // primes) * primes)
+    m += primes * (m % 2 == 0)
+    j0 = (m - o0) // 2
+    small = primes <= M >> 8
+    for p, j in zip(primes[small].tolist(), j0[small].tolist()):
+        for k in range(j, min(j + 8 * p, M), p):
+            bits[k >> 3::p] &= _CLEAR[k & 7]
+    # Primes with few multiples in the segment clear theirs by index, in batches
+    # of about len(bits) / 32 multiples so the indices stay smaller than the bits.
+    p, j = primes[~small], j0[~small]
+    count = np.maximum((M - 1 - j) // p + 1, 0)
+    ends = np.cumsum(count)
+    cuts = np.searchsorted(ends, np.arange(0, int(ends[-1]) if len(ends) else 0, max(1, len(bits) >> 5)),
+                           side="right")
+    for i, i_end in zip(cuts, np.append(cuts[1:], len(p))):
+        c = count[i:i_end]
+        first = np.cumsum(c) - c
+        idx = np.repeat(j[i:i_end] - first * p[i:i_end], c) + np.arange(int(c.sum())) * np.repeat(p[i:i_end], c)
+        np.bitwise_and.at(bits, idx >> 3, _CLEAR[idx & 7])
+    return bits
+
+def iter_prime_bits(start: int, end: int, segment: int = DEFAULT_SEGMENT):
+    """
+    Segmented odd-only sieve over [start, end]. Yields (s, e, bits) per segment,
+    with bits = odd_prime_bits(s, e); the prime 2 is left to the caller. Only
+    base primes up to sqrt(end) and one packed segment are held at a time.
+    """
+    start = max(0, start)
+    if end < start:
+        return
+    segment = max(2, int(segment))
+    primes = base_primes_up_to(math.isqrt(end))
+    for s in range(start, end + 1, segment):
+        e = min(end, s + segment - 1)
+        yield s, e, odd_prime_bits(s, e, primes)
+
+def unpack_odd_bits(bits: np.ndarray, s: int, e: int, out: np.ndarray):
+    """Write the primality of [s, e] into the bool array `out` (n = s at out[0]) from odd_prime_bits(s, e)."""
+    out[:] = False
+    o0 = s | 1
+    if o0 <= e:
+        out[o0 - s::2] = np.unpackbits(bits, count=(e - o0) // 2 + 1).view(bool)
+    if s <= 2 <= e:
+        out[2 - s] = True
+
+def iter_prime_mask(start: int, end: int, segment: int = DEFAULT_SEGMENT):
+    """
+    Segmented sieve over [start, end]. Yields (s, e, mask) per segment, where mask is
+    a boolean array for n in [s, e] (True if prime). See iter_prime_bits for the
+    packed segments it unpacks.
+    """
+    for s, e, bits in iter_prime_bits(start, end, segment):
+        mask = np.empty(e - s + 1, dtype=bool)
+        unpack_odd_bits(bits, s, e, mask)
+        yield s, e, mask
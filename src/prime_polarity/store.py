@@ -0,0 +1,146 @@
+import json
+import sqlite3
+import time
+import numpy as np
+
+from .metrics import stable_from_summary
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created TEXT NOT NULL,
+    source TEXT NOT NULL,
+    generators TEXT NOT NULL,
+    mods TEXT NOT NULL,
+    dps INTEGER,
+    mask TEXT NOT NULL,
+    meta TEXT
+);
+CREATE TABLE IF NOT EXISTS scores (
+    run INTEGER NOT NULL REFERENCES runs(id),
+    feature TEXT NOT NULL,
+    window_start INTEGER NOT NULL,
+    window_end INTEGER NOT NULL,
+    dps INTEGER,
+    mask TEXT NOT NULL,
+    auc REAL NOT NULL,
+    pi REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_lookup ON scores (feature, window_start, window_end, dps, mask);
+"""
+
+GROUP_COLUMNS = ("feature", "run", "dps", "mask", "window_start", "window_end")
+
+def mods_spec(mods) -> str:
+    """The --mods spelling of a parsed mods list ([4, (7, 2)] -> "4,7:2"); strings pass through."""
+    if isinstance(mods, str):
+        return mods
+    return ",".join(f"{m[0]}:{m[1]}" if isinstance(m, tuple) else str(m) for m in mods)
+
+class ResultStore:
+    """
+    Append-only SQLite store of per-window scores: one row per (run, feature,
+    window) with AUC and PI, indexed on (feature, window_start, window_end, dps,
+    mask). Queries filter and aggregate inside SQLite and stream rows through a
+    cursor, so histories of millions of windows are never loaded at once.
+
+    Filters (keyword arguments of the query methods): feature, run, dps, mask
+    ("" = unmasked), min_start (window_start >= min_start) and max_end
+    (window_end <= max_end); None means any.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def add_run(self, results, generators=("Z",), mods="", dps: int = None, mask: str = "",
+                source: str = "score", meta: dict = None) -> int:
+        """
+        Store [((s, e), {feature: (auc, pi)})] (as scored per window) as one run;
+        returns its id. `dps` is the working precision, or "auto" for runs that
+        escalated ties (--dps auto).
+        """
+        mask = mask or ""
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO runs (created, source, generators, mods, dps, mask, meta) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (time.strftime("%Y-%m-%dT%H:%M:%S"), source, ",".join(generators), mods_spec(mods), dps, mask,
+                 json.dumps(meta or {})))
+            run = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO scores VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((run, feature, s, e, dps, mask, float(auc), float(pi))
+                 for (s, e), scores in results for feature, (auc, pi) in scores.items()))
+        return run
+
+    def run_meta(self, source: str = None) -> list:
+        """The meta dicts of the stored runs (of one `source` if given), by run id."""
+        sql, params = "SELECT meta FROM runs", []
+        if source is not None:
+            sql, params = sql + " WHERE source = ?", [source]
+        return [json.loads(meta or "{}") for meta, in self.conn.execute(sql + " ORDER BY id", params)]
+
+    def _where(self, feature=None, run=None, dps=None, mask=None, min_start=None, max_end=None):
+        clauses, params = [], []
+        for column, value in (("feature", feature), ("run", run), ("dps", dps), ("mask", mask)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if min_start is not None:
+            clauses.append("window_start >= ?")
+            params.append(int(min_start))
+        if max_end is not None:
+            clauses.append("window_end <= ?")
+            params.append(int(max_end))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def rows(self, columns=("run", "feature", "window_start", "window_end", "auc", "pi"), **filters):
+        """Iterate over matching rows (tuples of `columns`) by window start, streamed from SQLite."""
+        where, params = self._where(**filters)
+        return self.conn.execute(f"SELECT {', '.join(columns)} FROM scores{where} ORDER BY window_start, run",
+                                 params)
+
+    def pis(self, feature: str, **filters) -> np.ndarray:
+        """PI of `feature` for every matching window, by window start."""
+        return np.fromiter((r[0] for r in self.rows(("pi",), feature=feature, **filters)), dtype=float)
+
+    def aggregate(self, by=("feature",), **filters) -> list:
+        """
+        Per group of `by` (columns of GROUP_COLUMNS): windows, mean AUC, mean, min,
+        max and standard deviation of PI, computed by SQLite; strongest |mean PI| first.
+        """
+        for column in by:
+            if column not in GROUP_COLUMNS:
+                raise ValueError(f"cannot group by {column!r}; choose from {GROUP_COLUMNS}")
+        where, params = self._where(**filters)
+        keys = ", ".join(by)
+        sql = (f"SELECT {keys}, COUNT(*), AVG(auc), AVG(pi), MIN(pi), MAX(pi), AVG(pi * pi) FROM scores{where} "
+               f"GROUP BY {keys} ORDER BY ABS(AVG(pi)) DESC")
+        out = []
+        for row in self.conn.execute(sql, params):
+            group, (n, auc, pi, lo, hi, pi2) = row[:len(by)], row[len(by):]
+            out.append({**dict(zip(by, group)), "windows": n, "auc": auc, "pi": pi, "min_pi": lo, "max_pi": hi,
+                        "std_pi": float(np.sqrt(max(pi2 - pi * pi, 0.0)))})
+        return out
+
+    def stability(self, feature: str, min_pi: float = 0.2, max_rel_var: float = 0.2, **filters) -> bool:
+        """metrics.stability over the stored PI history of `feature`, from two SQL aggregate passes."""
+        where, params = self._where(feature=feature, **filters)
+        n, lo, mean = self.conn.execute(f"SELECT COUNT(*), MIN(pi), AVG(pi) FROM scores{where}", params).fetchone()
+        if not n:
+            return False
+        var, = self.conn.execute(f"SELECT AVG((pi - ?) * (pi - ?)) FROM scores{where}",
+                                 [mean, mean] + params).fetchone()
+        return stable_from_summary(lo, mean, float(np.sqrt(var)), min_pi, max_rel_var)
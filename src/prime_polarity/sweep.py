@@ -0,0 +1,298 @@
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .characters import character_table, default_character
+from .metrics import split_windows, stability
+from .quantize import FEATURE_DTYPES
+from .sieves import base_primes_up_to
+
+RESULT_FIELDS = ["start", "end", "window_size", "mods", "generators", "mask", "window_start", "window_end",
+                 "feature", "auc", "pi"]
+
+def load_spec(path: str) -> dict:
+    """
+    A sweep spec: JSON with "ranges" ([[start, end], ...]) and/or "grid"
+    ({"start", "end", "points", "length"}: log-spaced ranges of `length` integers),
+    plus optional "window_sizes", "mods", "masks", "generators", "dps" and "dtype"
+    (feature dtype, see scoring.score_range). Every
+    combination of range, window size, mods and mask is one job.
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def spec_ranges(spec: dict) -> list:
+    """[(start, end)] from the spec's "ranges" list and optional log-spaced "grid"."""
+    ranges = [(int(a), int(b)) for a, b in spec.get("ranges", [])]
+    grid = spec.get("grid")
+    if grid:
+        points, length = int(grid["points"]), int(grid["length"])
+        starts = np.geomspace(float(grid["start"]), float(grid["end"]) - length + 1, points)
+        ranges += [(int(s), int(s) + length - 1) for s in np.unique(starts.round().astype(np.int64))]
+    for a, b in ranges:
+        if a < 1 or b < a:
+            raise ValueError(f"invalid range [{a}, {b}] in sweep spec")
+    if not ranges:
+        raise ValueError("sweep spec needs \"ranges\" or \"grid\"")
+    return ranges
+
+def expand_jobs(spec: dict) -> list:
+    """One job dict per (range, window size, mods, mask) combination."""
+    sizes = spec.get("window_sizes", [spec.get("window_size", 5000)])
+    mods = spec.get("mods", ["4,5,8,12"])
+    masks = spec.get("masks", [spec.get("mask", "")])
+    generators = spec.get("generators", "Z")
+    if isinstance(generators, list):
+        generators = ",".join(generators)
+    dps = int(spec.get("dps", 50))
+    dtype = spec.get("dtype", "float64")
+    if dtype not in FEATURE_DTYPES:
+        raise ValueError(f"dtype {dtype!r} must be one of {list(FEATURE_DTYPES)}")
+    return [{"start": a, "end": b, "window_size": int(ws), "mods": m, "mask": mask, "generators": generators,
+             "dps": dps, "dtype": dtype}
+            for a, b in spec_ranges(spec) for ws in sizes for m in mods for mask in masks]
+
+def work_units(jobs: list, unit_size: int) -> list:
+    """
+    Cut every job into units of consecutive windows holding about `unit_size`
+    integers (at least one window each), largest first so the pool finishes
+    evenly. Unit ids hash the job and windows, so they are stable across runs.
+    """
+    units = []
+    for job in jobs:
+        a, b, ws = job["start"], job["end"], job["window_size"]
+        windows = split_windows(a, b, -(-(b - a + 1) // ws), ws)
+        per_unit = max(1, unit_size // ws)
+        for i in range(0, len(windows), per_unit):
+            chunk = windows[i:i + per_unit]
+            key = json.dumps([job, chunk], sort_keys=True)
+            units.append({"id": hashlib.sha1(key.encode()).hexdigest()[:16], "job": job, "windows": chunk})
+    units.sort(key=lambda u: u["windows"][-1][1] - u["windows"][0][0], reverse=True)
+    return units
+
+def _init_worker(max_end: int, mods: list):
+    """Warm the per-process tables every unit reads."""
+    from .cli import parse_mods
+    base_primes_up_to(math.isqrt(max_end))
+    for spec in mods:
+        for m in parse_mods(spec):
+            if isinstance(m, str):
+                continue
+            q, k = m if isinstance(m, tuple) else (m, None)
+            character_table(q, default_character(q) if k is None else k)
+
+def job_key(job: dict) -> str:
+    """Stable id of a job (a hash of its parameters)."""
+    return hashlib.sha1(json.dumps(job, sort_keys=True).encode()).hexdigest()[:16]
+
+def _job_plan(job: dict):
+    from .plan import RangePlan
+    from .wheel import parse_mask
+    generators = [g.strip() for g in job["generators"].split(",") if g.strip()]
+    return RangePlan(job["start"], job["end"], job["dps"], generators, wheel=parse_mask(job["mask"]))
+
+def build_plan(job: dict, path: str) -> str:
+    """Save the plan of a whole job under `path` (unless already there) for its units to memory-map."""
+    if not os.path.exists(os.path.join(path, "plan.json")):
+        _job_plan(job).save(path)
+    return path
+
+def run_unit(unit: dict, plan_path: str = None) -> list:
+    """
+    Score one work unit and return its result rows. Units read the plan of their
+    whole job, saved once at `plan_path` by build_plan (computed here if None), so
+    twists see every n/d down to the job start and each unit scores exactly as
+    score_range over the whole job does.
+    """
+    from .cli import parse_mods
+    from .scoring import _saved_plan, _score_plan_window
+    job, windows = unit["job"], unit["windows"]
+    plan = _job_plan(job) if plan_path is None else _saved_plan(plan_path)
+    mods = parse_mods(job["mods"])
+    rows = []
+    for s, e in windows:
+        for feature, (auc, pi) in sorted(_score_plan_window(plan, s, e, mods, dtype=job["dtype"]).items()):
+            rows.append({"start": job["start"], "end": job["end"], "window_size": job["window_size"],
+                         "mods": job["mods"], "generators": job["generators"], "mask": job["mask"],
+                         "window_start": s, "window_end": e, "feature": feature, "auc": auc, "pi": pi})
+    return rows
+
+def _release_plan(path: str):
+    """Delete a saved job plan once its units are done."""
+    from .scoring import _PLANS
+    _PLANS.pop(path, None)
+    shutil.rmtree(path, ignore_errors=True)
+
+def read_checkpoint(path: str) -> dict:
+    """{unit id: rows} from a checkpoint file; a torn last line (interrupted write) is ignored."""
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                done[entry["unit"]] = entry["rows"]
+    return done
+
+def _drop_torn_tail(path: str):
+    """Truncate a checkpoint after its last complete line, so appends start on a fresh line."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+def sweep(spec: dict, out_dir: str, jobs: int = 1, unit_size: int = 0, progress=None, store=None) -> str:
+    """
+    Run (or resume) the sweep described by `spec` into `out_dir` and return the
+    path of the consolidated results.csv.
+
+    Jobs are cut into work units of whole windows (`unit_size` integers each,
+    default about four units per worker) that one process pool scores in a single
+    session; workers keep their base-prime and character tables between units.
+    Each job's plan is computed once and saved in out_dir/plans until its units
+    are done, and units memory-map it.
+    Each finished unit is appended to out_dir/checkpoint.jsonl, and units already
+    there are skipped, so an interrupted sweep resumes where it stopped. With a
+    store.ResultStore, each job is also appended to it as one run, keyed on the
+    output directory and the job so that resumed or repeated sweeps add none twice.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    job_list = expand_jobs(spec)
+    workers = jobs or os.cpu_count() or 1
+    if not unit_size:
+        total = sum(j["end"] - j["start"] + 1 for j in job_list)
+        unit_size = max(max(j["window_size"] for j in job_list), total // (4 * workers))
+    units = work_units(job_list, unit_size)
+    ckpt = os.path.join(out_dir, "checkpoint.jsonl")
+    _drop_torn_tail(ckpt)
+    done = read_checkpoint(ckpt)
+    todo = [u for u in units if u["id"] not in done]
+    if progress:
+        progress(len(units) - len(todo), len(units))
+
+    by_job = {}
+    for u in todo:
+        by_job.setdefault(job_key(u["job"]), []).append(u)
+    paths = {key: os.path.join(out_dir, "plans", key) for key in by_job}
+    left = {key: len(us) for key, us in by_job.items()}
+
+    with open(ckpt, "a", encoding="utf-8") as log:
+        def record(unit, rows):
+            done[unit["id"]] = rows
+            log.write(json.dumps({"unit": unit["id"], "rows": rows}) + "\n")
+            log.flush()
+            os.fsync(log.fileno())
+            if progress:
+                progress(len(done), len(units))
+            key = job_key(unit["job"])
+            left[key] -= 1
+            if not left[key]:
+                _release_plan(paths[key])
+
+        if workers == 1:
+            for key, job_units in by_job.items():
+                build_plan(job_units[0]["job"], paths[key])
+                for unit in job_units:
+                    record(unit, run_unit(unit, paths[key]))
+        elif todo:
+            max_end = max(j["end"] for j in job_list)
+            mods = sorted({j["mods"] for j in job_list})
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(max_end, mods)) as executor:
+                # A job's units are submitted once its plan is saved.
+                pending = {executor.submit(build_plan, us[0]["job"], paths[key]): (key, None)
+                           for key, us in by_job.items()}
+                while pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        key, unit = pending.pop(fut)
+                        if unit is None:
+                            fut.result()
+                            pending.update((executor.submit(run_unit, u, paths[key]), (key, u))
+                                           for u in by_job[key])
+                        else:
+                            record(unit, fut.result())
+    shutil.rmtree(os.path.join(out_dir, "plans"), ignore_errors=True)
+
+    rows = [row for u in units for row in done[u["id"]]]
+    rows.sort(key=lambda r: tuple(r[k] for k in RESULT_FIELDS[:9]))
+    path = os.path.join(out_dir, "results.csv")
+    with open(path + ".tmp", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(path + ".tmp", path)
+    if store is not None:
+        out = os.path.abspath(out_dir)
+        stored = {(m.get("out"), m.get("job")) for m in store.run_meta("sweep")}
+        for job in job_list:
+            key = job_key(job)
+            if (out, key) in stored:
+                continue
+            windows = {}
+            for u in units:
+                for r in done[u["id"]] if u["job"] == job else ():
+                    scores = windows.setdefault((r["window_start"], r["window_end"]), {})
+                    scores[r["feature"]] = (r["auc"], r["pi"])
+            store.add_run(sorted(windows.items()), job["generators"].split(","), job["mods"], job["dps"],
+                          job["mask"], source="sweep",
+                          meta={"start": job["start"], "end": job["end"], "out": out, "job": key})
+    return path
+
+def summarize(path: str) -> list:
+    """Per (job, feature): (job key, feature, avg AUC, avg PI, stable), strongest |PI| first."""
+    groups = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            key = (int(r["start"]), int(r["end"]), int(r["window_size"]), r["mods"], r["mask"])
+            groups.setdefault((key, r["feature"]), []).append((float(r["auc"]), float(r["pi"])))
+    table = []
+    for (key, feature), vals in groups.items():
+        aucs, pis = zip(*vals)
+        table.append((key, feature, float(np.mean(aucs)), float(np.mean(pis)), stability(list(pis))))
+    table.sort(key=lambda x: abs(x[3]), reverse=True)
+    return table
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="prime-polarity sweep",
+                                     description="Score many ranges x window sizes x mods in one session.")
+    parser.add_argument("spec", help="JSON sweep spec (see prime_polarity.sweep).")
+    parser.add_argument("--out", required=True, help="Output directory (checkpoint.jsonl, results.csv).")
+    parser.add_argument("--jobs", type=int, default=0, help="Worker processes (1 = serial, 0 = all cores).")
+    parser.add_argument("--unit-size", type=int, default=0,
+                        help="Integers per work unit (default: about four units per worker).")
+    parser.add_argument("--top", type=int, default=20, help="Print the strongest N (job, feature) rows.")
+    parser.add_argument("--store", type=str, default="",
+                        help="Also append every job to this SQLite result store (see 'prime-polarity results').")
+    args = parser.parse_args(argv)
+    try:
+        spec = load_spec(args.spec)
+        expand_jobs(spec)
+    except (OSError, ValueError, KeyError) as exc:
+        parser.error(f"bad spec {args.spec}: {exc}")
+
+    def progress(done, total):
+        print(f"\rUnits: {done}/{total}", end="\n" if done == total else "", flush=True)
+
+    if args.store:
+        from .store import ResultStore
+        with ResultStore(args.store) as store:
+            path = sweep(spec, args.out, args.jobs, args.unit_size, progress, store)
+    else:
+        path = sweep(spec, args.out, args.jobs, args.unit_size, progress)
+    print(f"Wrote {path}")
+    print(f"\n{'Range':>25s} {'Window':>8s} {'Mods':>12s} {'Mask':>10s}  {'Feature':28s} {'AUC':>7s} {'PI':>7s}")
+    for (a, b, ws, mods, mask), feature, auc, pi, stable in summarize(path)[:args.top]:
+        flag = " ✓" if stable else ""
+        print(f"{f'[{a}, {b}]':>25s} {ws:8d} {mods:>12s} {mask or '-':>10s}  {feature:28s} {auc:7.3f} {pi:7.3f}{flag}")
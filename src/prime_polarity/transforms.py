@@ -1,6 +1,9 @@
+from collections import OrderedDict
 import math
 import numpy as np
-from .sieves import mobius_sieve_up_to, divisors_up_to
+from .sieves import factor_sieve, mobius_range
+from .characters import character_values
+from . import ddouble
 
 def fractional_part_min(x: np.ndarray) -> np.ndarray:
     """Elementwise s = min(frac(x), 1-frac(x))."""
@@ -25,59 +28,253 @@ def logmellin_slope(x: np.ndarray, n0: int) -> np.ndarray:
 def mobius_twist(G_values: np.ndarray, n0: int) -> np.ndarray:
     """
     Compute M[G](n) = sum_{d|n} mu(d) * G(n/d) for n in [n0, n0+len-1].
+
+    Only terms with n/d inside the window contribute.
     """
     N = len(G_values)
-    max_n = n0 + N - 1
-    mu = mobius_sieve_up_to(max_n)
-    divs = divisors_up_to(max_n)
-
-    out = np.zeros(N, dtype=float)
-    for idx, n in enumerate(range(n0, n0 + N)):
-        acc = 0.0
-        for d in divs[n]:
-            mu_d = mu[d]
-            if mu_d == 0:
-                continue
-            q = n // d
-            q_idx = q - n0
-            if 0 <= q_idx < N:
-                acc += mu_d * G_values[q_idx]
-        out[idx] = acc
+    return mobius_twist_range(G_values, n0, n0, n0 + N - 1)
+
+def mobius_twist_range(G_values: np.ndarray, g0: int, lo: int, hi: int, mu: np.ndarray = None,
+                       wheel=None) -> np.ndarray:
+    """
+    M[G](n) for n in [lo, hi], where G_values[i] = G(g0 + i) and G must be known up
+    to hi. Terms with n/d < g0 are dropped. A precomputed Möbius table `mu` (indexed
+    by d, covering d <= hi // max(g0, 1)) is used for windows too large to index.
+
+    When g0 is small the sum runs over many d and is one product with the cached
+    DivisorIndex of the window, shared by repeated twists of the same window
+    (several generators, plan and features); otherwise each d is one strided slice.
+    Only G(q) for q <= hi is read; G_values may be a memory-mapped array larger
+    than the output. With a wheel.Wheel, G_values and the result hold its members
+    only (masked scoring).
+    """
+    return dirichlet_convolution(G_values, g0, lo, hi, "mobius", coeffs=mu, wheel=wheel)
+
+def mobius_twist_range_dd(G: ddouble.DD, g0: int, lo: int, hi: int, mu: np.ndarray = None) -> ddouble.DD:
+    """
+    mobius_twist_range for a double-double G, accumulated with error-free sums so
+    cancellation between the +-G(n/d) terms keeps the low-order digits.
+    """
+    return dirichlet_convolution_dd(G, g0, lo, hi, "mobius", coeffs=mu)
+
+def dirichlet_convolution_dd(G: ddouble.DD, g0: int, lo: int, hi: int, kind: str = "mobius",
+                             coeffs: np.ndarray = None) -> ddouble.DD:
+    """dirichlet_convolution for a double-double G, with error-free products and sums."""
+    if coeffs is None or len(coeffs) <= hi // max(g0, 1):
+        coeffs = COEFFICIENTS[kind](hi // max(g0, 1))
+    N = max(0, hi - lo + 1)
+    out_hi, out_lo = np.zeros(N, dtype=float), np.zeros(N, dtype=float)
+    for c, dst, src in _twist_slices(g0, lo, hi, coeffs):
+        p, pe = ddouble.two_prod(G.hi[src], c)
+        s, e = ddouble.two_sum(out_hi[dst], p)
+        out_hi[dst] = s
+        out_lo[dst] += e + pe + c * G.lo[src]
+    return ddouble.normalize(out_hi, out_lo)
+
+def _twist_slices(g0: int, lo: int, hi: int, mu: np.ndarray = None, wheel=None):
+    """
+    (f(d), output slice, G slice) for each d with f(d) = mu[d] != 0 contributing to n in [lo, hi].
+
+    With a wheel.Wheel, slices are over compact indices and d runs over members
+    only. The members q are not evenly spaced, but those in one residue class
+    mod the wheel modulus m are m apart, and d*q then moves phi*d indices per
+    step: each d gives one slice per residue class.
+    """
+    if hi < lo:
+        return
+    q_min = max(g0, 1)
+    d_max = hi // q_min
+    if mu is None or len(mu) <= d_max:
+        mu = mobius_range(0, d_max)
+    if wheel is not None:
+        k_g0, k_n0, phi = wheel.index(max(g0, 0)), wheel.index(lo), wheel.phi
+    for d in np.flatnonzero(mu[:d_max + 1]):
+        d = int(d)
+        q_lo = max(q_min, -(-lo // d))
+        q_hi = hi // d
+        if q_hi < q_min:
+            break
+        if q_hi < q_lo:
+            continue
+        if wheel is None:
+            yield float(mu[d]), slice(q_lo*d - lo, q_hi*d - lo + 1, d), slice(q_lo - g0, q_hi - g0 + 1)
+            continue
+        if math.gcd(d, wheel.modulus) != 1:
+            continue
+        k_lo, k_end = wheel.index(q_lo), wheel.index(q_hi + 1)
+        for k in range(k_lo, min(k_lo + phi, k_end)):
+            count = (k_end - k - 1) // phi + 1
+            i = wheel.index(d * wheel.number(k)) - k_n0
+            yield (float(mu[d]), slice(i, i + (count - 1) * phi * d + 1, phi * d),
+                   slice(k - k_g0, k - k_g0 + (count - 1) * phi + 1, phi))
+
+# Windows are indexed only when there are enough divisors d for the per-d slice
+# loop to dominate (g0 small relative to hi), and the index stays within memory.
+MIN_INDEX_DIVISORS = 2048
+MAX_INDEX_PAIRS = 1 << 25
+
+# Arithmetic functions derived from one factor_sieve pass: name -> (feature
+# label, f(Factors) -> values). Each is a projection f(n) G(n) and a Dirichlet
+# convolution (twist) sum_{d|n} f(d) G(n/d).
+ARITHMETIC = {
+    "mobius": ("Mobius", lambda f: f.mobius()),
+    "liouville": ("Liouville", lambda f: f.liouville()),
+    "mangoldt": ("Mangoldt", lambda f: f.mangoldt()),
+    "divisors": ("Divisors", lambda f: f.tau),
+    "totient": ("Totient", lambda f: f.phi),
+    "omega": ("DistinctPrimes", lambda f: f.omega),  # omega(n), not Omega(n)
+}
+
+def arithmetic_values(kind: str, factors) -> np.ndarray:
+    """f(n) as float64 over a sieves.Factors, for f = ARITHMETIC[kind]."""
+    return np.asarray(ARITHMETIC[kind][1](factors), dtype=float)
+
+def ramanujan_sum(q: int, n: np.ndarray) -> np.ndarray:
+    """
+    Ramanujan's sum c_q(n) = sum over the primitive q-th roots of unity z of z^n,
+    evaluated as mu(q/g) phi(q) / phi(q/g) with g = gcd(n, q).
+    """
+    small = factor_sieve(0, q)
+    m = q // np.gcd(np.asarray(n, dtype=np.int64), q)
+    return (small.mobius()[m] * (small.phi[q] // small.phi[m])).astype(float)
+
+# name -> coeffs(d_max): table f[d] for d <= d_max of a Dirichlet coefficient.
+COEFFICIENTS = {"mobius": lambda d_max: mobius_range(0, d_max)}
+COEFFICIENTS.update({kind: lambda d_max, kind=kind: arithmetic_values(kind, factor_sieve(0, d_max))
+                     for kind in ARITHMETIC if kind not in COEFFICIENTS})
+
+class DivisorIndex:
+    """
+    CSR index of the divisor pairs (n, n/d) with f(d) != 0, for n in [lo, hi] and
+    n/d >= g0: row n - lo holds the columns n/d - g0 and the values f(d), in
+    increasing d. A Dirichlet convolution sum_{d|n} f(d) G(n/d) over the window is
+    then one sparse matrix-vector product with G(g0), G(g0+1), ...
+
+    With a wheel.Wheel, rows and columns are compact indices: only n coprime to
+    the wheel modulus are rows, and G holds the members >= g0. Their divisors are
+    coprime too, so the masked convolution needs no values outside the wheel.
+    """
+
+    def __init__(self, g0: int, lo: int, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+                 wheel=None):
+        self.g0, self.lo, self.wheel = g0, lo, wheel
+        self.indptr, self.indices, self.data = indptr, indices, data
+        self._starts = indptr[:-1][np.diff(indptr) > 0]
+
+    @classmethod
+    def build(cls, g0: int, lo: int, hi: int, coeffs: np.ndarray, wheel=None) -> "DivisorIndex":
+        """Index for n in [lo, hi]; coeffs[d] = f(d) must cover d <= hi // max(g0, 1)."""
+        d, k_lo, count = _pair_counts(g0, lo, hi, coeffs, wheel)
+        total = int(count.sum())
+        first = np.cumsum(count) - count
+        k = np.repeat(k_lo - first, count) + np.arange(total, dtype=np.int64)
+        dd = np.repeat(d, count)
+        if wheel is None:
+            N, rows, cols = max(0, hi - lo + 1), k * dd - lo, k - g0
+        else:
+            N = wheel.count(lo, hi)
+            rows, cols = wheel.index(wheel.number(k) * dd) - wheel.index(lo), k - wheel.index(max(g0, 0))
+        order = np.argsort(rows, kind="stable")
+        indptr = np.zeros(N + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=N), out=indptr[1:])
+        return cls(g0, lo, indptr, cols[order], coeffs[dd][order], wheel)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes + self._starts.nbytes
+
+    def matvec(self, G_values: np.ndarray) -> np.ndarray:
+        """sum_{d|n} f(d) G(n/d) for each row n; G_values[i] = G(g0 + i) (i-th member >= g0 with a wheel)."""
+        out = np.zeros(len(self), dtype=float)
+        if self.nnz:
+            terms = self.data * np.asarray(G_values)[self.indices]
+            out[np.diff(self.indptr) > 0] = np.add.reduceat(terms, self._starts)
+        return out
+
+def _pair_counts(g0, lo, hi, coeffs, wheel=None):
+    """
+    (d, first q, number of q) for each d with coeffs[d] != 0 and some n = q*d in
+    [lo, hi], q >= g0; with a wheel, q counts members only and is a compact index.
+    """
+    q_min = max(g0, 1)
+    d = np.flatnonzero(coeffs[:hi // q_min + 1])
+    d = d[d > 0].astype(np.int64)
+    q_lo = np.maximum(q_min, -(-lo // d))
+    if wheel is None:
+        return d, q_lo, np.maximum(hi // d - q_lo + 1, 0)
+    keep = wheel.contains(d)
+    d, q_lo = d[keep], q_lo[keep]
+    k_lo = wheel.index(q_lo)
+    return d, k_lo, np.maximum(wheel.index(hi // d + 1) - k_lo, 0)
+
+# Cached indexes are dropped, least recently used first, once they hold more
+# than this many bytes; the newest index is always kept.
+INDEX_CACHE_BYTES = 1 << 29
+_index_cache = OrderedDict()
+
+def divisor_index(g0: int, lo: int, hi: int, kind: str = "mobius", wheel=None,
+                  coeffs: np.ndarray = None) -> DivisorIndex:
+    """
+    Cached DivisorIndex for the coefficients COEFFICIENTS[kind], shared by every
+    generator and feature convolving over the same window. None if the window has
+    fewer than MIN_INDEX_DIVISORS divisors d or more than MAX_INDEX_PAIRS pairs
+    (strided slices are used instead); with a wheel both count members only.
+    `coeffs`, a table of f covering d <= hi // max(g0, 1), saves recomputing it.
+    """
+    key = (g0, lo, hi, kind, wheel)
+    if key in _index_cache:
+        _index_cache.move_to_end(key)
+        return _index_cache[key]
+    index = None
+    if hi >= lo:
+        if coeffs is None or len(coeffs) <= hi // max(g0, 1):
+            coeffs = COEFFICIENTS[kind](hi // max(g0, 1))
+        d, _, count = _pair_counts(g0, lo, hi, coeffs, wheel)
+        if len(d) >= MIN_INDEX_DIVISORS and count.sum() <= MAX_INDEX_PAIRS:
+            index = DivisorIndex.build(g0, lo, hi, coeffs, wheel)
+    _index_cache[key] = index
+    total = sum(i.nbytes for i in _index_cache.values() if i is not None)
+    while total > INDEX_CACHE_BYTES and len(_index_cache) > 1:
+        _, old = _index_cache.popitem(last=False)
+        total -= 0 if old is None else old.nbytes
+    return index
+
+def clear_index_cache():
+    """Drop every cached DivisorIndex."""
+    _index_cache.clear()
+
+def dirichlet_convolution(G_values: np.ndarray, g0: int, lo: int, hi: int, kind: str = "mobius",
+                          coeffs: np.ndarray = None, wheel=None) -> np.ndarray:
+    """
+    sum_{d|n, n/d >= g0} f(d) G(n/d) for n in [lo, hi] with f = COEFFICIENTS[kind].
+    Windows too large for an index are summed one strided slice per d instead,
+    using the table `coeffs` of f when it covers d <= hi // max(g0, 1). With a
+    wheel, G_values and the result are over its members (see DivisorIndex).
+    """
+    index = divisor_index(g0, lo, hi, kind, wheel, coeffs)
+    if index is not None:
+        return index.matvec(G_values)
+    if coeffs is None or len(coeffs) <= hi // max(g0, 1):
+        coeffs = COEFFICIENTS[kind](hi // max(g0, 1))
+    out = np.zeros(max(0, hi - lo + 1) if wheel is None else wheel.count(lo, hi), dtype=float)
+    for sign, dst, src in _twist_slices(g0, lo, hi, coeffs, wheel):
+        out[dst] += sign * G_values[src]
     return out
 
-def dirichlet_projection(G_values: np.ndarray, n0: int, modulus: int, kind: str = "odd") -> np.ndarray:
+def dirichlet_projection(G_values: np.ndarray, n0: int, modulus: int, index: int = None) -> np.ndarray:
     """
-    Simple real Dirichlet character projection for small moduli.
-    Supported moduli: 4, 5, 8, 12 (demo characters).
+    Dirichlet character projection chi(n) * G(n) for n in [n0, n0+len-1].
+
+    `index` selects any character mod `modulus` (see characters.character_table);
+    by default the real non-principal character of largest conductor is used, which
+    for moduli 4, 5, 8, 12 is the classic demo character. Complex characters give a
+    complex result.
     """
-    N = len(G_values)
-    n = np.arange(n0, n0 + N)
-
-    def chi_mod4(m):
-        if m % 2 == 0: return 0
-        return 1 if (m % 4) == 1 else -1  # primitive odd real character
-    def chi_mod5(m):
-        r = m % 5
-        if r==0: return 0
-        return 1 if r in (1,4) else -1
-    def chi_mod8(m):
-        if math.gcd(m,8)!=1: return 0
-        r = m % 8
-        return 1 if r in (1,7) else -1
-    def chi_mod12(m):
-        if math.gcd(m,12)!=1: return 0
-        r = m % 12
-        return 1 if r in (1,11) else -1
-
-    if modulus == 4:
-        chi = np.array([chi_mod4(int(x)) for x in n], dtype=float)
-    elif modulus == 5:
-        chi = np.array([chi_mod5(int(x)) for x in n], dtype=float)
-    elif modulus == 8:
-        chi = np.array([chi_mod8(int(x)) for x in n], dtype=float)
-    elif modulus == 12:
-        chi = np.array([chi_mod12(int(x)) for x in n], dtype=float)
-    else:
-        raise ValueError("Unsupported modulus. Use one of {4,5,8,12}.")
-
-    return chi * G_values
+    return character_values(n0, len(G_values), modulus, index) * G_values
@@ -0,0 +1,100 @@
+import math
+import numpy as np
+
+from .sieves import DEFAULT_SEGMENT, base_primes_up_to, odd_prime_bits
+
+class Wheel:
+    """
+    The integers coprime to `modulus`, in increasing order, addressed by a compact
+    index: index(n) counts the members below n, so consecutive members get
+    consecutive indices and a window [lo, hi] is one contiguous slice. Arrays over
+    a masked range hold about phi(modulus)/modulus of the integers. Wheel(2) is the
+    odd-only mask; Wheel(1) masks nothing.
+    """
+
+    def __init__(self, modulus: int):
+        modulus = int(modulus)
+        if modulus < 1:
+            raise ValueError(f"wheel modulus must be positive, got {modulus}")
+        self.modulus = modulus
+        r = np.arange(modulus, dtype=np.int64)
+        self.residues = r[np.gcd(r, modulus) == 1]
+        self.phi = len(self.residues)
+        # members of [0, r) among the residues, for r in [0, modulus]
+        self._below = np.searchsorted(self.residues, np.arange(modulus + 1))
+
+    def __repr__(self):
+        return f"Wheel({self.modulus})"
+
+    def __eq__(self, other):
+        return isinstance(other, Wheel) and other.modulus == self.modulus
+
+    def __hash__(self):
+        return hash(("Wheel", self.modulus))
+
+    @property
+    def spec(self) -> str:
+        """The --mask spelling of this wheel."""
+        return "odd" if self.modulus == 2 else f"coprime:{self.modulus}"
+
+    def contains(self, n) -> np.ndarray:
+        return np.gcd(np.asarray(n, dtype=np.int64), self.modulus) == 1
+
+    def index(self, n):
+        """Number of members below n (the compact index of n if n is a member); n >= 0."""
+        n = np.asarray(n, dtype=np.int64)
+        out = (n // self.modulus) * self.phi + self._below[n % self.modulus]
+        return int(out) if out.ndim == 0 else out
+
+    def number(self, k):
+        """The member with compact index k (inverse of index())."""
+        k = np.asarray(k, dtype=np.int64)
+        out = (k // self.phi) * self.modulus + self.residues[k % self.phi]
+        return int(out) if out.ndim == 0 else out
+
+    def count(self, lo: int, hi: int) -> int:
+        """Number of members in [lo, hi]."""
+        return max(0, self.index(hi + 1) - self.index(max(lo, 0)))
+
+    def numbers(self, lo: int, hi: int) -> np.ndarray:
+        """The members of [lo, hi] as an int64 array."""
+        k0 = self.index(max(lo, 0))
+        return self.number(np.arange(k0, k0 + self.count(lo, hi), dtype=np.int64))
+
+    def prime_mask(self, lo: int, hi: int, segment: int = DEFAULT_SEGMENT) -> np.ndarray:
+        """
+        Primality of numbers(lo, hi). Sieves odd integers only (bit-packed, one
+        segment at a time) and reads the members' bits, so no array spans [lo, hi].
+        """
+        lo = max(lo, 0)
+        out = np.zeros(self.count(lo, hi), dtype=bool)
+        primes = base_primes_up_to(math.isqrt(max(hi, 0)))
+        pos = 0
+        for s in range(lo, hi + 1, max(2, int(segment))):
+            e = min(hi, s + segment - 1)
+            n = self.numbers(s, e)
+            odd = (n & 1).astype(bool)
+            o0 = s | 1
+            if o0 <= e:
+                bits = np.unpackbits(odd_prime_bits(s, e, primes), count=(e - o0) // 2 + 1).view(bool)
+                if self.modulus == 2:  # the members are exactly the sieved odd integers
+                    out[pos:pos + len(n)] = bits
+                else:
+                    out[pos:pos + len(n)][odd] = bits[(n[odd] - o0) // 2]
+            out[pos:pos + len(n)][n == 2] = True
+            pos += len(n)
+        return out
+
+def parse_mask(spec: str):
+    """Wheel for a --mask value: "" or "none" (None), "odd", or "coprime:q"."""
+    spec = (spec or "").strip().lower()
+    if spec in ("", "none"):
+        return None
+    if spec == "odd":
+        return Wheel(2)
+    if spec.startswith("coprime:"):
+        try:
+            return Wheel(int(spec.split(":", 1)[1]))
+        except ValueError:
+            pass
+    raise ValueError(f"mask {spec!r} must be 'odd' or 'coprime:q' with a positive integer q")
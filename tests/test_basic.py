@@ -1,6 +1,22 @@
+import mpmath
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from prime_polarity.generators import set_precision, Z_raw
-from prime_polarity.sieves import prime_sieve_up_to, mobius_sieve_up_to
+from prime_polarity.generators import set_precision, Z_raw, Z_batch, PATH_MPMATH, PATH_SERIES
+from prime_polarity.generators import GENERATORS, register_generator, evaluate_generators, Z_o_placeholder
+from prime_polarity.sieves import prime_sieve_up_to, mobius_sieve_up_to, mobius_range, iter_prime_mask, divisors_up_to
+from prime_polarity.transforms import mobius_twist, mobius_twist_range, dirichlet_projection
+from prime_polarity.transforms import DivisorIndex, clear_index_cache, divisor_index, dirichlet_convolution
+from prime_polarity.characters import character_table, num_characters, conductor
+from prime_polarity.metrics import labels_for_range, StreamingAUC, BinnedAUC, auc_batch
+from prime_polarity.cli import score_range, compute_G
+from prime_polarity.cache import ZCache
+from prime_polarity.plan import RangePlan
+from prime_polarity.wheel import Wheel, parse_mask
+from prime_polarity.features import build_feature_graph, feature_context
+from prime_polarity.profiling import Recorder, stage
+from prime_polarity.precision import escalate_ties, mp_context
+from prime_polarity.generators import Z_mp, Z_dd
+from prime_polarity.ddouble import rank_keys
 from prime_polarity.metrics import auc_from_scores, polarity_index
 
 def test_z_raw_basic():
@@ -8,15 +24,195 @@ def test_z_raw_basic():
     z3 = Z_raw(3)
     assert z3 is not None and z3 > 0
 
+def test_z_batch_matches_z_raw():
+    set_precision(50)
+    Z, path = Z_batch(1, 400, dps=50)
+    assert np.isnan(Z[:2]).all()
+    assert (path[2:] == PATH_MPMATH).any() and (path[2:] == PATH_SERIES).any()
+    ref = np.array([Z_raw(n) for n in range(3, 401)])
+    assert np.all(np.abs(Z[2:] - ref) <= 2 * np.spacing(ref))
+
 def test_prime_sieve_small():
     is_prime = prime_sieve_up_to(30)
     primes = [i for i,b in enumerate(is_prime) if b]
     assert primes == [2,3,5,7,11,13,17,19,23,29]
 
+def test_generator_registry_reuses_parents():
+    calls = []
+    @register_generator("_test_parent")
+    def parent(n, dps):
+        calls.append(len(n))
+        return n.astype(float)
+    @register_generator("_test_child", depends=("_test_parent",))
+    def child(n, dps, p):
+        return 2.0 * p
+    try:
+        out = evaluate_generators(["_test_child", "_test_parent", "Zo"], np.arange(3, 50), 50)
+        assert calls == [47] and np.array_equal(out["_test_child"], 2.0 * np.arange(3, 50))
+        assert np.allclose(out["Zo"], [Z_o_placeholder(n) for n in range(3, 50)], rtol=0, atol=1e-12)
+        g = evaluate_generators(["G:1:1:-1"], np.array([3, 5, 400]), 50)["G:1:1:-1"]
+        assert np.allclose(g, [np.exp(float(mpmath.zeta(m - 1))) for m in (3, 5, 400)], rtol=1e-14)
+    finally:
+        del GENERATORS["_test_parent"], GENERATORS["_test_child"]
+
+def test_segmented_sieve_matches_full():
+    is_prime = np.array(prime_sieve_up_to(5000))
+    for start, end, segment in [(0, 5000, 97), (1, 2, 4), (4000, 5000, 1000)]:
+        masks = [m for _, _, m in iter_prime_mask(start, end, segment)]
+        assert (np.concatenate(masks) == is_prime[start:end+1]).all()
+    assert (labels_for_range(100, 5000) == is_prime[100:]).all()
+    from prime_polarity.sieves import factor_sieve
+    lo = 10**10 + 1
+    F = factor_sieve(lo, lo + 40000)  # spf == 0 marks primes above 1
+    assert (labels_for_range(lo, lo + 40000) == (F.spf == 0)).all()
+
 def test_mobius_sieve_small():
     mu = mobius_sieve_up_to(10)
     assert mu[1] == 1 and mu[2] == -1 and mu[3] == -1 and mu[4] == 0 and mu[6] == 1
 
+def test_mobius_range_window():
+    mu = mobius_sieve_up_to(3000)
+    assert mobius_range(2500, 3000).dtype == np.int8
+    assert (mobius_range(2500, 3000) == mu[2500:]).all()
+
+def test_mobius_twist_matches_divisor_sum():
+    n0, N = 5, 200
+    G = np.random.default_rng(0).random(N)
+    mu = mobius_sieve_up_to(n0 + N)
+    divs = divisors_up_to(n0 + N)
+    ref = [sum(mu[d] * G[n//d - n0] for d in divs[n] if n//d >= n0) for n in range(n0, n0 + N)]
+    assert np.allclose(mobius_twist(G, n0), ref)
+
+def test_mobius_twist_range_matches_window():
+    G = np.random.default_rng(1).random(600)
+    full = mobius_twist(G, 10)
+    parts = [mobius_twist_range(G, 10, a, min(609, a + 99)) for a in range(10, 610, 100)]
+    assert np.allclose(np.concatenate(parts), full)
+
+def test_divisor_index_convolution(monkeypatch):
+    import prime_polarity.transforms as transforms
+    g0, lo, hi = 2, 3000, 9000
+    G = np.random.default_rng(5).random(hi - g0 + 1)
+    index = divisor_index(g0, lo, hi)
+    assert index is not None and divisor_index(g0, lo, hi) is index
+    mu = mobius_sieve_up_to(hi)
+    ref = [sum(mu[d] * G[n//d - g0] for d in range(1, n // g0 + 1) if n % d == 0) for n in range(lo, hi + 1)]
+    assert np.allclose(dirichlet_convolution(G, g0, lo, hi), ref)
+    assert np.allclose(mobius_twist_range(G, g0, lo, hi), ref)
+    ones = DivisorIndex.build(1, 1, 30, np.ones(31))  # f = 1: counts divisors
+    assert ones.matvec(np.ones(30))[[0, 11, 23]].tolist() == [1, 6, 8]
+    assert (divisor_index(g0, lo, hi - 1, coeffs=np.ones(hi + 1)).data == 1).all()  # built from the caller's table
+    monkeypatch.setattr(transforms, "INDEX_CACHE_BYTES", index.nbytes)
+    assert divisor_index(g0, lo, hi) is index and divisor_index(g0, lo + 1, hi) is not index
+    assert divisor_index(g0, lo, hi) is not index  # evicted to stay within the byte budget
+    clear_index_cache()
+
+def test_masked_convolution_slices_match_index(monkeypatch):
+    import prime_polarity.transforms as transforms
+    g0, lo, hi = 2, 3000, 40000
+    G = np.random.default_rng(6).random(hi - g0 + 1)
+    for q in (2, 30):
+        wheel = Wheel(q)
+        members = wheel.numbers(g0, hi) - g0
+        ref = dirichlet_convolution(G, g0, lo, hi)[wheel.numbers(lo, hi) - lo]
+        assert divisor_index(g0, lo, hi, wheel=wheel) is not None
+        assert np.allclose(dirichlet_convolution(G[members], g0, lo, hi, wheel=wheel), ref)
+        monkeypatch.setattr(transforms, "MAX_INDEX_PAIRS", 1000)
+        clear_index_cache()
+        assert divisor_index(g0, lo, hi, wheel=wheel) is None
+        assert np.allclose(dirichlet_convolution(G[members], g0, lo, hi, wheel=wheel), ref)
+        monkeypatch.undo()
+    clear_index_cache()
+    plan, masked = RangePlan(5000, 8000), RangePlan(5000, 8000, wheel=Wheel(5))
+    assert np.array_equal(masked.forward_diff(5000, 8000), plan.forward_diff(5000, 8000)[Wheel(5).numbers(5000, 8000) - 5000])
+
+def test_factor_sieve_arithmetic_features():
+    from prime_polarity.sieves import factor_sieve
+    from prime_polarity.transforms import ARITHMETIC, arithmetic_values
+    F = factor_sieve(1, 60)
+    assert F.spf.dtype == np.uint32 and F.spf[[0, 11, 48, 58]].tolist() == [0, 2, 7, 0]
+    assert (F.mobius() == mobius_range(1, 60)).all() and F.liouville()[[3, 7, 11]].tolist() == [1, -1, -1]
+    assert F.tau[[0, 11, 59]].tolist() == [1, 6, 12] and F.phi[[0, 8, 35, 59]].tolist() == [1, 6, 12, 16]
+    assert arithmetic_values("omega", F)[[11, 15, 29]].tolist() == [2, 1, 3]  # 12, 16, 30
+    assert ARITHMETIC["omega"][0] == "DistinctPrimes"
+
+    n0, N = 2, 400
+    G = np.random.default_rng(3).random(N)
+    mods = ["liouville", "totient", "ramanujan:6"]
+    feats = build_feature_graph(mods).compute(feature_context(G, n0))
+    def big_omega(m, p=2):
+        return 0 if m < 2 else big_omega(m // p, p) + 1 if m % p == 0 else big_omega(m, p + 1)
+    lam = np.array([(-1) ** big_omega(m) for m in range(n0 + N)])
+    phi = np.array([sum(np.gcd(k, n) == 1 for k in range(1, n + 1)) for n in range(n0 + N)])
+    n = np.arange(n0, n0 + N)
+    for name, f in (("Liouville", lam), ("Totient", phi)):
+        assert np.allclose(feats[name + "_proj"], f[n] * G)
+        ref = [sum(f[d] * G[m // d - n0] for d in range(1, m // n0 + 1) if m % d == 0) for m in n]
+        assert np.allclose(feats[name + "_twist"], ref)
+    c6 = [sum(np.cos(2 * np.pi * k * m / 6) for k in range(1, 7) if np.gcd(k, 6) == 1) for m in n]
+    assert np.allclose(feats["Ramanujan_q=6"], np.round(c6) * G)
+    dd = build_feature_graph(mods, precise=True).compute(feature_context(Z_dd(n), n0))
+    Zf = Z_dd(n).value()
+    assert np.allclose(dd["Liouville_twist"].value(), build_feature_graph(mods).compute(
+        feature_context(Zf, n0))["Liouville_twist"], rtol=1e-12, equal_nan=True)
+
+def test_quantized_features_keep_auc_or_fall_back():
+    from prime_polarity.quantize import quantize, quantized_auc, DEFAULT_AUC_TOL
+    rng = np.random.default_rng(11)
+    n = 5000
+    labels = rng.random(n) < 0.2
+    X = [rng.random(n), 2.0 + rng.random(n) * 1e-9, np.round(rng.random(n), 2), -rng.random(n)]
+    X[0][[3, 9]] = [np.nan, -np.inf]
+    ref, _ = auc_batch(np.vstack(X), labels)
+    for dtype in ("float32", "int32"):
+        q = quantize(X[3], dtype)
+        assert q.dtype == np.dtype(dtype) and (np.diff(q[np.argsort(X[3])]) >= 0).all()
+        aucs, fallback = zip(*(quantized_auc(x, labels, dtype) for x in X))
+        assert np.allclose(aucs, ref, rtol=0, atol=DEFAULT_AUC_TOL)
+        assert not any(fallback[i] for i in (0, 2, 3))
+    assert quantized_auc(X[1], labels, "float32")[1]  # 2 + 1e-9 noise collapses in float32
+
+    stats = {}
+    _, table = score_range(1000000, 1029999, 3, None, False, [4], 50, dtype="float32", stats=stats)
+    _, ref_table = score_range(1000000, 1029999, 3, None, False, [4], 50)
+    ref_aucs = {r[0]: r[1] for r in ref_table}
+    assert len(table) == len(ref_aucs)
+    assert all(abs(auc - ref_aucs[name]) <= DEFAULT_AUC_TOL for name, auc, *_ in table)
+    assert stats["dtype_fallback"]["Z_raw"] == 3
+    pooled = {}
+    with ProcessPoolExecutor(max_workers=2) as ex:  # worker fallbacks are counted too
+        assert score_range(1000000, 1029999, 3, None, False, [4], 50, dtype="float32", stats=pooled,
+                           executor=ex, workers=2)[1] == table
+    assert pooled["dtype_fallback"] == stats["dtype_fallback"]
+
+def test_character_tables_are_orthogonal_and_multiplicative():
+    for q in (7, 8, 12, 15, 16):
+        phi = num_characters(q)
+        T = np.array([character_table(q, k) for k in range(phi)])
+        assert np.allclose(T @ T.conj().T, phi * np.eye(phi))
+        r = np.arange(q)
+        assert np.allclose(T[:, (r[:, None] * r[None, :]) % q], T[:, :, None] * T[:, None, :])
+    assert sorted(conductor(8, k) for k in range(4)) == [1, 4, 8, 8]
+
+def test_dirichlet_projection_demo_characters():
+    G = np.ones(12)
+    assert list(dirichlet_projection(G, 1, 4)[:4]) == [1, 0, -1, 0]
+    assert list(dirichlet_projection(G, 1, 5)[:5]) == [1, -1, -1, 1, 0]
+    assert list(dirichlet_projection(G, 1, 8)[:8]) == [1, 0, -1, 0, -1, 0, 1, 0]
+    assert list(dirichlet_projection(G, 1, 12)) == [1, 0, 0, 0, -1, 0, -1, 0, 0, 0, 1, 0]
+
+def test_auc_batch_averages_tied_ranks():
+    rng = np.random.default_rng(3)
+    S = rng.integers(0, 5, (3, 400)).astype(float)
+    labels = rng.random(400) < 0.4
+    aucs, pis = auc_batch(S, labels)
+    for row, auc in zip(S, aucs):
+        pos, neg = row[labels], row[~labels]
+        ref = ((pos[:, None] > neg).sum() + 0.5 * (pos[:, None] == neg).sum()) / (len(pos) * len(neg))
+        assert abs(auc - ref) < 1e-12
+    assert np.allclose(pis, 2 * aucs - 1)
+    assert auc_from_scores(np.ones(4), np.array([True, False, True, False])) == 0.5
+
 def test_auc_sanity():
     labels = np.array([False, False, True, True])
     scores = np.array([0.1, 0.2, 0.8, 0.9])
@@ -24,3 +220,272 @@ def test_auc_sanity():
     assert abs(auc - 1.0) < 1e-9
     pi = polarity_index(auc)
     assert abs(pi - 1.0) < 1e-9
+
+class _CountingPool(ProcessPoolExecutor):
+    tasks = 0
+
+    def map(self, fn, *iterables, **kwargs):
+        results = list(super().map(fn, *iterables, **kwargs))
+        self.tasks += len(results)
+        return results
+
+def test_score_range_parallel_matches_serial():
+    args = (10000, 30000, 1, None, True, [4, 5], 50)
+    serial = score_range(*args)
+    with _CountingPool(max_workers=2) as ex:
+        assert score_range(*args, executor=ex, workers=2) == serial
+    with _CountingPool(max_workers=3) as ex:  # one window: its features are split into 3 groups
+        assert score_range(*args, executor=ex, workers=3) == serial
+    assert ex.tasks == 3
+
+def test_range_plan_windows_see_covering_range(tmp_path):
+    plan = RangePlan(100, 1200, dps=50)
+    Z, _ = compute_G(100, 1201)
+    assert np.array_equal(plan.window_Z(600, 800), Z[500:701])
+    assert np.array_equal(plan.forward_diff(600, 800), Z[501:702] - Z[500:701])
+    full = mobius_twist_range(Z, 100, 600, 800)
+    assert np.allclose(plan.mobius_twist(600, 800), full)
+    assert not np.allclose(full, mobius_twist(Z[500:701], 600))
+    plan.save(str(tmp_path / "plan"))
+    loaded = RangePlan.load(str(tmp_path / "plan"))
+    assert np.array_equal(loaded.mobius_twist(600, 800), plan.mobius_twist(600, 800))
+    args = (10000, 30000, 4, None, False, [4], 50)
+    with ProcessPoolExecutor(max_workers=2) as ex:
+        assert score_range(*args, executor=ex) == score_range(*args)
+
+def test_masked_scoring_matches_restricted_unmasked(tmp_path):
+    from prime_polarity.cli import feature_stack
+    start, end, mods = 5000, 20999, [4, 5]
+    ranges, table = score_range(start, end, 2, None, False, mods, 50, mask=parse_mask("coprime:6"))
+    wheel, plan = Wheel(6), RangePlan(start, end)
+    masked = RangePlan(start, end, wheel=wheel)
+    masked.save(tmp_path)
+    assert len(masked.labels) == wheel.count(start, end) < (end - start + 1) // 2
+    assert np.array_equal(RangePlan.load(tmp_path).forward_diff(7001, 9000), masked.forward_diff(7001, 9000))
+    for w, (s, e) in enumerate(ranges):
+        keep = wheel.numbers(s, e) - s
+        feats = feature_stack(plan.window_Z(s, e), s, mods, plan=plan)
+        aucs, _ = auc_batch(np.vstack([v[keep] for v in feats.values()]), plan.window_labels(s, e)[keep])
+        got = {name: pis[w] for name, _, _, _, pis in table}
+        for name, auc in zip(feats, aucs):
+            assert abs(got[name] - (2 * auc - 1)) < 1e-9
+
+def test_sweep_matches_score_range_and_resumes(tmp_path):
+    import csv
+    from prime_polarity.sweep import sweep, work_units, expand_jobs
+    spec = {"ranges": [[20000, 29999], [50000, 55999]], "window_sizes": [2000], "mods": ["4,5"]}
+    assert len(work_units(expand_jobs(spec), 4000)) == 3 + 2
+    path = sweep(spec, str(tmp_path), jobs=1, unit_size=4000)
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    ranges, table = score_range(20000, 29999, 5, 2000, False, [4, 5], 50)
+    for name, _, _, _, pis in table:
+        got = [float(r["pi"]) for r in rows if r["start"] == "20000" and r["feature"] == name]
+        assert np.allclose(got, pis)
+    ckpt = tmp_path / "checkpoint.jsonl"
+    lines = ckpt.read_text().splitlines()
+    ckpt.write_text("\n".join(lines[:2]) + "\n" + lines[2][:10])  # interrupted mid-write
+    calls = []
+    sweep(spec, str(tmp_path), jobs=1, unit_size=4000, progress=lambda d, t: calls.append(d))
+    assert calls[0] == 2 and calls[-1] == 5
+    sweep(spec, str(tmp_path), jobs=1, unit_size=4000, progress=lambda d, t: calls.append(d))
+    assert calls[-1] == 5 and len(ckpt.read_text().splitlines()) == 5
+    with open(path, newline="") as f:
+        assert list(csv.DictReader(f)) == rows
+
+def test_sweep_units_keep_small_divisor_terms(tmp_path):
+    import csv
+    from prime_polarity.sweep import sweep
+    spec = {"ranges": [[1000, 8999]], "window_sizes": [1000], "mods": ["4"]}
+    _, table = score_range(1000, 8999, 8, 1000, False, [4], 50)
+    expected = {name: pis for name, _, _, _, pis in table}
+    for unit_size, jobs in ((1000, 1), (3000, 1), (8000, 1), (3000, 2)):
+        out = tmp_path / f"{unit_size}_{jobs}"
+        path = sweep(spec, str(out), jobs=jobs, unit_size=unit_size)
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        for name, pis in expected.items():
+            assert np.allclose([float(r["pi"]) for r in rows if r["feature"] == name], pis)
+        assert not (out / "plans").exists()
+
+def test_result_store_queries_and_stability(tmp_path):
+    from prime_polarity.store import ResultStore
+    from prime_polarity.metrics import stability
+    with ResultStore(str(tmp_path / "r.db")) as store:
+        score_range(20000, 29999, 4, None, False, [4], 50, store=store)
+        score_range(60000, 69999, 4, None, False, [4], 50, mask=parse_mask("odd"), store=store)
+        run = store.add_run([((10**8, 10**8 + 99), {"F": (0.8, 0.6)}), ((10**9, 10**9 + 99), {"F": (0.75, 0.5)})],
+                            mods=[4, (7, 2)], dps=30)
+        assert store.conn.execute("SELECT mods FROM runs WHERE id = ?", (run,)).fetchone()[0] == "4,7:2"
+        assert store.pis("F", min_start=10**8).tolist() == [0.6, 0.5]
+        assert store.pis("F", min_start=10**8, max_end=10**9).tolist() == [0.6]
+        pis = store.pis("Mobius_twist")
+        assert len(pis) == 8 and len(store.pis("Mobius_twist", mask="odd")) == 4
+        agg = {g["feature"]: g for g in store.aggregate(dps=50)}
+        assert agg["Mobius_twist"]["windows"] == 8 and np.isclose(agg["Mobius_twist"]["pi"], pis.mean())
+        assert np.isclose(agg["Mobius_twist"]["std_pi"], pis.std())
+        for feature, min_pi in (("F", 0.2), ("F", 0.55), ("Mobius_twist", -1.0), ("Mobius_twist", 0.2)):
+            assert store.stability(feature, min_pi=min_pi, max_rel_var=0.2) == stability(store.pis(feature), min_pi, 0.2)
+        assert store.stability("F") and not store.stability("missing")
+
+        score_range(20000, 21999, 1, None, False, [4], 20, escalate=True, store=store)
+        assert len(store.pis("Mobius_twist", dps="auto")) == 1 and len(store.pis("Mobius_twist", dps=20)) == 0
+
+        from prime_polarity.sweep import sweep
+        spec = {"ranges": [[30000, 33999]], "window_sizes": [2000], "mods": ["4"]}
+        runs = len(store.run_meta())
+        for _ in range(2):
+            sweep(spec, str(tmp_path / "sw"), jobs=1, store=store)
+        assert len(store.run_meta("sweep")) == 1 and len(store.run_meta()) == runs + 1
+
+def test_feature_graph_subset_and_reuse():
+    Z, _ = compute_G(1000, 1999)
+    graph = build_feature_graph([4, (7, 2)])
+    calls = []
+    fn, deps, output, inplace = graph.nodes["Forward_diff"]
+    graph.nodes["Forward_diff"] = (lambda ctx, G: calls.append(1) or fn(ctx, G), deps, output, inplace)
+    ctx = feature_context(Z, 1000)
+    feats = graph.compute(ctx)
+    assert len(calls) == 1
+    n = np.arange(1000, 2000, dtype=float)
+    assert np.array_equal(feats["LogMellin_slope"], n * feats["Forward_diff"])
+    assert np.array_equal(feats["Dirichlet_proj_q=4"], dirichlet_projection(Z, 1000, 4))
+    assert graph.schedule(["LogMellin_slope"]) == ["G", "Forward_diff", "n", "LogMellin_slope"]
+    sub = graph.compute(ctx, only=["Dirichlet_proj_q=7,k=2"])
+    assert list(sub) == ["Dirichlet_proj_q=7,k=2"] and len(calls) == 1
+    assert np.allclose(sub["Dirichlet_proj_q=7,k=2"], np.real(dirichlet_projection(Z, 1000, 7, 2)))
+
+def test_profiling_records_stages():
+    assert stage("idle") is stage("other")  # shared no-op while nothing listens
+    with Recorder(memory=True) as rec:
+        score_range(1000, 4000, 2, None, False, [4], 50)
+    rows = {name: (calls, alloc) for name, calls, _, _, alloc in rec.summary()}
+    assert rows["window"][0] == 2 and rows["auc"][0] == 2 and rows["sieve"][0] == 1
+    assert rows["feature:Mobius_twist"][0] == 2 and rows["auc"][1] > 0
+    windows = {ev["args"]["window"] for ev in rec.events if ev["name"] == "auc"}
+    assert windows == {"[1000, 2499]", "[2500, 3999]"}
+    trace = rec.chrome_trace()["traceEvents"]
+    assert len(trace) == len(rec.events) and all(ev["ph"] == "X" for ev in trace)
+
+def test_escalation_breaks_float_ties_without_global_state():
+    mpmath.mp.dps = 15
+    n = np.arange(300_000_000, 300_000_400)
+    Z, _ = Z_batch(int(n[0]), int(n[-1]), dps=30)
+    assert len(np.unique(Z)) < len(Z)  # float64 plateaus
+    keys, stats = escalate_ties(Z, n, Z_mp)
+    assert mpmath.mp.dps == 15
+    assert stats["escalated"] > 0 and stats["unresolved"] == 0
+    exact = [Z_mp(int(m), mp_context(60)) for m in n]
+    assert np.array_equal(np.argsort(keys), sorted(range(len(n)), key=lambda i: exact[i]))
+    zeros, st = escalate_ties(np.zeros(6), np.arange(10, 16), lambda m, ctx: ctx.mpf(0))
+    assert np.all(zeros == 0) and st["max_dps"] == 30 and st["unresolved"] == 0
+
+def test_escalation_keeps_invalid_members_of_a_tie_in_place():
+    values = np.array([5.0, 1.0, 1.0, 1.0, np.nan, 1.0, 1.0, 9.0])
+    valid = np.array([True, True, True, False, True, True, True, True])
+    exact = [0, 4, 3, 0, 0, 2, 1, 0]  # the tie's true order: 6, 5, 2, 1
+    keys, stats = escalate_ties(values, np.arange(8), lambda m, ctx: ctx.mpf(exact[m]), valid=valid)
+    assert stats["escalated"] == 4 and keys[3] == 2 and np.isnan(keys[4])
+    assert sorted(keys[[1, 2, 3, 5, 6]]) == [0, 1, 2, 3, 4]
+    assert keys[6] < keys[5] < keys[2] < keys[1]
+
+def test_double_double_residual_features():
+    n = np.concatenate([np.arange(3, 40), np.arange(300_000_000, 300_000_200)])
+    Zd = Z_dd(n, dps=30)
+    ctx = mp_context(60)
+    exact = [Z_mp(int(m), ctx) for m in n]
+    err = [abs((hi + ctx.mpf(lo)) - z) / (z - 2) for hi, lo, z in zip(Zd.hi, Zd.lo, exact)]
+    assert max(err) < 1e-14  # relative to the residual Z - 2, not to Z
+    big = slice(37, None)
+    graph = build_feature_graph((4,), precise=True)
+    feats = graph.compute(feature_context(Zd[big], 300_000_000, G_full=Zd[big], g0=300_000_000),
+                          only=["Forward_diff", "Frac_part_min"])
+    fd = [exact[i + 1] - exact[i] for i in range(37, len(n) - 1)]
+    got = feats["Forward_diff"].hi[:-1] + feats["Forward_diff"].lo[:-1]
+    assert np.allclose(got, np.array(fd, dtype=float), rtol=1e-6, atol=0)  # float64 plateaus give 0 or 1 ulp
+    keys = rank_keys(feats["Frac_part_min"])
+    assert len(np.unique(keys)) == len(keys)  # float64 Z has plateaus here
+    assert np.array_equal(np.argsort(keys), sorted(range(len(keys)), key=lambda i: exact[37 + i]))
+
+def test_cli_help_skips_heavy_imports():
+    import subprocess
+    import sys
+    code = ("import sys\nfrom prime_polarity.cli import main\ntry:\n    main(['--help'])\nexcept SystemExit:\n    pass\n"
+            "print(sorted({m.split('.')[0] for m in sys.modules} & {'numpy', 'mpmath', 'pandas'}))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "[]"
+
+def test_zcache_roundtrip(tmp_path):
+    cache = ZCache(str(tmp_path), shard_size=256)
+    Z, _ = compute_G(1, 1000)
+    Zc, _ = compute_G(1, 1000, cache=cache)
+    assert np.array_equal(Z, Zc)
+    assert len(cache.index()) == 4
+    hit = cache.get(300, 400, 50)
+    assert isinstance(hit, np.memmap) and np.array_equal(hit, Z[299:400])
+    with ProcessPoolExecutor(max_workers=2) as ex:  # concurrent writers keep every index entry
+        list(ex.map(cache.get, range(1001, 4001, 500), range(1500, 4500, 500), [50] * 6))
+    assert len(cache.index()) == 16 and cache.index()[ZCache.key("Z_raw", 50, 3840, 4095)]["start"] == 3840
+
+def test_streaming_auc_exact_with_ties():
+    rng = np.random.default_rng(2)
+    scores = rng.integers(0, 20, 3000).astype(float)
+    labels = rng.random(3000) < 0.3
+    pos, neg = scores[labels], scores[~labels]
+    ref = ((pos[:, None] > neg[None, :]).sum() + 0.5 * (pos[:, None] == neg[None, :]).sum()) / (len(pos) * len(neg))
+    with StreamingAUC(tmpdir=None, block=7) as acc:
+        for i in range(0, 3000, 512):
+            acc.update(scores[i:i+512], labels[i:i+512])
+        assert abs(acc.result() - ref) < 1e-12
+    binned = BinnedAUC(0, 20, bins=5)
+    binned.update(scores, labels)
+    assert abs(binned.result() - ref) <= binned.error_bound()
+
+def test_null_test_detects_planted_signal():
+    from prime_polarity.nulls import null_test, null_positive_sets
+    labels = labels_for_range(20000, 29999)
+    rng = np.random.default_rng(4)
+    S = rng.random((2, len(labels)))
+    S[0] += 0.3 * labels
+    res = null_test(S, labels, names=["signal", "noise"], K=200, seed=1)
+    assert res["signal"]["p_value"] < 0.01 < res["noise"]["p_value"]
+    with ProcessPoolExecutor(max_workers=2) as ex:
+        pooled = null_test(S, labels, names=["signal", "noise"], K=200, seed=1, executor=ex, batches=2)
+    assert pooled == null_test(S, labels, names=["signal", "noise"], K=200, seed=1, batches=2)
+    n = np.arange(20000, 30000)
+    for idx in null_positive_sets(labels, 3, "residue", n0=20000, modulus=6, rng=0):
+        perm = np.zeros(len(labels), dtype=bool)
+        perm[idx] = True
+        for c in range(6):
+            assert perm[n % 6 == c].sum() == labels[n % 6 == c].sum()
+
+def test_sliding_scorer_tracks_full_rescoring():
+    from prime_polarity.rolling import SlidingScorer, _local_features
+    scorer = SlidingScorer(5000, 3000, 700, mods=[4])
+    steps = list(scorer.run(9000))
+    assert [r for r, _ in steps] == [(5000, 7999), (5700, 8699)]
+    (s, e), scores = steps[-1]
+    Z, _ = compute_G(s, e + 1)
+    feats = _local_features(s, Z, [4])
+    aucs, _ = auc_batch(np.vstack(list(feats.values())), labels_for_range(s, e))
+    for (name, (auc, _)), ref in zip(scores.items(), aucs):
+        assert abs(auc - ref) <= scorer.aucs[name].error_bound() + 1e-12
+
+def _load_script(name):
+    import importlib.util
+    import os
+    path = os.path.join(os.path.dirname(__file__), "..", "scripts", name + ".py")
+    spec = importlib.util.spec_from_file_location("_script_" + name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_eval_csv_engine_reads_empty_cells(tmp_path):
+    make_dataset, evaluate = _load_script("make_dataset"), _load_script("eval")
+    out = str(tmp_path / "d.csv")
+    make_dataset.write_dataset(1, 3000, out, "csv", 1000, 50)
+    assert ",," in (tmp_path / "d.csv").read_text()  # undefined features at n <= 2
+    feats = ["Z_raw", "ForwardDiff", "MobiusFast", "Dirichlet_q4"]
+    for chunk_rows in (1 << 20, 700):
+        rows = evaluate.evaluate(out, feats, chunk_rows=chunk_rows, tmpdir=str(tmp_path))
+        assert rows == evaluate.evaluate(out, feats, chunk_rows=chunk_rows, tmpdir=str(tmp_path), engine="pandas")